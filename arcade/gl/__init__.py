@@ -1,5 +1,11 @@
-from .buffer import Buffer
+from .buffer import Buffer, Readback, ShadowBuffer, StreamBuffer
+from .arena import BufferArena, BufferRange
 from .constants import *
 from .context import Context
 from .program import Program
+from .program_cache import ProgramCache
+from .query import Query
 from .types import BufferDescription, GLTypes
+from .texture import Texture
+from .framebuffer import Framebuffer
+from .vertex_array import Geometry, VertexArray
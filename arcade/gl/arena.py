@@ -0,0 +1,181 @@
+from bisect import bisect_left
+from typing import TYPE_CHECKING, List, Optional
+
+from arcade.arcade_types import BufferProtocol
+from arcade.gl import constants
+from arcade.gl.buffer import Buffer
+
+if TYPE_CHECKING:
+    from arcade.gl import Context
+
+
+class BufferRange:
+    """
+    A range of bytes handed out by a :py:class:`BufferArena`.
+
+    Can be passed anywhere a :py:class:`Buffer` is used as a vertex or index
+    source, such as a ``BufferDescription`` or ``Geometry``, which then read from
+    ``offset`` in the shared buffer.
+    """
+
+    __slots__ = ("arena", "buffer", "offset", "size")
+
+    def __init__(self, arena: "BufferArena", buffer: Buffer, offset: int, size: int):
+        self.arena = arena
+        self.buffer = buffer
+        self.offset = offset
+        self.size = size
+
+    @property
+    def glo(self):
+        return self.buffer.glo
+
+    def write(self, data: BufferProtocol, offset: int = 0) -> None:
+        if memoryview(data).nbytes + offset > self.size:
+            raise ValueError("Attempting to write outside the range size")
+
+        self.buffer.write(data, self.offset + offset)
+
+    def free(self) -> None:
+        self.arena.free(self)
+
+    def __repr__(self) -> str:
+        return f"<BufferRange {self.size} bytes at {self.offset}>"
+
+
+class _Block:
+    """One GPU buffer of an arena and its free extents, sorted by offset."""
+
+    __slots__ = ("buffer", "free")
+
+    def __init__(self, buffer: Buffer):
+        self.buffer = buffer
+        self.free: List[List[int]] = [[0, buffer.size]]
+
+    def allocate(self, size: int) -> Optional[int]:
+        # First fit, keeps the low end of each block densely packed
+        for i, extent in enumerate(self.free):
+            offset, extent_size = extent
+            if extent_size >= size:
+                if extent_size == size:
+                    del self.free[i]
+                else:
+                    extent[0] += size
+                    extent[1] -= size
+                return offset
+        return None
+
+    def release(self, offset: int, size: int) -> None:
+        i = bisect_left(self.free, [offset, 0])
+        # Merge with the following extent, then the preceding one
+        if i < len(self.free) and offset + size == self.free[i][0]:
+            size += self.free[i][1]
+            del self.free[i]
+        if i > 0 and self.free[i - 1][0] + self.free[i - 1][1] == offset:
+            self.free[i - 1][1] += size
+        else:
+            self.free.insert(i, [offset, size])
+
+
+class BufferArena:
+    """
+    Sub-allocates many small ranges out of a few large buffers.
+
+    Meshes that each get their own :py:class:`Buffer` cost a GL object and a bind
+    apiece. An arena packs them into blocks of ``block_size`` bytes instead, adding
+    a block whenever an allocation does not fit in the existing ones. Freed ranges
+    are merged with their free neighbours so the space can be reused for larger
+    allocations.
+
+    :param Context ctx: The context the buffers belong to
+    :param int block_size: Size in bytes of each buffer the arena allocates
+    :param int alignment: Every range starts at a multiple of this many bytes
+    :param int buffer_type: The WebGL buffer target, such as ARRAY_BUFFER
+    :param str usage: Buffer usage, 'static', 'dynamic' or 'stream'
+    """
+
+    def __init__(
+        self,
+        ctx: "Context",
+        block_size: int = 4 * 1024 * 1024,
+        alignment: int = 16,
+        buffer_type: int = constants.ARRAY_BUFFER,
+        usage: str = "static",
+    ):
+        if alignment <= 0 or alignment & (alignment - 1):
+            raise ValueError("alignment must be a power of two")
+
+        self._ctx = ctx
+        self._block_size = block_size
+        self._alignment = alignment
+        self._buffer_type = buffer_type
+        self._usage = usage
+        self._blocks: List[_Block] = []
+        self._used = 0
+
+    @property
+    def buffers(self) -> List[Buffer]:
+        return [block.buffer for block in self._blocks]
+
+    @property
+    def capacity(self) -> int:
+        return sum(block.buffer.size for block in self._blocks)
+
+    @property
+    def used(self) -> int:
+        """Bytes currently allocated, including alignment padding."""
+        return self._used
+
+    def allocate(self, size: int, data: Optional[BufferProtocol] = None) -> BufferRange:
+        """
+        Allocate ``size`` bytes, or as many as ``data`` holds when ``size`` is 0,
+        and optionally upload ``data`` into the new range.
+        """
+        if data is not None and size == 0:
+            size = memoryview(data).nbytes
+        if size <= 0:
+            raise ValueError("Cannot allocate an empty range")
+
+        padded = (size + self._alignment - 1) & ~(self._alignment - 1)
+        for block in self._blocks:
+            offset = block.allocate(padded)
+            if offset is not None:
+                break
+        else:
+            block = self._grow(padded)
+            offset = block.allocate(padded)
+
+        self._used += padded
+        handle = BufferRange(self, block.buffer, offset, size)
+        if data is not None:
+            handle.write(data)
+        return handle
+
+    def free(self, handle: BufferRange) -> None:
+        if handle.arena is not self:
+            raise ValueError("Range does not belong to this arena")
+        if handle.size == 0:
+            raise ValueError("Range was already freed")
+
+        padded = (handle.size + self._alignment - 1) & ~(self._alignment - 1)
+        for block in self._blocks:
+            if block.buffer is handle.buffer:
+                block.release(handle.offset, padded)
+                break
+        self._used -= padded
+        handle.size = 0
+
+    def release(self) -> None:
+        """Delete all buffers of the arena, invalidating every range handed out."""
+        for block in self._blocks:
+            block.buffer.release()
+        self._blocks.clear()
+        self._used = 0
+
+    def _grow(self, min_size: int) -> _Block:
+        size = max(self._block_size, min_size)
+        block = _Block(
+            Buffer(self._ctx, buffer_type=self._buffer_type, usage=self._usage, reserve=size)
+        )
+        self._blocks.append(block)
+        return block
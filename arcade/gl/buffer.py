@@ -1,6 +1,10 @@
-from typing import TYPE_CHECKING
+import asyncio
+from concurrent.futures import Future
+from contextlib import contextmanager
+from typing import TYPE_CHECKING, List, Optional, Tuple
 
 import js
+from pyodide.ffi import create_proxy
 
 from arcade.arcade_types import BufferProtocol
 from arcade.gl import constants
@@ -8,20 +12,63 @@ from arcade.gl import constants
 if TYPE_CHECKING:
     from arcade.gl import Context
 
+
+# PyProxy.getBuffer kinds and the JavaScript typed arrays they make
+_TYPED_ARRAYS = {
+    "i8": "Int8Array",
+    "u8": "Uint8Array",
+    "i16": "Int16Array",
+    "u16": "Uint16Array",
+    "i32": "Int32Array",
+    "u32": "Uint32Array",
+    "f32": "Float32Array",
+}
+
+@contextmanager
+def js_view(data: BufferProtocol, kind: str = "u8"):
+    """
+    Expose ``data`` to JavaScript as a typed array for the duration of the block,
+    a ``Uint8Array`` unless ``kind`` (as in ``PyProxy.getBuffer``, e.g. ``"f32"``)
+    asks for another. Buffer uploads take any typed array, pixel data has to match
+    its type, see ``arcade.gl.types.pixel_type_kinds``.
+
+    Contiguous buffers are viewed in place in the WASM heap through the buffer
+    protocol, so nothing is copied before WebGL reads them. Anything else falls
+    back to copying into a fresh ``ArrayBuffer``. The view must not be used after
+    the block, the Python memory it points at may move or be freed.
+    """
+    view = memoryview(data)
+    if not view.c_contiguous:
+        js_array_buffer = js.ArrayBuffer.new(view.nbytes)
+        js_array_buffer.assign(view.tobytes())
+        yield getattr(js, _TYPED_ARRAYS[kind]).new(js_array_buffer)
+        return
+
+    proxy = create_proxy(view)
+    py_buffer = proxy.getBuffer(kind)
+    try:
+        yield py_buffer.data
+    finally:
+        py_buffer.release()
+        proxy.destroy()
+
+
 class Buffer:
 
     _usages = {
         "static": constants.STATIC_DRAW,
         "dynamic": constants.DYNAMIC_DRAW,
         "stream": constants.STREAM_DRAW,
+        "read": constants.STREAM_READ,
     }
 
     def __init__(
         self,
         ctx: "Context",
-        data: BufferProtocol,
+        data: Optional[BufferProtocol] = None,
         buffer_type: int = constants.ARRAY_BUFFER,
-        usage: str = "static"
+        usage: str = "static",
+        reserve: int = 0,
     ):
         self._ctx = ctx
         gl = self._ctx.gl
@@ -29,13 +76,24 @@ class Buffer:
         self._usage = Buffer._usages[usage]
         self._buffer_type = buffer_type
 
-        self._size = len(data) * data.itemsize
+        target = self._ctx.state.bind_buffer_for_write(buffer_type, self._glo, new=True)
+        if data is not None:
+            self._size = memoryview(data).nbytes
+            with js_view(data) as js_data:
+                gl.bufferData(target, js_data, self._usage)
+        elif reserve > 0:
+            self._size = reserve
+            gl.bufferData(target, reserve, self._usage)
+        else:
+            raise ValueError("Buffer needs either data or a reserve size")
 
-        js_array_buffer = js.ArrayBuffer.new(self._size)
-        js_array_buffer.assign(data)
+        self._finalizer = self._ctx._track(self, "Buffer", self._glo, self._size)
 
-        gl.bindBuffer(buffer_type, self._glo)
-        gl.bufferData(buffer_type, js_array_buffer, self._usage)
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.release()
 
     @property
     def glo(self):
@@ -45,13 +103,21 @@ class Buffer:
     def size(self) -> int:
         return self._size
 
-    def write(self, data: BufferProtocol, offset: int = 0) -> None:
-        self._ctx.gl.bindBuffer(self._buffer_type, self._glo)
+    def release(self) -> None:
+        """Delete the GL buffer. The buffer can't be used afterwards."""
+        if self._glo is None:
+            return
 
-        js_array_buffer = js.ArrayBuffer.new(len(data) * data.itemsize)
-        js_array_buffer.assign(data)
+        if self._finalizer is not None:
+            self._finalizer.detach()
+        self._ctx._release(self._glo)
+        self._glo = None
 
-        self._ctx.gl.bufferSubData(self._buffer_type, offset, js_array_buffer)
+    def write(self, data: BufferProtocol, offset: int = 0) -> None:
+        target = self._ctx.state.bind_buffer_for_write(self._buffer_type, self._glo)
+
+        with js_view(data) as js_data:
+            self._ctx.gl.bufferSubData(target, offset, js_data)
 
     def copy_from_buffer(
         self,
@@ -69,8 +135,8 @@ class Buffer:
         if size + offset > self._size:
             raise ValueError("Attempting to write outside the buffer size")
 
-        self._ctx.gl.bindBuffer(constants.COPY_READ_BUFFER, source._glo)
-        self._ctx.gl.bindBuffer(constants.COPY_WRITE_BUFFER, self._glo)
+        self._ctx.state.bind_buffer(constants.COPY_READ_BUFFER, source._glo)
+        self._ctx.state.bind_buffer(constants.COPY_WRITE_BUFFER, self._glo)
         self._ctx.gl.copyBufferSubData(
             constants.COPY_READ_BUFFER,
             constants.COPY_WRITE_BUFFER,
@@ -79,4 +145,383 @@ class Buffer:
             size
         )
 
+    def orphan(self, new_size: Optional[int] = None) -> None:
+        """
+        Re-specify the buffer's storage, discarding its contents.
+
+        The driver can hand out fresh memory instead of waiting for draws that
+        still read the old storage. The GL object stays the same, so vertex arrays
+        using this buffer remain valid.
+
+        :param int new_size: New size in bytes, defaults to the current size
+        """
+        if new_size is not None:
+            if new_size <= 0:
+                raise ValueError("Buffer size must be positive")
+            self._size = new_size
+            self._ctx.objects.resize(self._glo, new_size)
+
+        target = self._ctx.state.bind_buffer_for_write(self._buffer_type, self._glo)
+        self._ctx.gl.bufferData(target, self._size, self._usage)
+
+    def resize(self, new_size: int, preserve: bool = True) -> None:
+        """
+        Change the size of the buffer in place, keeping the GL object.
+
+        With ``preserve`` the contents that fit in the new size are kept, copied
+        through a temporary buffer on the GPU so nothing is read back.
+        """
+        if new_size == self._size:
+            return
+
+        if not preserve:
+            self.orphan(new_size)
+            return
+
+        keep = min(self._size, new_size)
+        temp = Buffer(self._ctx, buffer_type=self._buffer_type, usage="stream", reserve=keep)
+        temp.copy_from_buffer(self, size=keep)
+        self.orphan(new_size)
+        self.copy_from_buffer(temp, size=keep)
+        temp.release()
+
+    def reserve(self, min_size: int) -> None:
+        """
+        Make sure the buffer holds at least ``min_size`` bytes, keeping its contents.
+
+        Grows to at least double the current size, so appending to a buffer a
+        little at a time costs amortized constant time.
+        """
+        if min_size > self._size:
+            self.resize(max(min_size, self._size * 2))
+
+    def read_async(self, size: int = -1, offset: int = 0) -> "Readback":
+        """
+        Read back ``size`` bytes starting at ``offset`` without stalling the frame.
+
+        The range is copied into a staging buffer on the GPU and a fence is
+        inserted after the copy. The returned :py:class:`Readback` resolves with a
+        ``memoryview`` of the data during a later :py:meth:`Context.end_frame`,
+        once the fence has signaled.
+        """
+        if size == -1:
+            size = self._size - offset
+
+        if size <= 0 or size + offset > self._size:
+            raise ValueError("Attempting to read outside the buffer size")
+
+        # Of the same type as this buffer, WebGL doesn't copy between index
+        # buffers and others
+        staging = Buffer(self._ctx, buffer_type=self._buffer_type, usage="read", reserve=size)
+        staging.copy_from_buffer(self, size=size, source_offset=offset)
+
+        gl = self._ctx.gl
+        fence = gl.fenceSync(constants.SYNC_GPU_COMMANDS_COMPLETE, 0)
+        # Make sure the fence is submitted, or polling it may never succeed
+        gl.flush()
+
+        readback = Readback(self._ctx, staging, fence, size)
+        self._ctx._readbacks.append(readback)
+        return readback
+
+
+class Readback:
+    """
+    A pending read of buffer data, created by :py:meth:`Buffer.read_async`.
+
+    Wraps a :py:class:`concurrent.futures.Future` that is resolved with a
+    ``memoryview`` of the data. It can be polled with :py:meth:`done`, given
+    callbacks, or awaited from a coroutine.
+    """
+
+    def __init__(self, ctx: "Context", staging: Buffer, fence, size: int):
+        self._ctx = ctx
+        self._staging = staging
+        self._fence = fence
+        self._size = size
+        self.future: Future = Future()
+
+    @property
+    def size(self) -> int:
+        return self._size
+
+    def done(self) -> bool:
+        return self.future.done()
+
+    def result(self) -> memoryview:
+        """The data read. Raises ``concurrent.futures.TimeoutError`` if not ready yet."""
+        return self.future.result(timeout=0)
+
+    def add_done_callback(self, callback) -> None:
+        self.future.add_done_callback(lambda future: callback(self))
+
+    def __await__(self):
+        return asyncio.wrap_future(self.future).__await__()
+
+    def poll(self) -> bool:
+        """Check the fence and fetch the data if it has signaled. Returns True when resolved."""
+        if self.future.done():
+            return True
+
+        gl = self._ctx.gl
+        status = gl.clientWaitSync(self._fence, 0, 0)
+        if status == constants.TIMEOUT_EXPIRED:
+            return False
+
+        try:
+            if status == constants.WAIT_FAILED:
+                raise RuntimeError("Waiting for buffer readback failed")
+
+            data = bytearray(self._size)
+            self._ctx.state.bind_buffer(constants.COPY_READ_BUFFER, self._staging.glo)
+            with js_view(data) as js_data:
+                gl.getBufferSubData(constants.COPY_READ_BUFFER, 0, js_data)
+        except Exception as ex:
+            self.future.set_exception(ex)
+        else:
+            self.future.set_result(memoryview(data))
+        finally:
+            gl.deleteSync(self._fence)
+            self._staging.release()
+            self._fence = None
+            self._staging = None
+        return True
+
+
+class StreamBuffer(Buffer):
+    """
+    A buffer for data that is rewritten every frame, such as sprite or particle
+    vertices.
+
+    The storage is split into ``frames`` regions of ``region_size`` bytes that are
+    used round-robin, one per frame, so a write never touches the region a draw
+    from one of the previous frames may still be reading. The first write after
+    :py:meth:`Context.end_frame` moves on to the next region, and all writes of a
+    frame go to that same region. :py:meth:`next_frame` moves on explicitly. With
+    ``orphan=True`` the storage is also orphaned each time the ring wraps around,
+    letting the driver hand out fresh memory rather than synchronizing with the GPU.
+
+    The size is fixed by ``region_size`` and ``frames``: :py:meth:`resize` and
+    :py:meth:`reserve` raise ``TypeError``. Create a new StreamBuffer to grow.
+
+    :param Context ctx: The context this buffer belongs to
+    :param int region_size: Bytes available to each frame
+    :param int frames: Number of regions in the ring
+    :param int buffer_type: The WebGL buffer target, such as ARRAY_BUFFER
+    :param bool orphan: Orphan the storage whenever the ring wraps around
+    """
+
+    def __init__(
+        self,
+        ctx: "Context",
+        region_size: int,
+        frames: int = 3,
+        buffer_type: int = constants.ARRAY_BUFFER,
+        orphan: bool = False,
+    ):
+        if region_size <= 0 or frames <= 0:
+            raise ValueError("region_size and frames must be positive")
+
+        super().__init__(ctx, buffer_type=buffer_type, usage="stream", reserve=region_size * frames)
+        self._region_size = region_size
+        self._frames = frames
+        self._orphan = orphan
+        self._region = -1
+        # Context.frame when the current region was taken
+        self._region_frame = -1
+
+    @property
+    def region_size(self) -> int:
+        return self._region_size
+
+    @property
+    def frames(self) -> int:
+        return self._frames
+
+    @property
+    def offset(self) -> int:
+        """Byte offset of the current region."""
+        return max(self._region, 0) * self._region_size
+
+    def next_frame(self) -> int:
+        """Move on to the next region of the ring. Returns its byte offset."""
+        self._region = (self._region + 1) % self._frames
+        self._region_frame = self._ctx.frame
+        if self._region == 0 and self._orphan:
+            self.orphan()
+        return self._region * self._region_size
+
+    def write(self, data: BufferProtocol, offset: int = 0) -> int:
+        """
+        Write ``data`` at ``offset`` into this frame's region of the ring.
+
+        Returns the byte offset of that region within the buffer, to be added to
+        attribute offsets (or used as the first vertex) when drawing this frame.
+        """
+        if memoryview(data).nbytes + offset > self._region_size:
+            raise ValueError("Attempting to write outside the region size")
+
+        if self._region_frame != self._ctx.frame:
+            self.next_frame()
+
+        region_offset = self._region * self._region_size
+        super().write(data, region_offset + offset)
+        return region_offset
+
+    def resize(self, new_size: int, preserve: bool = True) -> None:
+        raise TypeError("A StreamBuffer can't be resized, its size is region_size * frames")
+
+    def reserve(self, min_size: int) -> None:
+        raise TypeError("A StreamBuffer can't be resized, its size is region_size * frames")
+
+
+class ShadowBuffer(Buffer):
+    """
+    A buffer with a CPU-side copy of its contents, for data that changes in small
+    scattered pieces.
+
+    Writes only go to the shadow copy and remember which byte ranges they touched.
+    :py:meth:`flush` uploads the dirty ranges in as few ``bufferSubData`` calls as
+    possible: ranges separated by no more than ``merge_gap`` bytes are merged into
+    one, as re-uploading a few clean bytes is cheaper than another call. Every
+    call reads straight out of a single view of the shadow copy using
+    ``srcOffset``/``length``, so no slices are made.
+
+    The shadow copy can also be changed in place through :py:attr:`data`, followed
+    by :py:meth:`mark_dirty` for the bytes that changed.
+
+    :py:meth:`copy_from_buffer` only accepts another ShadowBuffer, copying between
+    the shadow copies. Any other source raises ``TypeError``, as its contents could
+    only be mirrored by reading them back from the GPU.
+
+    :param Context ctx: The context this buffer belongs to
+    :param data: Initial contents, defines the size of the buffer
+    :param int buffer_type: The WebGL buffer target, such as ARRAY_BUFFER
+    :param str usage: Buffer usage, 'static', 'dynamic' or 'stream'
+    :param int reserve: Size in bytes when no initial data is given
+    :param int merge_gap: Largest gap in bytes between two dirty ranges that are
+                          still flushed as one
+    """
+
+    def __init__(
+        self,
+        ctx: "Context",
+        data: Optional[BufferProtocol] = None,
+        buffer_type: int = constants.ARRAY_BUFFER,
+        usage: str = "dynamic",
+        reserve: int = 0,
+        merge_gap: int = 256,
+    ):
+        super().__init__(ctx, data, buffer_type=buffer_type, usage=usage, reserve=reserve)
+        self._shadow = bytearray(data) if data is not None else bytearray(reserve)
+        self._dirty: List[Tuple[int, int]] = []
+        self.merge_gap = merge_gap
+
+    @property
+    def data(self) -> memoryview:
+        """Writable view of the shadow copy."""
+        return memoryview(self._shadow)
+
+    @property
+    def dirty(self) -> bool:
+        return bool(self._dirty)
+
+    @property
+    def dirty_ranges(self) -> List[Tuple[int, int]]:
+        """The ``(offset, size)`` ranges the next flush would upload."""
+        return [(start, end - start) for start, end in self._merged_ranges()]
+
+    def write(self, data: BufferProtocol, offset: int = 0) -> None:
+        view = memoryview(data).cast("B")
+        if offset + view.nbytes > self._size:
+            raise ValueError("Attempting to write outside the buffer size")
+
+        self._shadow[offset:offset + view.nbytes] = view
+        self.mark_dirty(offset, view.nbytes)
+
+    def mark_dirty(self, offset: int = 0, size: int = -1) -> None:
+        """Mark a byte range of the shadow copy as changed. Defaults to all of it."""
+        if size == -1:
+            size = self._size - offset
+        if size > 0:
+            self._dirty.append((offset, offset + size))
+
+    def _merged_ranges(self) -> List[Tuple[int, int]]:
+        merged: List[Tuple[int, int]] = []
+        for start, end in sorted(self._dirty):
+            if merged and start - merged[-1][1] <= self.merge_gap:
+                if end > merged[-1][1]:
+                    merged[-1] = (merged[-1][0], end)
+            else:
+                merged.append((start, end))
+        return merged
+
+    def flush(self) -> int:
+        """
+        Upload the dirty ranges, typically once per frame before drawing.
+        Returns the number of ``bufferSubData`` calls made.
+        """
+        if not self._dirty:
+            return 0
+
+        ranges = self._merged_ranges()
+        self._dirty.clear()
+
+        gl = self._ctx.gl
+        target = self._ctx.state.bind_buffer_for_write(self._buffer_type, self._glo)
+        with js_view(self._shadow) as js_data:
+            for start, end in ranges:
+                gl.bufferSubData(target, start, js_data, start, end - start)
+        return len(ranges)
+
+    def orphan(self, new_size: Optional[int] = None) -> None:
+        """
+        Re-specify the GL storage. The shadow copy keeps its contents, cut or
+        zero-padded to ``new_size``, and all of it is re-uploaded on the next flush.
+        """
+        super().orphan(new_size)
+        del self._shadow[self._size:]
+        self._shadow.extend(bytes(self._size - len(self._shadow)))
+
+        self._dirty.clear()
+        self.mark_dirty(0, self._size)
+
+    def resize(self, new_size: int, preserve: bool = True) -> None:
+        """Resize the buffer and its shadow copy. The contents are re-uploaded on the next flush."""
+        if new_size == self._size:
+            return
+
+        if not preserve:
+            self._shadow = bytearray(new_size)
+        self.orphan(new_size)
+
+    def copy_from_buffer(
+        self,
+        source: "Buffer",
+        size: int = -1,
+        offset: int = 0,
+        source_offset: int = 0
+    ) -> None:
+        """
+        Copy from another ShadowBuffer's shadow copy. The copied range is uploaded
+        on the next flush, together with any changes the source hadn't flushed yet.
+
+        :raises TypeError: If ``source`` is not a ShadowBuffer
+        """
+        if not isinstance(source, ShadowBuffer):
+            raise TypeError(
+                "A ShadowBuffer can only copy from another ShadowBuffer, "
+                "use write() with the data instead"
+            )
+
+        if size == -1:
+            size = source.size
+
+        if size + source_offset > source.size:
+            raise ValueError("Attempting to read outside the range of source buffer")
+
+        if size + offset > self._size:
+            raise ValueError("Attempting to write outside the buffer size")
 
+        self._shadow[offset:offset + size] = source._shadow[source_offset:source_offset + size]
+        self.mark_dirty(offset, size)
@@ -0,0 +1,184 @@
+import json
+from array import array
+from typing import Dict, List
+
+import js
+from pyodide.ffi import create_proxy, to_js
+
+# WebGL methods that can be recorded. They return nothing and take only numbers,
+# booleans and GL object handles, so they can be replayed later from a flat
+# array. Everything else runs immediately, after the recorded commands.
+RECORDED = (
+    "activeTexture",
+    "bindBuffer",
+    "bindFramebuffer",
+    "bindTexture",
+    "bindVertexArray",
+    "blendEquation",
+    "blendEquationSeparate",
+    "blendFunc",
+    "blendFuncSeparate",
+    "clear",
+    "clearColor",
+    "clearDepth",
+    "colorMask",
+    "copyBufferSubData",
+    "cullFace",
+    "depthFunc",
+    "depthMask",
+    "disable",
+    "disableVertexAttribArray",
+    "drawArrays",
+    "drawArraysInstanced",
+    "drawElements",
+    "drawElementsInstanced",
+    "enable",
+    "enableVertexAttribArray",
+    "frontFace",
+    "pixelStorei",
+    "scissor",
+    "uniform1f",
+    "uniform1i",
+    "uniform1ui",
+    "uniform2f",
+    "uniform2i",
+    "uniform2ui",
+    "uniform3f",
+    "uniform3i",
+    "uniform3ui",
+    "uniform4f",
+    "uniform4i",
+    "uniform4ui",
+    "useProgram",
+    "vertexAttribDivisor",
+    "vertexAttribPointer",
+    "viewport",
+)
+OPCODES: Dict[str, int] = {name: code for code, name in enumerate(RECORDED)}
+
+# Argument kinds, each argument is encoded as a kind followed by a value
+ARG_NUMBER = 0
+ARG_OBJECT = 1  # Value is an index into the object table
+ARG_NULL = 2
+ARG_BOOL = 3
+
+REPLAY_SOURCE = """
+const names = %s;
+const args = [];
+let i = 0;
+while (i < count) {
+    const name = names[ops[i]];
+    const argc = ops[i + 1];
+    i += 2;
+    args.length = argc;
+    for (let a = 0; a < argc; a++) {
+        const kind = ops[i];
+        const value = ops[i + 1];
+        i += 2;
+        args[a] = kind === 0 ? value : kind === 1 ? objects[value] : kind === 2 ? null : value !== 0;
+    }
+    gl[name].apply(gl, args);
+}
+""" % json.dumps(list(RECORDED))
+
+
+class CommandBuffer:
+    """
+    Stands in for the WebGL context and records calls instead of making them.
+
+    Recorded calls are encoded into a flat ``array('d')`` of opcodes and
+    arguments, with GL object handles kept in a side table. :py:meth:`replay`
+    hands the whole array to a small JavaScript interpreter, which replays the
+    frame's calls with a single crossing from Python into JavaScript.
+
+    Calls that return a value, take data such as typed arrays, or are otherwise
+    not in :py:data:`RECORDED` replay the recorded calls first and then run
+    immediately, so the order of calls is kept. Constants are read straight from
+    the WebGL context.
+    """
+
+    def __init__(self, gl):
+        self.gl = gl
+        self._ops = array("d")
+        self._objects: List[object] = []
+        self._object_index: Dict[int, int] = {}
+        self._count = 0
+        self._replay = js.Function.new("gl", "ops", "count", "objects", REPLAY_SOURCE)
+
+    @property
+    def pending(self) -> int:
+        """Number of calls recorded since the last replay."""
+        return self._count
+
+    def __getattr__(self, name: str):
+        # Only reached for names not cached on the instance yet
+        if name in OPCODES:
+            method = self._recorder(OPCODES[name])
+        else:
+            value = getattr(self.gl, name)
+            if isinstance(value, (int, float, str)):
+                self.__dict__[name] = value
+                return value
+            method = self._immediate(name)
+        self.__dict__[name] = method
+        return method
+
+    def _recorder(self, opcode: int):
+        ops = self._ops
+
+        def record(*args):
+            ops.append(opcode)
+            ops.append(len(args))
+            for arg in args:
+                if arg is None:
+                    ops.append(ARG_NULL)
+                    ops.append(0)
+                elif arg is True or arg is False:
+                    ops.append(ARG_BOOL)
+                    ops.append(arg)
+                elif isinstance(arg, (int, float)):
+                    ops.append(ARG_NUMBER)
+                    ops.append(arg)
+                else:
+                    ops.append(ARG_OBJECT)
+                    ops.append(self._object(arg))
+            self._count += 1
+
+        return record
+
+    def _immediate(self, name: str):
+        def call(*args):
+            if self._count:
+                self.replay()
+            return getattr(self.gl, name)(*args)
+
+        return call
+
+    def _object(self, obj) -> int:
+        key = id(obj)
+        index = self._object_index.get(key)
+        if index is None:
+            index = len(self._objects)
+            self._objects.append(obj)
+            self._object_index[key] = index
+        return index
+
+    def replay(self):
+        """Replay and clear the recorded calls."""
+        if not self._count:
+            return
+
+        ops_view = memoryview(self._ops)
+        ops_proxy = create_proxy(ops_view)
+        ops_buffer = ops_proxy.getBuffer("f64")
+        try:
+            self._replay(self.gl, ops_buffer.data, len(self._ops), to_js(self._objects))
+        finally:
+            ops_buffer.release()
+            ops_proxy.destroy()
+            # The array can't be resized while a view of it exists
+            ops_view.release()
+            del self._ops[:]
+            self._objects.clear()
+            self._object_index.clear()
+            self._count = 0
@@ -1,111 +1,330 @@
-from typing import Optional, Tuple
+import weakref
+from typing import TYPE_CHECKING, Dict, Iterable, List, Optional, Tuple
+
+import js
+from pyodide.ffi import to_js
 
 from arcade.gl import constants
 
+from .commands import CommandBuffer
+from .framebuffer import DefaultFrameBuffer, Framebuffer
 from .program import Program
+from .program_cache import Defines, ProgramCache
+from .query import TIMER_QUERY_EXTENSION, Query, QueryPool
+from .state import GLState
+from .stats import CountingGL, GLStats
+
+if TYPE_CHECKING:
+    from .buffer import Readback
+
+
+# Queries a list of parameters in one call from Python
+GET_PARAMS_SOURCE = "return enums.map((e) => gl.getParameter(e));"
 
 
 class Context:
-    def __init__(self, canvas):
-        self.gl = canvas.getContext("webgl2")
-        self._limits = Limits(self)
+    #: How released objects are deleted, see :py:attr:`gc_mode`
+    gc_modes = ("immediate", "deferred", "auto")
+
+    _deleters = {
+        "Buffer": "deleteBuffer",
+        "Framebuffer": "deleteFramebuffer",
+        "Program": "deleteProgram",
+        "Query": "deleteQuery",
+        "Shader": "deleteShader",
+        "Texture": "deleteTexture",
+        "VertexArray": "deleteVertexArray",
+    }
+
+    def __init__(
+        self,
+        canvas,
+        *,
+        record_commands: bool = False,
+        gc_mode: str = "auto",
+        stats: bool = False,
+    ):
+        self._native_gl = canvas.getContext("webgl2")
+        # With record_commands, calls are recorded during the frame and replayed
+        # in one go by end_frame instead of each crossing into JavaScript
+        self._commands = CommandBuffer(self._native_gl) if record_commands else None
+        self.gl = self._commands or self._native_gl
+        #: Per-frame call counters, when enabled with ``stats=True``
+        self.stats: Optional[GLStats] = None
+        if stats:
+            self.stats = GLStats()
+            self.gl = CountingGL(self.gl, self.stats)
+        # All state changes made by arcade.gl go through here
+        self.state = GLState(self.gl)
+        # Only the values needed to set up the context are queried here
+        self._limits = Limits(self, prefetch=("MAX_TEXTURE_IMAGE_UNITS",))
         self.default_texture_unit = self._limits.MAX_TEXTURE_IMAGE_UNITS - 1
 
         self._screen = DefaultFrameBuffer(self)
         self.active_program: Optional[Program] = None
         self.active_framebuffer: Framebuffer = self._screen
 
+        # Buffer reads waiting on their fence, polled at the end of each frame
+        self._readbacks: List["Readback"] = []
+        # Queries waiting on their results, polled the same way
+        self._queries: List[Query] = []
+        # GL query objects of released queries made by query(), ready for reuse
+        self._query_pool: QueryPool = {}
+        self._extensions: Dict[str, object] = {}
+
+        #: Live GL objects and their sizes, by type
+        self.objects = ObjectStats()
+        self._gc_mode = ""
+        self.gc_mode = gc_mode
+        # Objects released with gc_mode 'deferred', deleted by gc()
+        self._garbage: List[Tuple[str, object]] = []
+        #: Number of frames finished by :py:meth:`end_frame`
+        self.frame = 0
+        #: Programs shared between identical shader sources, see :py:meth:`program`
+        self.program_cache = ProgramCache(self)
+
+    @property
+    def limits(self) -> "Limits":
+        return self._limits
+
+    def extension(self, name: str):
+        """The WebGL extension object for ``name``, or None if not supported."""
+        if name not in self._extensions:
+            self._extensions[name] = self.gl.getExtension(name)
+        return self._extensions[name]
+
+    def query(self, *, time: bool = True, samples: bool = True, primitives: bool = True) -> Query:
+        """
+        Create a :py:class:`Query` measuring the GPU work in a ``with`` block.
+
+        The query is pooled: once it is released or garbage collected its GL
+        objects are reused by the next query made here.
+        """
+        return Query(self, time=time, samples=samples, primitives=primitives, pooled=True)
+
     def clear(self, color: Tuple[float, float, float, float]):
         # Temporary
-        self.gl.clearDepth(1.0)
-        self.gl.enable(self.gl.DEPTH_TEST)
-        self.gl.depthFunc(self.gl.LEQUAL)
+        self.state.clear_depth(1.0)
+        self.state.enable(constants.DEPTH_TEST)
+        self.state.depth_func(constants.LEQUAL)
+
+        self.state.clear_color(color)
+        self.gl.clear(constants.COLOR_BUFFER_BIT | constants.DEPTH_BUFFER_BIT)
+
+    @property
+    def gc_mode(self) -> str:
+        """
+        When the GL objects of released resources are deleted.
+
+        * ``immediate``: as soon as ``release()`` is called
+        * ``deferred``: by :py:meth:`gc`, which runs at the end of every frame
+        * ``auto``: like immediate, and objects that are garbage collected
+          without being released are deleted too
+        """
+        return self._gc_mode
+
+    @gc_mode.setter
+    def gc_mode(self, value: str):
+        if value not in Context.gc_modes:
+            raise ValueError(f"gc_mode must be one of {Context.gc_modes}, not '{value}'")
+        self._gc_mode = value
+
+    def _track(self, obj, kind: str, glo, size: int = 0) -> Optional[weakref.finalize]:
+        """Count a newly created GL object. Returns its finalizer in 'auto' mode."""
+        self.objects.add(kind, glo, size)
+        if self._gc_mode != "auto":
+            return None
+
+        finalizer = weakref.finalize(obj, self._release, glo)
+        # The page, and the GL context with it, is gone by then anyway
+        finalizer.atexit = False
+        return finalizer
+
+    def _release(self, glo):
+        kind = self.objects.remove(glo)
+        if self._gc_mode == "deferred":
+            self._garbage.append((kind, glo))
+        else:
+            self._delete(kind, glo)
+
+    def _delete(self, kind: str, glo):
+        getattr(self.gl, Context._deleters[kind])(glo)
+        self.state.forget(glo)
+
+    def gc(self) -> int:
+        """Delete the objects released since the last call. Returns how many."""
+        garbage, self._garbage = self._garbage, []
+        for kind, glo in garbage:
+            self._delete(kind, glo)
+        return len(garbage)
 
-        self.gl.clearColor(*color)
-        self.gl.clear(self.gl.COLOR_BUFFER_BIT | self.gl.DEPTH_BUFFER_BIT)
+    def end_frame(self):
+        """Called once the frame has been drawn, to finish work spanning frames."""
+        if self._readbacks:
+            self._readbacks = [readback for readback in self._readbacks if not readback.poll()]
+        if self._queries:
+            # Reading the flag resets it, so it is read once for all pending queries
+            disjoint = False
+            if self.extension(TIMER_QUERY_EXTENSION) is not None:
+                disjoint = bool(self.gl.getParameter(constants.GPU_DISJOINT_EXT))
+            self._queries = [query for query in self._queries if not query.poll(disjoint)]
+        if self._garbage:
+            self.gc()
+        if self._commands is not None:
+            self._commands.replay()
+        if self.stats is not None:
+            self.stats.end_frame()
+        self.frame += 1
 
-    def program(self, *, vertex_shader: str, fragment_shader: str) -> Program:
-        return Program.create(self, vertex_shader, fragment_shader)
+    def native_gl(self):
+        """
+        The WebGL context itself, for passing to JavaScript. Any recorded calls
+        are replayed first, so JavaScript sees the state they set.
+        """
+        if self._commands is not None:
+            self._commands.replay()
+        return self._native_gl
+
+    def program(self, *, vertex_shader: str, fragment_shader: str, defines: Defines = None) -> Program:
+        """
+        A program for the shader sources, from :py:attr:`program_cache`. Sources
+        that only differ in formatting or comments share one program, which is
+        compiled and linked on first use. ``release()`` gives the program back
+        to the cache, and ``program_cache.evict()`` deletes unused programs.
+
+        :param str vertex_shader: Source of the vertex shader
+        :param str fragment_shader: Source of the fragment shader
+        :param dict defines: Names to ``#define`` in both shaders, with their values
+        """
+        return self.program_cache.get(vertex_shader, fragment_shader, defines)
+
+
+class ObjectStats:
+    """
+    Live GL objects created through a context, with their sizes in bytes.
+
+    Counts go up when an object is created and down when it is released, so
+    numbers that keep growing over a long session point at a leak.
+    """
+
+    def __init__(self):
+        # Keyed by id, holding on to the handle so the id can't be reused
+        self._objects: Dict[int, Tuple[str, int, object]] = {}
+        self._totals: Dict[str, List[int]] = {kind: [0, 0] for kind in Context._deleters}
+
+    def add(self, kind: str, glo, size: int = 0):
+        self._objects[id(glo)] = kind, size, glo
+        totals = self._totals[kind]
+        totals[0] += 1
+        totals[1] += size
+
+    def resize(self, glo, size: int):
+        kind, old_size, _ = self._objects[id(glo)]
+        self._objects[id(glo)] = kind, size, glo
+        self._totals[kind][1] += size - old_size
+
+    def remove(self, glo) -> str:
+        kind, size, _ = self._objects.pop(id(glo))
+        totals = self._totals[kind]
+        totals[0] -= 1
+        totals[1] -= size
+        return kind
+
+    def count(self, kind: str) -> int:
+        return self._totals[kind][0]
+
+    def size(self, kind: str) -> int:
+        return self._totals[kind][1]
+
+    @property
+    def total_size(self) -> int:
+        return sum(size for _, size in self._totals.values())
+
+    def snapshot(self) -> Dict[str, Tuple[int, int]]:
+        """``{type: (count, bytes)}`` for every type of object."""
+        return {kind: (count, size) for kind, (count, size) in self._totals.items()}
+
+    def __repr__(self) -> str:
+        live = ", ".join(f"{kind}={count} ({size} B)" for kind, (count, size) in self._totals.items())
+        return f"<ObjectStats {live}>"
 
 
 class Limits:
-    def __init__(self, ctx):
+    """
+    The implementation limits of the WebGL context.
+
+    Every ``getParameter`` call is a round trip into JavaScript, so values are
+    only queried when first read and then remembered. Values needed up front can
+    be fetched together with :py:meth:`prefetch`, which costs a single call.
+    """
+
+    _params = {
+        "VENDOR": constants.VENDOR,
+        "RENDERER": constants.RENDERER,
+        "SAMPLE_BUFFERS": constants.SAMPLE_BUFFERS,
+        "SUBPIXEL_BITS": constants.SUBPIXEL_BITS,
+        "UNIFORM_BUFFER_OFFSET_ALIGNMENT": constants.UNIFORM_BUFFER_OFFSET_ALIGNMENT,
+        "MAX_ARRAY_TEXTURE_LAYERS": constants.MAX_ARRAY_TEXTURE_LAYERS,
+        "MAX_3D_TEXTURE_SIZE": constants.MAX_3D_TEXTURE_SIZE,
+        "MAX_COLOR_ATTACHMENTS": constants.MAX_COLOR_ATTACHMENTS,
+        "MAX_COMBINED_FRAGMENT_UNIFORM_COMPONENTS": constants.MAX_COMBINED_FRAGMENT_UNIFORM_COMPONENTS,
+        "MAX_COMBINED_TEXTURE_IMAGE_UNITS": constants.MAX_COMBINED_TEXTURE_IMAGE_UNITS,
+        "MAX_COMBINED_UNIFORM_BLOCKS": constants.MAX_COMBINED_UNIFORM_BLOCKS,
+        "MAX_COMBINED_VERTEX_UNIFORM_COMPONENTS": constants.MAX_COMBINED_VERTEX_UNIFORM_COMPONENTS,
+        "MAX_CUBE_MAP_TEXTURE_SIZE": constants.MAX_CUBE_MAP_TEXTURE_SIZE,
+        "MAX_DRAW_BUFFERS": constants.MAX_DRAW_BUFFERS,
+        "MAX_ELEMENT_INDICES": constants.MAX_ELEMENTS_INDICES,
+        "MAX_ELEMENT_VERTICES": constants.MAX_ELEMENTS_VERTICES,
+        "MAX_FRAGMENT_INPUT_COMPONENTS": constants.MAX_FRAGMENT_INPUT_COMPONENTS,
+        "MAX_FRAGMENT_UNIFORM_COMPONENTS": constants.MAX_FRAGMENT_UNIFORM_COMPONENTS,
+        "MAX_FRAGMENT_UNIFORM_VECTORS": constants.MAX_FRAGMENT_UNIFORM_VECTORS,
+        "MAX_FRAGMENT_UNIFORM_BLOCKS": constants.MAX_FRAGMENT_UNIFORM_BLOCKS,
+        "MAX_SAMPLES": constants.MAX_SAMPLES,
+        "MAX_RENDERBUFFER_SIZE": constants.MAX_RENDERBUFFER_SIZE,
+        "MAX_UNIFORM_BUFFER_BINDINGS": constants.MAX_UNIFORM_BUFFER_BINDINGS,
+        "MAX_TEXTURE_SIZE": constants.MAX_TEXTURE_SIZE,
+        "MAX_UNIFORM_BLOCK_SIZE": constants.MAX_UNIFORM_BLOCK_SIZE,
+        "MAX_VARYING_VECTORS": constants.MAX_VARYING_VECTORS,
+        "MAX_VERTEX_ATTRIBS": constants.MAX_VERTEX_ATTRIBS,
+        "MAX_VERTEX_TEXTURE_IMAGE_UNITS": constants.MAX_VERTEX_TEXTURE_IMAGE_UNITS,
+        "MAX_VERTEX_UNIFORM_COMPONENTS": constants.MAX_VERTEX_UNIFORM_COMPONENTS,
+        "MAX_VERTEX_UNIFORM_VECTORS": constants.MAX_VERTEX_UNIFORM_VECTORS,
+        "MAX_VERTEX_OUTPUT_COMPONENTS": constants.MAX_VERTEX_OUTPUT_COMPONENTS,
+        "MAX_VERTEX_UNIFORM_BLOCKS": constants.MAX_VERTEX_UNIFORM_BLOCKS,
+        "MAX_TEXTURE_IMAGE_UNITS": constants.MAX_TEXTURE_IMAGE_UNITS,
+        "MAX_TEXTURE_MAX_ANISOTROPY": constants.MAX_TEXTURE_MAX_ANISOTROPY_EXT,
+        "MAX_VIEWPORT_DIMS": constants.MAX_VIEWPORT_DIMS,
+        "MAX_TRANSFORM_FEEDBACK_SEPARATE_ATTRIBS": constants.MAX_TRANSFORM_FEEDBACK_SEPARATE_ATTRIBS,
+        "POINT_SIZE_RANGE": constants.ALIASED_POINT_SIZE_RANGE,
+    }
+
+    def __init__(self, ctx, prefetch: Iterable[str] = ()):
         self._ctx = ctx
-        self.VENDOR = self.get_param(constants.VENDOR)
-        self.RENDERER = self.get_param(constants.RENDERER)
-        self.SAMPLE_BUFFERS = self.get_param(constants.SAMPLE_BUFFERS)
-        self.SUBPIXEL_BITS = self.get_param(constants.SUBPIXEL_BITS)
-        self.UNIFORM_BUFFER_OFFSET_ALIGNMENT = self.get_param(
-            constants.UNIFORM_BUFFER_OFFSET_ALIGNMENT
-        )
-        self.MAX_ARRAY_TEXTURE_LAYERS = self.get_param(
-            constants.MAX_ARRAY_TEXTURE_LAYERS
-        )
-        self.MAX_3D_TEXTURE_SIZE = self.get_param(constants.MAX_3D_TEXTURE_SIZE)
-        self.MAX_COLOR_ATTACHMENTS = self.get_param(constants.MAX_COLOR_ATTACHMENTS)
-        self.MAX_COMBINED_FRAGMENT_UNIFORM_COMPONENTS = self.get_param(
-            constants.MAX_COMBINED_FRAGMENT_UNIFORM_COMPONENTS
-        )
-        self.MAX_COMBINED_TEXTURE_IMAGE_UNITS = self.get_param(
-            constants.MAX_COMBINED_TEXTURE_IMAGE_UNITS
-        )
-        self.MAX_COMBINED_UNIFORM_BLOCKS = self.get_param(
-            constants.MAX_COMBINED_UNIFORM_BLOCKS
-        )
-        self.MAX_COMBINED_VERTEX_UNIFORM_COMPONENTS = self.get_param(
-            constants.MAX_COMBINED_VERTEX_UNIFORM_COMPONENTS
-        )
-        self.MAX_CUBE_MAP_TEXTURE_SIZE = self.get_param(
-            constants.MAX_CUBE_MAP_TEXTURE_SIZE
-        )
-        self.MAX_DRAW_BUFFERS = self.get_param(constants.MAX_DRAW_BUFFERS)
-        self.MAX_ELEMENT_INDICES = self.get_param(constants.MAX_ELEMENTS_INDICES)
-        self.MAX_ELEMENT_VERTICES = self.get_param(constants.MAX_ELEMENTS_VERTICES)
-        self.MAX_FRAGMENT_INPUT_COMPONENTS = self.get_param(
-            constants.MAX_FRAGMENT_INPUT_COMPONENTS
-        )
-        self.MAX_FRAGMENT_UNIFORM_COMPONENTS = self.get_param(
-            constants.MAX_FRAGMENT_INPUT_COMPONENTS
-        )
-        self.MAX_FRAGMENT_UNIFORM_VECTORS = self.get_param(
-            constants.MAX_FRAGMENT_UNIFORM_VECTORS
-        )
-        self.MAX_FRAGMENT_UNIFORM_BLOCKS = self.get_param(
-            constants.MAX_FRAGMENT_UNIFORM_BLOCKS
-        )
-        self.MAX_SAMPLES = self.get_param(constants.MAX_SAMPLES)
-        self.MAX_RENDERBUFFER_SIZE = self.get_param(constants.MAX_RENDERBUFFER_SIZE)
-        self.MAX_UNIFORM_BUFFER_BINDINGS = self.get_param(
-            constants.MAX_UNIFORM_BUFFER_BINDINGS
-        )
-        self.MAX_TEXTURE_SIZE = self.get_param(constants.MAX_TEXTURE_SIZE)
-        self.MAX_UNIFORM_BLOCK_SIZE = self.get_param(constants.MAX_UNIFORM_BLOCK_SIZE)
-        self.MAX_VARYING_VECTORS = self.get_param(constants.MAX_VARYING_VECTORS)
-        self.MAX_VERTEX_ATTRIBS = self.get_param(constants.MAX_VERTEX_ATTRIBS)
-        self.MAX_VERTEX_TEXTURE_IMAGE_UNITS = self.get_param(
-            constants.MAX_VERTEX_TEXTURE_IMAGE_UNITS
-        )
-        self.MAX_VERTEX_UNIFORM_COMPONENTS = self.get_param(
-            constants.MAX_VERTEX_UNIFORM_COMPONENTS
-        )
-        self.MAX_VERTEX_UNIFORM_VECTORS = self.get_param(
-            constants.MAX_VERTEX_UNIFORM_VECTORS
-        )
-        self.MAX_VERTEX_OUTPUT_COMPONENTS = self.get_param(
-            constants.MAX_VERTEX_OUTPUT_COMPONENTS
-        )
-        self.MAX_VERTEX_UNIFORM_BLOCKS = self.get_param(
-            constants.MAX_VERTEX_UNIFORM_BLOCKS
-        )
-        self.MAX_TEXTURE_IMAGE_UNITS = self.get_param(constants.MAX_TEXTURE_IMAGE_UNITS)
-        self.MAX_TEXTURE_MAX_ANISOTROPY = self.get_param(
-            constants.MAX_TEXTURE_MAX_ANISOTROPY_EXT
-        )
-        self.MAX_VIEWPORT_DIMS = self.get_param(constants.MAX_VIEWPORT_DIMS)
-        self.MAX_TRANSFORM_FEEDBACK_SEPARATE_ATTRIBS = self.get_param(
-            constants.MAX_TRANSFORM_FEEDBACK_SEPARATE_ATTRIBS
-        )
-        self.POINT_SIZE_RANGE = self.get_param(constants.ALIASED_POINT_SIZE_RANGE)
+        self._get_params = js.Function.new("gl", "enums", GET_PARAMS_SOURCE)
+        if prefetch:
+            self.prefetch(prefetch)
+
+    def __getattr__(self, name: str):
+        # Only reached for values not queried yet
+        try:
+            enum = Limits._params[name]
+        except KeyError:
+            raise AttributeError(f"'Limits' has no attribute '{name}'")
+
+        value = self.get_param(enum)
+        setattr(self, name, value)
+        return value
+
+    def prefetch(self, names: Iterable[str]):
+        """Query all the given values that are not known yet in a single call."""
+        names = [name for name in names if name not in self.__dict__]
+        if not names:
+            return
+
+        enums = to_js([Limits._params[name] for name in names])
+        values = self._get_params(self._ctx.native_gl(), enums)
+        for i, name in enumerate(names):
+            setattr(self, name, values[i])
 
     def get_param(self, enum: int):
-        return self._ctx.gl.getParameter(enum)
+        return self._ctx.native_gl().getParameter(enum)
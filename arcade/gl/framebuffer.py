@@ -8,12 +8,22 @@ if TYPE_CHECKING:
 
 
 class Framebuffer:
+    _statuses = {
+        constants.FRAMEBUFFER_INCOMPLETE_ATTACHMENT: "FRAMEBUFFER_INCOMPLETE_ATTACHMENT",
+        constants.FRAMEBUFFER_INCOMPLETE_MISSING_ATTACHMENT: "FRAMEBUFFER_INCOMPLETE_MISSING_ATTACHMENT",
+        constants.FRAMEBUFFER_INCOMPLETE_DIMENSIONS: "FRAMEBUFFER_INCOMPLETE_DIMENSIONS",
+        constants.FRAMEBUFFER_UNSUPPORTED: "FRAMEBUFFER_UNSUPPORTED",
+        constants.FRAMEBUFFER_INCOMPLETE_MULTISAMPLE: "FRAMEBUFFER_INCOMPLETE_MULTISAMPLE",
+    }
+
     def __init__(
         self, ctx: "Context", *, color_attachments=None, depth_attachment=None
     ):
         self._ctx = ctx
         self._glo = self._ctx.gl.createFramebuffer()
 
+        if color_attachments is None:
+            color_attachments = []
         self._color_attachments = (
             color_attachments
             if isinstance(color_attachments, list)
@@ -24,7 +34,7 @@ class Framebuffer:
         self._depth_mask = True
         self._prev_fbo = None
 
-        self._ctx.gl.bindFramebuffer(constants.FRAMEBUFFER, self._glo)
+        self._ctx.state.bind_framebuffer(self._glo)
 
         self._width, self._height = self._detect_size()
         self._viewport = 0, 0, self._width, self._height
@@ -45,6 +55,7 @@ class Framebuffer:
                 constants.DEPTH_ATTACHMENT,
                 self.depth_attachment._target,
                 self.depth_attachment.glo,
+                0,
             )
 
         self._check_completeness()
@@ -56,10 +67,67 @@ class Framebuffer:
 
         self._ctx.active_framebuffer.use(force=True)
 
+        self._finalizer = self._ctx._track(self, "Framebuffer", self._glo)
+
     @property
     def glo(self):
         return self._glo
 
+    @property
+    def width(self) -> int:
+        return self._width
+
+    @property
+    def height(self) -> int:
+        return self._height
+
+    @property
+    def size(self) -> Tuple[int, int]:
+        return self._width, self._height
+
+    @property
+    def color_attachments(self):
+        return self._color_attachments
+
+    @property
+    def depth_attachment(self):
+        return self._depth_attachment
+
+    def _detect_size(self) -> Tuple[int, int]:
+        attachments = list(self._color_attachments)
+        if self._depth_attachment is not None:
+            attachments.append(self._depth_attachment)
+        if not attachments:
+            raise ValueError("Framebuffer needs at least one attachment")
+
+        sizes = {tex.size for tex in attachments}
+        if len(sizes) > 1:
+            raise ValueError(f"All framebuffer attachments must have the same size, not {sizes}")
+        return sizes.pop()
+
+    def _check_completeness(self):
+        status = self._ctx.gl.checkFramebufferStatus(constants.FRAMEBUFFER)
+        if status != constants.FRAMEBUFFER_COMPLETE:
+            raise ValueError(
+                f"Framebuffer is incomplete: {Framebuffer._statuses.get(status, status)}"
+            )
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.release()
+
+    def release(self) -> None:
+        """Delete the GL framebuffer. The framebuffer can't be used afterwards."""
+        if self._glo is None:
+            return
+
+        if self._finalizer is not None:
+            self._finalizer.detach()
+        self._ctx._release(self._glo)
+        self._glo = None
+
     @contextmanager
     def activate(self):
         prev_fbo = self._ctx.active_framebuffer
@@ -77,17 +145,17 @@ class Framebuffer:
         if self._ctx.active_framebuffer == self and not force:
             return
 
-        self._ctx.gl.bindFramebuffer(constants.FRAMEBUFFER, self._glo)
+        self._ctx.state.bind_framebuffer(self._glo)
 
         if self._draw_buffers:
             self._ctx.gl.drawBuffers(self._draw_buffers)
 
-        self._ctx.gl.depthMask(self._depth_mask)
-        self._ctx.gl.viewport(*self._viewport)
+        self._ctx.state.depth_mask(self._depth_mask)
+        self._ctx.state.viewport(self._viewport)
         if self._scissor is not None:
-            self._ctx.gl.scissor(*self._scissor)
+            self._ctx.state.scissor(self._scissor)
         else:
-            self._ctx.gl.scissor(*self._viewport)
+            self._ctx.state.scissor(self._viewport)
 
     def clear(
         self,
@@ -98,3 +166,25 @@ class Framebuffer:
         viewport: Optional[Tuple[int, int, int, int]] = None
     ):
         pass
+
+
+class DefaultFrameBuffer(Framebuffer):
+    """The framebuffer of the canvas the context renders to."""
+
+    def __init__(self, ctx: "Context"):
+        self._ctx = ctx
+        # Owned by the canvas, release() leaves it alone
+        self._glo = None
+        self._finalizer = None
+        self._color_attachments = []
+        self._depth_attachment = None
+        self._samples = 0
+        self._depth_mask = True
+        self._prev_fbo = None
+        # The back buffer can't be given draw buffers other than the default
+        self._draw_buffers = []
+
+        self._width = ctx.gl.drawingBufferWidth
+        self._height = ctx.gl.drawingBufferHeight
+        self._viewport = 0, 0, self._width, self._height
+        self._scissor = None
@@ -1,4 +1,4 @@
-from typing import TYPE_CHECKING, Iterable
+from typing import TYPE_CHECKING, Iterable, List, Optional, Sequence
 
 from arcade.gl import constants
 
@@ -6,34 +6,102 @@ from .types import AttribFormat, GLTypes
 
 if TYPE_CHECKING:
     from arcade.gl import Context
+    from arcade.gl.program_cache import ProgramCache
 
 
 class Program:
-    def __init__(self, ctx: "Context", *, vertex_shader: str, fragment_shader: str):
+    """
+    A linked vertex and fragment shader.
+
+    Programs made by :py:meth:`Context.program` come from the context's
+    :py:class:`~arcade.gl.program_cache.ProgramCache` and may be shared, in
+    which case :py:meth:`release` only gives up this user's reference.
+
+    :param Context ctx: The context the program belongs to
+    :param str vertex_shader: Source of the vertex shader
+    :param str fragment_shader: Source of the fragment shader
+    :param shaders: Already compiled vertex and fragment shader objects to link
+                    instead of compiling the sources. They are left for the
+                    caller to delete
+    """
+
+    def __init__(
+        self,
+        ctx: "Context",
+        *,
+        vertex_shader: str,
+        fragment_shader: str,
+        shaders: Optional[Sequence[object]] = None,
+    ):
         self._ctx = ctx
         self._glo = self._ctx.gl.createProgram()
         self._geometry_info = (0, 0, 0)
         self._attributes = []
-
-        raw_shaders = [
-            (vertex_shader, constants.VERTEX_SHADER),
-            (fragment_shader, constants.FRAGMENT_SHADER),
-        ]
-
-        shaders = []
-        for raw_shader, shader_type in raw_shaders:
-            shader = Program.compile_shader(self._ctx.gl, raw_shader, shader_type)
-            self._ctx.gl.attachShader(self._glo, shader)
-            shaders.append(shader)
-
-        Program.link(self._glo)
+        # Set by the ProgramCache holding this program
+        self._cache: Optional["ProgramCache"] = None
+
+        owned = shaders is None
+        # Shaders compiled here, deleted with the program if anything fails
+        compiled: List[object] = []
+        try:
+            if owned:
+                compiled.append(Program.compile_shader(self._ctx.gl, vertex_shader, constants.VERTEX_SHADER))
+                compiled.append(Program.compile_shader(self._ctx.gl, fragment_shader, constants.FRAGMENT_SHADER))
+                shaders = compiled
+
+            for shader in shaders:
+                self._ctx.gl.attachShader(self._glo, shader)
+
+            Program.link(self._ctx.gl, self._glo)
+        except RuntimeError:
+            self._ctx.gl.deleteProgram(self._glo)
+            for shader in compiled:
+                self._ctx.gl.deleteShader(shader)
+            raise
 
         for shader in shaders:
             self._ctx.gl.detachShader(self._glo, shader)
-            self._ctx.gl.deleteShader(shader)
+            if owned:
+                self._ctx.gl.deleteShader(shader)
 
         self._introspect_attributes()
 
+        self._finalizer = self._ctx._track(self, "Program", self._glo)
+
+    @property
+    def glo(self):
+        return self._glo
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.release()
+
+    def release(self) -> None:
+        """
+        Delete the GL program. The program can't be used afterwards.
+
+        For a program from the context's cache this drops one reference, and the
+        program stays cached until it is evicted.
+        """
+        if self._cache is not None:
+            self._cache.release(self)
+            return
+        self._delete()
+
+    def _delete(self) -> None:
+        if self._glo is None:
+            return
+
+        if self._finalizer is not None:
+            self._finalizer.detach()
+        self._ctx._release(self._glo)
+        self._glo = None
+
+    def use(self):
+        self._ctx.state.use_program(self._glo)
+
     @property
     def attributes(self) -> Iterable[AttribFormat]:
         return self._attributes
@@ -65,12 +133,10 @@ class Program:
         gl.shaderSource(shader, source)
         gl.compileShader(shader)
 
-        if not gl.getShaderParameter(shader, gl.COMPILE_STATUS):
-            print(
-                f"Error occurred while compiling shaders: {gl.getShaderInfoLog(shader)}"
-            )
+        if not gl.getShaderParameter(shader, constants.COMPILE_STATUS):
+            message = gl.getShaderInfoLog(shader)
             gl.deleteShader(shader)
-            return None
+            raise RuntimeError(f"Error occurred while compiling shader: {message}")
 
         return shader
 
@@ -0,0 +1,242 @@
+import hashlib
+import re
+from typing import TYPE_CHECKING, Dict, List, Mapping, Optional, Tuple
+
+from arcade.gl import constants
+from arcade.gl.program import Program
+
+if TYPE_CHECKING:
+    from arcade.gl import Context
+
+_COMMENTS = re.compile(r"//[^\n]*|/\*.*?\*/", re.DOTALL)
+_WHITESPACE = re.compile(r"[ \t\r\f\v]+")
+
+Defines = Optional[Mapping[str, object]]
+
+
+def normalize_source(source: str) -> str:
+    """
+    The shader source without comments, blank lines and differences in
+    whitespace, so sources that only differ in formatting compare equal.
+    """
+    lines = (_WHITESPACE.sub(" ", line).strip() for line in _COMMENTS.sub("", source).splitlines())
+    return "\n".join(line for line in lines if line)
+
+
+def apply_defines(source: str, defines: Defines) -> str:
+    """
+    Add a ``#define`` line for each of ``defines`` to the source, after the
+    ``#version`` line if there is one, as that has to come first.
+    """
+    if not defines:
+        return source
+
+    lines = "".join(f"#define {name} {value}\n" for name, value in sorted(defines.items()))
+    match = re.match(r"\s*#version[^\n]*\n", source)
+    if match is None:
+        return lines + source
+    return source[:match.end()] + lines + source[match.end():]
+
+
+def _hash(*parts: str) -> str:
+    digest = hashlib.sha1()
+    for part in parts:
+        digest.update(part.encode())
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+class _Shader:
+    __slots__ = ("glo", "users")
+
+    def __init__(self, glo):
+        self.glo = glo
+        # Number of cached programs linked from this shader
+        self.users = 0
+
+
+class _Entry:
+    __slots__ = ("program", "refs", "shader_keys")
+
+    def __init__(self, program: Program, shader_keys: Tuple[str, str]):
+        self.program = program
+        self.refs = 0
+        self.shader_keys = shader_keys
+
+
+class ProgramCache:
+    """
+    Shares programs made from the same shader sources.
+
+    Programs are keyed by a hash of their normalized vertex and fragment source
+    plus the defines they were built with, so :py:meth:`get` compiles and links
+    each combination only once. Compiled shader objects are cached too, and
+    reused by programs that have a stage in common, such as several materials
+    built on one vertex shader.
+
+    Every :py:meth:`get` takes a reference that :py:meth:`release` (or
+    ``Program.release``) gives back. Unreferenced programs are kept, ready to
+    be handed out again, until :py:meth:`evict` deletes them.
+
+    :param Context ctx: The context the programs belong to
+    """
+
+    def __init__(self, ctx: "Context"):
+        self._ctx = ctx
+        self._entries: Dict[str, _Entry] = {}
+        self._programs: Dict[int, str] = {}
+        self._shaders: Dict[str, _Shader] = {}
+        # Source as given -> shader key, so a hit doesn't normalize and hash again
+        self._source_keys: Dict[Tuple[int, str, str], str] = {}
+        #: Requests served from the cache
+        self.hits = 0
+        #: Requests that had to link a new program
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, program: Program) -> bool:
+        return id(program) in self._programs
+
+    @property
+    def shader_count(self) -> int:
+        """Number of compiled shader objects held."""
+        return len(self._shaders)
+
+    def key(self, vertex_shader: str, fragment_shader: str, defines: Defines = None) -> str:
+        """The key a program is cached under."""
+        return _hash(
+            self._shader_key(vertex_shader, constants.VERTEX_SHADER, defines),
+            self._shader_key(fragment_shader, constants.FRAGMENT_SHADER, defines),
+        )
+
+    def get(self, vertex_shader: str, fragment_shader: str, defines: Defines = None) -> Program:
+        """
+        A program for the sources, taking a reference to it. Compiles and links
+        only what isn't cached yet.
+
+        :param str vertex_shader: Source of the vertex shader
+        :param str fragment_shader: Source of the fragment shader
+        :param dict defines: Names to ``#define`` in both shaders, with their values
+        """
+        shader_keys = (
+            self._shader_key(vertex_shader, constants.VERTEX_SHADER, defines),
+            self._shader_key(fragment_shader, constants.FRAGMENT_SHADER, defines),
+        )
+        key = _hash(*shader_keys)
+        entry = self._entries.get(key)
+        if entry is not None:
+            self.hits += 1
+            entry.refs += 1
+            return entry.program
+
+        self.misses += 1
+        vertex_source = apply_defines(vertex_shader, defines)
+        fragment_source = apply_defines(fragment_shader, defines)
+        compiled: List[str] = []
+        try:
+            for shader_key, source, shader_type in (
+                (shader_keys[0], vertex_source, constants.VERTEX_SHADER),
+                (shader_keys[1], fragment_source, constants.FRAGMENT_SHADER),
+            ):
+                if shader_key not in self._shaders:
+                    glo = Program.compile_shader(self._ctx.gl, source, shader_type)
+                    self._ctx.objects.add("Shader", glo)
+                    self._shaders[shader_key] = _Shader(glo)
+                    compiled.append(shader_key)
+
+            program = Program(
+                self._ctx,
+                vertex_shader=vertex_source,
+                fragment_shader=fragment_source,
+                shaders=[self._shaders[shader_key].glo for shader_key in shader_keys],
+            )
+        except RuntimeError:
+            # Shaders compiled for a program that failed to link have no other users
+            for shader_key in compiled:
+                self._delete_shader(shader_key)
+            raise
+
+        for shader_key in shader_keys:
+            self._shaders[shader_key].users += 1
+        program._cache = self
+        entry = self._entries[key] = _Entry(program, shader_keys)
+        entry.refs = 1
+        self._programs[id(program)] = key
+        return program
+
+    def refs(self, program: Program) -> int:
+        """Number of references taken to a cached program."""
+        return self._entries[self._programs[id(program)]].refs
+
+    def release(self, program: Program) -> None:
+        """Give back a reference to a program. The program stays cached."""
+        key = self._programs.get(id(program))
+        if key is None:
+            raise ValueError(f"{program!r} is not in this cache")
+
+        entry = self._entries[key]
+        if entry.refs > 0:
+            entry.refs -= 1
+
+    def evict(self, program: Optional[Program] = None) -> int:
+        """
+        Delete ``program``, or every program nobody holds a reference to when
+        not given, along with shaders no cached program uses anymore. Returns
+        the number of programs deleted.
+
+        :raises ValueError: If ``program`` is still referenced
+        """
+        if program is not None:
+            key = self._programs.get(id(program))
+            if key is None:
+                raise ValueError(f"{program!r} is not in this cache")
+            refs = self._entries[key].refs
+            if refs:
+                raise ValueError(f"{program!r} is still referenced {refs} time(s)")
+            keys = [key]
+        else:
+            keys = [key for key, entry in self._entries.items() if not entry.refs]
+
+        for key in keys:
+            self._evict(key)
+        return len(keys)
+
+    def clear(self) -> None:
+        """Delete every cached program and shader, including those still referenced."""
+        for key in list(self._entries):
+            self._evict(key)
+
+    def _evict(self, key: str) -> None:
+        entry = self._entries.pop(key)
+        del self._programs[id(entry.program)]
+        entry.program._cache = None
+        entry.program._delete()
+
+        for shader_key in entry.shader_keys:
+            shader = self._shaders[shader_key]
+            shader.users -= 1
+            if not shader.users:
+                self._delete_shader(shader_key)
+
+    def _delete_shader(self, shader_key: str) -> None:
+        self._ctx._release(self._shaders.pop(shader_key).glo)
+        # Forget the sources that led to the shader too, or they pile up
+        for source_key in [source_key for source_key, key in self._source_keys.items() if key == shader_key]:
+            del self._source_keys[source_key]
+
+    def _shader_key(self, source: str, shader_type: int, defines: Defines) -> str:
+        defines_key = ";".join(f"{name}={value}" for name, value in sorted(defines.items())) if defines else ""
+        source_key = shader_type, source, defines_key
+        key = self._source_keys.get(source_key)
+        if key is None:
+            key = _hash(str(shader_type), normalize_source(source), defines_key)
+            self._source_keys[source_key] = key
+        return key
+
+    def __repr__(self) -> str:
+        return (
+            f"<ProgramCache programs={len(self._entries)} shaders={len(self._shaders)} "
+            f"hits={self.hits} misses={self.misses}>"
+        )
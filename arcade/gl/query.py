@@ -0,0 +1,174 @@
+import weakref
+from concurrent.futures import Future
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple
+
+from arcade.gl import constants
+
+if TYPE_CHECKING:
+    from arcade.gl import Context
+
+TIMER_QUERY_EXTENSION = "EXT_disjoint_timer_query_webgl2"
+
+# Free GL query objects by their targets, see Context.query
+QueryPool = Dict[Tuple[int, ...], List[Dict[int, object]]]
+
+
+class Query:
+    """
+    Measures the GPU work issued inside a ``with`` block.
+
+    WebGL only hands out query results after control has returned to the
+    browser, so they are never available in the frame they were made in.
+    :py:meth:`Context.end_frame` checks pending queries without blocking and
+    fills in the results once the GPU has them, typically a frame or two later.
+    ``future`` is resolved with the query at that point.
+
+    * ``time_elapsed``: GPU time in nanoseconds, using
+      ``EXT_disjoint_timer_query_webgl2``. None when the extension is missing,
+      or when the timer was disjoint, for example because the GPU changed
+      frequency, making the measurement meaningless
+    * ``samples_passed``: WebGL has no sample counting, only whether any
+      samples passed, so this is 1 or 0
+    * ``primitives_generated``: primitives written by transform feedback
+
+    A query can be used again once it is ready.
+
+    A pooled query takes its GL query objects from the context's pool and gives
+    them back when it is released or garbage collected, instead of deleting
+    them, so a new query every frame doesn't create new GL objects every frame.
+
+    :param Context ctx: The context the query belongs to
+    :param bool time: Measure GPU time
+    :param bool samples: Check whether any samples passed the depth test
+    :param bool primitives: Count primitives written by transform feedback
+    :param bool pooled: Reuse GL query objects through the context's pool
+    """
+
+    def __init__(
+        self,
+        ctx: "Context",
+        *,
+        time: bool = True,
+        samples: bool = True,
+        primitives: bool = True,
+        pooled: bool = False,
+    ):
+        self._ctx = ctx
+        gl = ctx.gl
+
+        targets = []
+        if time and ctx.extension(TIMER_QUERY_EXTENSION) is not None:
+            targets.append(constants.TIME_ELAPSED_EXT)
+        if samples:
+            targets.append(constants.ANY_SAMPLES_PASSED)
+        if primitives:
+            targets.append(constants.TRANSFORM_FEEDBACK_PRIMITIVES_WRITTEN)
+
+        self._pool = ctx._query_pool if pooled else None
+        free = self._pool.get(tuple(targets)) if self._pool is not None else None
+        if free:
+            self._queries: Dict[int, object] = free.pop()
+        else:
+            # One query object per target, as each measures one thing
+            self._queries = {target: gl.createQuery() for target in targets}
+            for glo in self._queries.values():
+                ctx.objects.add("Query", glo)
+        self._results: Dict[int, Optional[int]] = {}
+        self._pending = False
+        self._disjoint = False
+        self.future: Future = Future()
+
+        # Like Context._track, but a single finalizer for all the query objects,
+        # as they go back to the pool together
+        self._finalizer: Optional[weakref.finalize] = None
+        if ctx.gc_mode == "auto":
+            self._finalizer = weakref.finalize(self, Query._free, ctx, self._pool, self._queries)
+            self._finalizer.atexit = False
+
+    @property
+    def ready(self) -> bool:
+        """True when the results of the last measurement are available."""
+        return bool(self._results) and not self._pending
+
+    @property
+    def disjoint(self) -> bool:
+        """True if the timer was disjoint during the last measurement."""
+        return self._disjoint
+
+    @property
+    def time_elapsed(self) -> Optional[int]:
+        return self._results.get(constants.TIME_ELAPSED_EXT)
+
+    @property
+    def samples_passed(self) -> Optional[int]:
+        return self._results.get(constants.ANY_SAMPLES_PASSED)
+
+    @property
+    def primitives_generated(self) -> Optional[int]:
+        return self._results.get(constants.TRANSFORM_FEEDBACK_PRIMITIVES_WRITTEN)
+
+    def __enter__(self):
+        if self._pending:
+            raise RuntimeError("Query is still waiting for its previous results")
+
+        if self.future.done():
+            self.future = Future()
+        self._results = {}
+        self._disjoint = False
+        for target, glo in self._queries.items():
+            self._ctx.gl.beginQuery(target, glo)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        for target in self._queries:
+            self._ctx.gl.endQuery(target)
+        self._pending = True
+        self._ctx._queries.append(self)
+
+    def poll(self, disjoint: bool = False) -> bool:
+        """
+        Fetch the results if they are available. ``disjoint`` tells whether the
+        timer was disjoint since the last poll. Returns True when resolved.
+        """
+        if disjoint and constants.TIME_ELAPSED_EXT in self._queries:
+            self._disjoint = True
+
+        gl = self._ctx.gl
+        for glo in self._queries.values():
+            if not gl.getQueryParameter(glo, constants.QUERY_RESULT_AVAILABLE):
+                return False
+
+        for target, glo in self._queries.items():
+            if target == constants.TIME_ELAPSED_EXT and self._disjoint:
+                self._results[target] = None
+            else:
+                self._results[target] = int(gl.getQueryParameter(glo, constants.QUERY_RESULT))
+
+        self._pending = False
+        self.future.set_result(self)
+        return True
+
+    def release(self) -> None:
+        """
+        Delete the GL query objects, or give them back to the pool for a pooled
+        query. The query can't be used afterwards.
+        """
+        if self._pending:
+            self._ctx._queries.remove(self)
+            self._pending = False
+            # Results still to come would be picked up by the next user
+            self._pool = None
+        if self._finalizer is not None:
+            self._finalizer.detach()
+        Query._free(self._ctx, self._pool, self._queries)
+        self._queries = {}
+
+    @staticmethod
+    def _free(ctx: "Context", pool: Optional[QueryPool], queries: Dict[int, object]):
+        if not queries:
+            return
+        if pool is not None:
+            pool.setdefault(tuple(queries), []).append(queries)
+        else:
+            for glo in queries.values():
+                ctx._release(glo)
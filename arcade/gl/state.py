@@ -0,0 +1,202 @@
+from typing import Dict, Tuple
+
+from arcade.gl import constants
+
+# Stands in for state that has not been set through this cache yet, or that
+# may have been changed behind its back. Distinct from None, which unbinds.
+_UNKNOWN = object()
+
+
+class GLState:
+    """
+    Keeps track of the WebGL state set through it, and drops calls that would not
+    change anything.
+
+    Every call into ``gl`` crosses from Python into JavaScript, which costs far
+    more than the comparison made here. arcade.gl objects change state only
+    through ``ctx.state``. Code that calls ``gl`` directly for state tracked here
+    must call :py:meth:`invalidate` afterwards, or later calls may be skipped
+    wrongly.
+
+    Objects are compared by identity, so always pass the same handle object,
+    such as the ``glo`` of an arcade.gl object.
+    """
+
+    def __init__(self, gl):
+        self.gl = gl
+        self.invalidate()
+
+    def invalidate(self):
+        """Forget all tracked state, so the next call of every kind reaches ``gl``."""
+        self._buffers: Dict[int, object] = {}
+        self._program = _UNKNOWN
+        self._vertex_array = _UNKNOWN
+        self._framebuffer = _UNKNOWN
+        self._active_texture = _UNKNOWN
+        self._textures: Dict[Tuple[int, int], object] = {}
+        self._enabled: Dict[int, bool] = {}
+        self._blend_func = _UNKNOWN
+        self._blend_equation = _UNKNOWN
+        self._depth_func = _UNKNOWN
+        self._depth_mask = _UNKNOWN
+        self._clear_color = _UNKNOWN
+        self._clear_depth = _UNKNOWN
+        self._viewport = _UNKNOWN
+        self._scissor = _UNKNOWN
+        self._pixel_store: Dict[int, object] = {}
+
+    # Object bindings
+
+    def bind_buffer(self, target: int, glo):
+        if self._buffers.get(target, _UNKNOWN) is not glo:
+            self.gl.bindBuffer(target, glo)
+            self._buffers[target] = glo
+
+    def bind_buffer_for_write(self, target: int, glo, new: bool = False) -> int:
+        """
+        Bind a buffer to change its contents. Returns the target to pass to
+        ``bufferData`` and the like.
+
+        Binding to ELEMENT_ARRAY_BUFFER would replace the index buffer of the
+        bound vertex array, so index buffers are bound to COPY_WRITE_BUFFER
+        instead. A ``new`` buffer has to be bound to its own target once to get
+        its type, that is done with no vertex array bound.
+        """
+        if target != constants.ELEMENT_ARRAY_BUFFER:
+            self.bind_buffer(target, glo)
+            return target
+        if new:
+            self.bind_vertex_array(None)
+            self.bind_buffer(target, glo)
+            return target
+        self.bind_buffer(constants.COPY_WRITE_BUFFER, glo)
+        return constants.COPY_WRITE_BUFFER
+
+    def bound_buffer(self, target: int):
+        """The buffer bound to ``target``, or None when unknown."""
+        glo = self._buffers.get(target, _UNKNOWN)
+        return None if glo is _UNKNOWN else glo
+
+    def use_program(self, glo):
+        if self._program is not glo:
+            self.gl.useProgram(glo)
+            self._program = glo
+
+    def bind_vertex_array(self, glo):
+        if self._vertex_array is not glo:
+            self.gl.bindVertexArray(glo)
+            self._vertex_array = glo
+            # The element array binding is part of the vertex array object
+            self._buffers.pop(constants.ELEMENT_ARRAY_BUFFER, None)
+
+    def bind_framebuffer(self, glo):
+        if self._framebuffer is not glo:
+            self.gl.bindFramebuffer(constants.FRAMEBUFFER, glo)
+            self._framebuffer = glo
+
+    def active_texture(self, unit: int):
+        """Select texture unit ``unit``, counted from 0 rather than from TEXTURE0."""
+        if self._active_texture != unit:
+            self.gl.activeTexture(constants.TEXTURE0 + unit)
+            self._active_texture = unit
+
+    def bind_texture(self, target: int, glo, unit: int = None):
+        """Bind a texture to ``unit``, or to the active unit when not given."""
+        if unit is not None:
+            self.active_texture(unit)
+        key = (self._active_texture, target)
+        if self._textures.get(key, _UNKNOWN) is not glo:
+            self.gl.bindTexture(target, glo)
+            self._textures[key] = glo
+
+    def forget(self, glo):
+        """Drop bindings of a deleted object, which WebGL unbinds implicitly."""
+        for target, bound in list(self._buffers.items()):
+            if bound is glo:
+                del self._buffers[target]
+        for key, bound in list(self._textures.items()):
+            if bound is glo:
+                del self._textures[key]
+        if self._program is glo:
+            self._program = _UNKNOWN
+        if self._vertex_array is glo:
+            self._vertex_array = _UNKNOWN
+            self._buffers.pop(constants.ELEMENT_ARRAY_BUFFER, None)
+        if self._framebuffer is glo:
+            self._framebuffer = _UNKNOWN
+
+    # Fixed function state
+
+    def enable(self, cap: int):
+        if self._enabled.get(cap) is not True:
+            self.gl.enable(cap)
+            self._enabled[cap] = True
+
+    def disable(self, cap: int):
+        if self._enabled.get(cap) is not False:
+            self.gl.disable(cap)
+            self._enabled[cap] = False
+
+    def set_enabled(self, cap: int, enabled: bool):
+        if enabled:
+            self.enable(cap)
+        else:
+            self.disable(cap)
+
+    def blend_func(self, src_rgb: int, dst_rgb: int, src_alpha: int = None, dst_alpha: int = None):
+        if src_alpha is None:
+            src_alpha, dst_alpha = src_rgb, dst_rgb
+        value = (src_rgb, dst_rgb, src_alpha, dst_alpha)
+        if self._blend_func != value:
+            if src_rgb == src_alpha and dst_rgb == dst_alpha:
+                self.gl.blendFunc(src_rgb, dst_rgb)
+            else:
+                self.gl.blendFuncSeparate(*value)
+            self._blend_func = value
+
+    def blend_equation(self, mode_rgb: int, mode_alpha: int = None):
+        value = (mode_rgb, mode_rgb if mode_alpha is None else mode_alpha)
+        if self._blend_equation != value:
+            if value[0] == value[1]:
+                self.gl.blendEquation(mode_rgb)
+            else:
+                self.gl.blendEquationSeparate(*value)
+            self._blend_equation = value
+
+    def depth_func(self, func: int):
+        if self._depth_func != func:
+            self.gl.depthFunc(func)
+            self._depth_func = func
+
+    def depth_mask(self, flag: bool):
+        if self._depth_mask != flag:
+            self.gl.depthMask(flag)
+            self._depth_mask = flag
+
+    def clear_color(self, color: Tuple[float, float, float, float]):
+        color = tuple(color)
+        if self._clear_color != color:
+            self.gl.clearColor(*color)
+            self._clear_color = color
+
+    def clear_depth(self, depth: float):
+        if self._clear_depth != depth:
+            self.gl.clearDepth(depth)
+            self._clear_depth = depth
+
+    def viewport(self, viewport: Tuple[int, int, int, int]):
+        viewport = tuple(viewport)
+        if self._viewport != viewport:
+            self.gl.viewport(*viewport)
+            self._viewport = viewport
+
+    def scissor(self, scissor: Tuple[int, int, int, int]):
+        scissor = tuple(scissor)
+        if self._scissor != scissor:
+            self.gl.scissor(*scissor)
+            self._scissor = scissor
+
+    def pixel_store(self, pname: int, value):
+        if self._pixel_store.get(pname, _UNKNOWN) != value:
+            self.gl.pixelStorei(pname, value)
+            self._pixel_store[pname] = value
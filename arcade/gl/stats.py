@@ -0,0 +1,241 @@
+from collections import deque
+from typing import Deque, Dict, Optional
+
+from arcade.gl import constants
+
+# Calls that change state, counted once they get past the state cache
+STATE_CALLS = frozenset((
+    "activeTexture",
+    "bindBuffer",
+    "bindFramebuffer",
+    "bindTexture",
+    "bindVertexArray",
+    "blendEquation",
+    "blendEquationSeparate",
+    "blendFunc",
+    "blendFuncSeparate",
+    "clearColor",
+    "clearDepth",
+    "colorMask",
+    "cullFace",
+    "depthFunc",
+    "depthMask",
+    "disable",
+    "enable",
+    "frontFace",
+    "pixelStorei",
+    "scissor",
+    "useProgram",
+    "viewport",
+))
+
+BUFFER_UPLOADS = frozenset(("bufferData", "bufferSubData"))
+# Texture upload name -> index of the pixel data argument. srcOffset follows it,
+# and calls with fewer arguments are the overloads taking an image or element
+TEXTURE_UPLOADS = {
+    "texImage2D": 8,
+    "texSubImage2D": 8,
+    "texImage3D": 9,
+    "texSubImage3D": 10,
+}
+
+# Draw call name -> (index of the vertex count argument, index of the instance count argument)
+DRAW_CALLS = {
+    "drawArrays": (2, None),
+    "drawElements": (1, None),
+    "drawArraysInstanced": (2, 3),
+    "drawElementsInstanced": (1, 4),
+    "drawRangeElements": (3, None),
+}
+
+
+def primitive_count(mode: int, vertices: int) -> int:
+    if mode == constants.TRIANGLES:
+        return vertices // 3
+    if mode in (constants.TRIANGLE_STRIP, constants.TRIANGLE_FAN):
+        return max(vertices - 2, 0)
+    if mode == constants.LINES:
+        return vertices // 2
+    if mode == constants.LINE_STRIP:
+        return max(vertices - 1, 0)
+    if mode == constants.LINE_LOOP:
+        return vertices if vertices > 1 else 0
+    return vertices
+
+
+class FrameStats:
+    """What one frame cost in WebGL calls."""
+
+    __slots__ = (
+        "calls",
+        "draw_calls",
+        "primitives",
+        "buffer_bytes",
+        "texture_bytes",
+        "state_changes",
+    )
+
+    def __init__(self):
+        #: Number of calls per WebGL method
+        self.calls: Dict[str, int] = {}
+        self.draw_calls = 0
+        self.primitives = 0
+        self.buffer_bytes = 0
+        self.texture_bytes = 0
+        self.state_changes = 0
+
+    @property
+    def total_calls(self) -> int:
+        return sum(self.calls.values())
+
+    def as_dict(self) -> dict:
+        return {
+            "calls": dict(self.calls),
+            "total_calls": self.total_calls,
+            "draw_calls": self.draw_calls,
+            "primitives": self.primitives,
+            "buffer_bytes": self.buffer_bytes,
+            "texture_bytes": self.texture_bytes,
+            "state_changes": self.state_changes,
+        }
+
+    def __repr__(self) -> str:
+        return (
+            f"<FrameStats calls={self.total_calls} draws={self.draw_calls} "
+            f"primitives={self.primitives} state={self.state_changes} "
+            f"buffer_bytes={self.buffer_bytes} texture_bytes={self.texture_bytes}>"
+        )
+
+
+class GLStats:
+    """
+    Per-frame counters of the WebGL calls made through a context.
+
+    ``current`` collects the frame being drawn. :py:meth:`end_frame` moves it to
+    ``history``, which keeps the last ``history_size`` frames.
+    """
+
+    def __init__(self, history_size: int = 120):
+        self.current = FrameStats()
+        self.history: Deque[FrameStats] = deque(maxlen=history_size)
+        self.frames = 0
+
+    @property
+    def last(self) -> Optional[FrameStats]:
+        """The most recently finished frame."""
+        return self.history[-1] if self.history else None
+
+    def average(self, key: str) -> float:
+        """Average of a counter such as ``draw_calls`` over the history."""
+        if not self.history:
+            return 0.0
+        return sum(getattr(frame, key) for frame in self.history) / len(self.history)
+
+    def end_frame(self):
+        self.history.append(self.current)
+        self.current = FrameStats()
+        self.frames += 1
+
+
+class CountingGL:
+    """
+    Passes calls through to ``gl`` while counting them in ``stats.current``.
+
+    Each method is wrapped once, on first use, and plain attributes such as
+    constants are read straight from ``gl``. Byte counts of uploads come from
+    the ``length`` argument when given, and otherwise from ``byteLength`` of
+    the data.
+    """
+
+    def __init__(self, gl, stats: GLStats):
+        self.gl = gl
+        self.stats = stats
+
+    def __getattr__(self, name: str):
+        # Only reached for names not cached on the instance yet
+        value = getattr(self.gl, name)
+        if isinstance(value, (int, float, str)):
+            self.__dict__[name] = value
+            return value
+
+        method = self._wrap(name, value)
+        self.__dict__[name] = method
+        return method
+
+    def _wrap(self, name: str, method):
+        stats = self.stats
+
+        if name in DRAW_CALLS:
+            count_index, instances_index = DRAW_CALLS[name]
+
+            def call(*args):
+                frame = stats.current
+                frame.calls[name] = frame.calls.get(name, 0) + 1
+                frame.draw_calls += 1
+                primitives = primitive_count(args[0], args[count_index])
+                if instances_index is not None:
+                    primitives *= args[instances_index]
+                frame.primitives += primitives
+                return method(*args)
+
+        elif name in STATE_CALLS:
+
+            def call(*args):
+                frame = stats.current
+                frame.calls[name] = frame.calls.get(name, 0) + 1
+                frame.state_changes += 1
+                return method(*args)
+
+        elif name in BUFFER_UPLOADS:
+
+            def call(*args):
+                frame = stats.current
+                frame.calls[name] = frame.calls.get(name, 0) + 1
+                frame.buffer_bytes += _upload_size(args, 1 if name == "bufferData" else 2)
+                return method(*args)
+
+        elif name in TEXTURE_UPLOADS:
+            data_index = TEXTURE_UPLOADS[name]
+
+            def call(*args):
+                frame = stats.current
+                frame.calls[name] = frame.calls.get(name, 0) + 1
+                frame.texture_bytes += _texture_upload_size(args, data_index)
+                return method(*args)
+
+        else:
+
+            def call(*args):
+                frame = stats.current
+                frame.calls[name] = frame.calls.get(name, 0) + 1
+                return method(*args)
+
+        return call
+
+
+def _texture_upload_size(args, data_index: int) -> int:
+    if len(args) <= data_index:
+        return 0
+    data = args[data_index]
+    # Only typed arrays are counted: None allocates, a number is an offset into
+    # the bound pixel unpack buffer and images have no byte size to speak of
+    if data is None or isinstance(data, (int, float)) or not hasattr(data, "byteLength"):
+        return 0
+    if len(args) > data_index + 1:
+        # srcOffset counts elements, not bytes
+        return max(data.byteLength - args[data_index + 1] * data.BYTES_PER_ELEMENT, 0)
+    return data.byteLength
+
+
+def _upload_size(args, data_index: int) -> int:
+    data = args[data_index]
+    if isinstance(data, int):
+        # bufferData(target, size, usage) only allocates
+        return 0
+    # Both bufferData and bufferSubData take srcOffset and length as
+    # their fourth and fifth arguments
+    if len(args) > 4:
+        return args[4]
+    if len(args) > 3:
+        return data.byteLength - args[3]
+    return data.byteLength
@@ -1,9 +1,10 @@
 from typing import TYPE_CHECKING, Optional, Tuple
 
-from arcade import BufferProtocol
+from arcade.arcade_types import BufferProtocol
 from arcade.gl import constants
+from arcade.gl.buffer import js_view
 
-from .types import pixel_formats
+from .types import pixel_formats, pixel_type_kinds
 
 if TYPE_CHECKING:
     from arcade.gl import Context
@@ -43,16 +44,53 @@ class Texture:
         self._wrap_x = constants.REPEAT
         self._wrap_y = constants.REPEAT
 
-        self._ctx.gl.activeTexture(constants.TEXTURE0 + self._ctx.default_texture_unit)
         self._glo = self._ctx.gl.createTexture()
-        self._ctx.gl.bindTexture(self._target, self._glo)
+        self._ctx.state.bind_texture(self._target, self._glo, unit=self._ctx.default_texture_unit)
 
         self._texture_2d(data)
 
+        if self._depth:
+            size = self._width * self._height * 4
+        else:
+            size = self._width * self._height * self._components * self._component_size
+        self._finalizer = self._ctx._track(self, "Texture", self._glo, size)
+
     @property
     def glo(self):
         return self._glo
 
+    @property
+    def width(self) -> int:
+        return self._width
+
+    @property
+    def height(self) -> int:
+        return self._height
+
+    @property
+    def size(self) -> Tuple[int, int]:
+        return self._width, self._height
+
+    @property
+    def depth(self) -> bool:
+        return self._depth
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.release()
+
+    def release(self) -> None:
+        """Delete the GL texture. The texture can't be used afterwards."""
+        if self._glo is None:
+            return
+
+        if self._finalizer is not None:
+            self._finalizer.detach()
+        self._ctx._release(self._glo)
+        self._glo = None
+
     def _texture_2d(self, data):
         try:
             format_info = pixel_formats[self._dtype]
@@ -62,34 +100,33 @@ class Texture:
             )
         _format, _internal_format, self._type, self._component_size = format_info
 
-        self._ctx.gl.pixelStorei(constants.UNPACK_ALIGNMENT, self._alignment)
-        self._ctx.gl.pixelStorei(constants.PACK_ALIGNMENT, self._alignment)
+        self._ctx.state.pixel_store(constants.UNPACK_ALIGNMENT, self._alignment)
+        self._ctx.state.pixel_store(constants.PACK_ALIGNMENT, self._alignment)
 
         if self._depth:
-            self._ctx.gl.texImage2D(
-                self._target,
-                0,
-                constants.DEPTH_COMPONENT24,
-                self._width,
-                self._height,
-                0,
-                constants.DEPTH_COMPONENT,
-                constants.UNSIGNED_INT,
-                data,
-            )
-            self.compare_func = "<="
+            self._format = constants.DEPTH_COMPONENT
+            self._internal_format = constants.DEPTH_COMPONENT24
+            self._type = constants.UNSIGNED_INT
+            self._compare_func = "<="
         else:
             self._format = _format[self._components]
             self._internal_format = _internal_format[self._components]
 
-            self._ctx.gl.texImage2D(
-                self._target,
-                0,
-                self._internal_format,
-                self._width,
-                self._height,
-                0,
-                self._format,
-                self._type,
-                data,
-            )
+        if data is None:
+            self._tex_image_2d(None)
+        else:
+            with js_view(data, pixel_type_kinds[self._type]) as js_data:
+                self._tex_image_2d(js_data)
+
+    def _tex_image_2d(self, js_data):
+        self._ctx.gl.texImage2D(
+            self._target,
+            0,
+            self._internal_format,
+            self._width,
+            self._height,
+            0,
+            self._format,
+            self._type,
+            js_data,
+        )
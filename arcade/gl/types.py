@@ -1,7 +1,8 @@
 import re
-from typing import Iterable, List, Optional
+from typing import Iterable, List, Optional, Union
 
 from arcade.gl import Buffer, constants
+from arcade.gl.arena import BufferRange
 
 _float_base_format = (0, constants.RED, constants.RG, constants.RGB, constants.RGBA)
 _int_base_format = (
@@ -68,6 +69,18 @@ pixel_formats = {
     ),
 }
 
+# Pixel type -> the typed array kind (for js_view) WebGL requires for pixel data of that type
+pixel_type_kinds = {
+    constants.BYTE: "i8",
+    constants.UNSIGNED_BYTE: "u8",
+    constants.SHORT: "i16",
+    constants.UNSIGNED_SHORT: "u16",
+    constants.HALF_FLOAT: "u16",
+    constants.INT: "i32",
+    constants.UNSIGNED_INT: "u32",
+    constants.FLOAT: "f32",
+}
+
 
 class AttribFormat:
     """
@@ -101,9 +114,9 @@ class AttribFormat:
         self.name: str = name
         self.gl_type: int = gl_type
         self.components = components
-        self.bytes_per_component = (bytes_per_component,)
+        self.bytes_per_component = bytes_per_component
         self.offset = offset
-        self.lcoation = location
+        self.location = location
 
     @property
     def bytes_total(self) -> int:
@@ -125,13 +138,15 @@ class BufferDescription:
 
     def __init__(
         self,
-        buffer: Buffer,
+        buffer: Union[Buffer, BufferRange],
         formats: str,
         attributes: Iterable[str],
         normalized: Optional[Iterable[str]] = None,
         instanced: bool = False,
     ):
         self.buffer = buffer
+        # Byte offset of the data in the buffer, when it lives in a BufferArena
+        self.offset = buffer.offset if isinstance(buffer, BufferRange) else 0
         self.attributes = attributes
         self.normalized = set() if normalized is None else set(normalized)
         self.instanced = instanced
@@ -1,6 +1,7 @@
-from typing import Optional, Sequence
+from typing import Optional, Sequence, Union
 
 from arcade.gl import Buffer, BufferDescription, Context, Program, constants
+from arcade.gl.arena import BufferRange
 
 
 class VertexArray:
@@ -9,25 +10,57 @@ class VertexArray:
         ctx: "Context",
         program: Program,
         content: Sequence[BufferDescription],
-        index_buffer: Optional[Buffer] = None,
+        index_buffer: Optional[Union[Buffer, BufferRange]] = None,
         index_element_size: int = 4,
     ):
         self._ctx = ctx
         self._program = program
         self._content = content
         self._glo = None
+        self._index_offset = (
+            index_buffer.offset if isinstance(index_buffer, BufferRange) else 0
+        )
 
         self._build(program, content, index_buffer)
+        self._finalizer = self._ctx._track(self, "VertexArray", self._glo)
+
+    @property
+    def glo(self):
+        return self._glo
+
+    @property
+    def index_offset(self) -> int:
+        """
+        Byte offset of the first index in the index buffer, to be passed to
+        ``drawElements``. Non-zero when the indices are a :py:class:`BufferRange`.
+        """
+        return self._index_offset
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.release()
+
+    def release(self) -> None:
+        """Delete the GL vertex array. The vertex array can't be used afterwards."""
+        if self._glo is None:
+            return
+
+        if self._finalizer is not None:
+            self._finalizer.detach()
+        self._ctx._release(self._glo)
+        self._glo = None
 
     def _build(
         self, program: Program, content: Sequence[BufferDescription], index_buffer
     ):
         gl = self._ctx.gl
         self._glo = gl.createVertexArray()
-        gl.bindVertexArray(self._glo)
+        self._ctx.state.bind_vertex_array(self._glo)
 
         if index_buffer is not None:
-            gl.bindBuffer(constants.ELEMENT_ARRAY_BUFFER, index_buffer.glo)
+            self._ctx.state.bind_buffer(constants.ELEMENT_ARRAY_BUFFER, index_buffer.glo)
 
         descr_attribs = {
             attr.name: (descr, attr) for descr in content for attr in descr.formats
@@ -55,7 +88,7 @@ class VertexArray:
                 )
 
             gl.enableVertexAttribArray(prog_attr.location)
-            gl.bindBuffer(constants.ARRAY_BUFFER, buff_descr.buffer.glo)
+            self._ctx.state.bind_buffer(constants.ARRAY_BUFFER, buff_descr.buffer.glo)
 
             normalized = True if attr_descr.name in buff_descr.normalized else False
             gl.vertexAttribPointer(
@@ -64,7 +97,7 @@ class VertexArray:
                 attr_descr.gl_type,
                 normalized,
                 buff_descr.stride,
-                attr_descr.offset,
+                buff_descr.offset + attr_descr.offset,
             )
 
 
@@ -73,7 +106,7 @@ class Geometry:
         self,
         ctx: "Context",
         content: Optional[Sequence[BufferDescription]],
-        index_buffer: Optional[Buffer] = None,
+        index_buffer: Optional[Union[Buffer, BufferRange]] = None,
         mode: Optional[int] = None,
         index_element_size: int = 4,
     ):
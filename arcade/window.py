@@ -18,7 +18,14 @@ def set_window(window: Window) -> None:
     _window = window
 
 class Window:
-    def __init__(self, title: str, width: int, height: int):
+    def __init__(
+        self,
+        title: str,
+        width: int,
+        height: int,
+        record_commands: bool = False,
+        gl_stats: bool = False,
+    ):
         self.width = width
         self.height = height
 
@@ -29,7 +36,7 @@ class Window:
         self._canvas.height = height
         js.document.body.appendChild(self._canvas)
 
-        self.context = Context(self._canvas)
+        self.context = Context(self._canvas, record_commands=record_commands, stats=gl_stats)
 
         self.run_proxy = create_proxy(self.run)
         self._then = 0
@@ -51,6 +58,7 @@ class Window:
         self._then = now
 
         self.on_draw()
+        self.context.end_frame()
         self.on_update(delta_time)
 
         js.requestAnimationFrame(self.run_proxy)
@@ -0,0 +1,551 @@
+#! /usr/bin/env python
+"""
+Benchmarks of the Python side of arcade.gl.
+
+Runs arcade.gl on the headless WebGL2 backend, so no browser is needed, and
+measures the Python paths that run at load time or every frame. Micro
+benchmarks time single operations such as parsing a BufferDescription or
+building a VertexArray. Scenes draw synthetic frames (sprite batches, many
+small meshes, streaming uploads) and time whole frames. Both report the number
+of WebGL calls made, which doesn't depend on the machine.
+
+Results can be stored as a baseline and later runs compared against it. Any
+timing slower than the baseline by more than the threshold, or any increase in
+WebGL calls, is flagged and makes the script exit with status 1:
+
+    python benchmarks/bench_gl.py --save-baseline gl-baseline.json
+    python benchmarks/bench_gl.py --baseline gl-baseline.json --threshold 0.15
+
+The backend validates every call, which costs time that a browser's WebGL
+implementation spends too, in its own way. Timings are therefore only
+comparable between runs of this script, not with timings in a browser.
+"""
+
+import argparse
+import json
+import statistics
+import sys
+import time
+from array import array
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+import headless  # noqa: E402
+
+headless.install()
+
+import js  # noqa: E402
+
+import arcade  # noqa: E402
+from arcade.gl import (  # noqa: E402
+    Buffer,
+    BufferDescription,
+    Context,
+    Program,
+    StreamBuffer,
+    Texture,
+    VertexArray,
+    constants,
+)
+
+SPRITE_VERTEX_SHADER = """#version 300 es
+in vec2 in_pos;
+in vec2 in_uv;
+in vec4 in_color;
+uniform vec2 u_scroll;
+out vec2 v_uv;
+out vec4 v_color;
+void main() {
+    v_uv = in_uv;
+    v_color = in_color;
+    gl_Position = vec4(in_pos + u_scroll, 0.0, 1.0);
+}
+"""
+
+SPRITE_FRAGMENT_SHADER = """#version 300 es
+precision mediump float;
+uniform sampler2D u_texture;
+in vec2 v_uv;
+in vec4 v_color;
+out vec4 f_color;
+void main() {
+    f_color = texture(u_texture, v_uv) * v_color;
+}
+"""
+
+MESH_VERTEX_SHADER = """#version 300 es
+in vec3 in_pos;
+uniform vec2 u_offset;
+void main() {
+    gl_Position = vec4(in_pos.xy * 0.01 + u_offset, in_pos.z, 1.0);
+}
+"""
+
+MESH_FRAGMENT_SHADER = """#version 300 es
+precision mediump float;
+out vec4 f_color;
+void main() {
+    f_color = vec4(1.0);
+}
+"""
+
+POINT_VERTEX_SHADER = """#version 300 es
+in vec2 in_pos;
+in vec4 in_color;
+out vec4 v_color;
+void main() {
+    v_color = in_color;
+    gl_PointSize = 2.0;
+    gl_Position = vec4(in_pos, 0.0, 1.0);
+}
+"""
+
+POINT_FRAGMENT_SHADER = """#version 300 es
+precision mediump float;
+in vec4 v_color;
+out vec4 f_color;
+void main() {
+    f_color = v_color;
+}
+"""
+
+# Bytes per sprite vertex: 2f position, 2f uv, 4f1 color
+SPRITE_STRIDE = 20
+# Bytes per particle: 2f position, 4f1 color
+PARTICLE_STRIDE = 12
+
+
+def count_calls(gl, fn: Callable[[], object]) -> Dict[str, int]:
+    """Calls made on the headless WebGL context ``gl`` by one call of ``fn``, per method."""
+    gl.call_counts.clear()
+    fn()
+    return dict(gl.call_counts)
+
+
+def time_calls(fn: Callable[[], object], repeat: int, min_time: float) -> List[float]:
+    """
+    Seconds per call of ``fn``, one value per repeat. Each repeat makes enough
+    calls to take at least ``min_time`` seconds.
+    """
+    number = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time:
+            break
+        number *= 2
+
+    timings = [elapsed / number]
+    for _ in range(repeat - 1):
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        timings.append((time.perf_counter() - start) / number)
+    return timings
+
+
+def sprite_vertices(count: int) -> bytearray:
+    """Two triangles per sprite, laid out in a grid."""
+    columns = max(int(count ** 0.5), 1)
+    data = bytearray(count * 6 * SPRITE_STRIDE)
+    corners = ((0, 0), (1, 0), (1, 1), (0, 0), (1, 1), (0, 1))
+    vertex = array("f", [0.0] * 4)
+    color = bytes((255, 255, 255, 255))
+    offset = 0
+    for i in range(count):
+        x = (i % columns) / columns * 2 - 1
+        y = (i // columns) / columns * 2 - 1
+        for u, v in corners:
+            vertex[0] = x + u * 0.01
+            vertex[1] = y + v * 0.01
+            vertex[2] = u
+            vertex[3] = v
+            data[offset:offset + 16] = vertex.tobytes()
+            data[offset + 16:offset + 20] = color
+            offset += SPRITE_STRIDE
+    return data
+
+
+def cube_mesh() -> Tuple[array, array]:
+    positions = array("f")
+    for face in range(6):
+        axis, sign = divmod(face, 2)
+        for corner in ((-1, -1), (1, -1), (1, 1), (-1, 1)):
+            point = [0.0, 0.0, 0.0]
+            point[axis] = 1.0 if sign else -1.0
+            point[(axis + 1) % 3] = corner[0]
+            point[(axis + 2) % 3] = corner[1]
+            positions.extend(point)
+    indices = array("H")
+    for face in range(6):
+        base = face * 4
+        indices.extend((base, base + 1, base + 2, base, base + 2, base + 3))
+    return positions, indices
+
+
+# Micro benchmarks. Each takes a context and returns the operation to time.
+# Operations that make their calls on another WebGL context than the one
+# passed in point to it with a ``gl`` attribute.
+
+
+def bench_buffer_description(ctx: Context) -> Callable[[], object]:
+    buffer = Buffer(ctx, reserve=SPRITE_STRIDE * 6)
+    attributes = ["in_pos", "in_uv", "in_color"]
+    return lambda: BufferDescription(buffer, "2f 2f 4f1", attributes, normalized=["in_color"])
+
+
+def bench_vertex_array_build(ctx: Context) -> Callable[[], object]:
+    program = ctx.program(vertex_shader=SPRITE_VERTEX_SHADER, fragment_shader=SPRITE_FRAGMENT_SHADER)
+    buffer = Buffer(ctx, reserve=SPRITE_STRIDE * 6)
+    content = [BufferDescription(buffer, "2f 2f 4f1", ["in_pos", "in_uv", "in_color"], normalized=["in_color"])]
+    return lambda: VertexArray(ctx, program, content).release()
+
+
+def bench_buffer_write(size: int) -> Callable[[Context], Callable[[], object]]:
+    def bench(ctx: Context) -> Callable[[], object]:
+        buffer = Buffer(ctx, reserve=size, usage="dynamic")
+        data = bytes(size)
+        return lambda: buffer.write(data)
+
+    return bench
+
+
+def bench_program_introspect(ctx: Context) -> Callable[[], object]:
+    program = ctx.program(vertex_shader=SPRITE_VERTEX_SHADER, fragment_shader=SPRITE_FRAGMENT_SHADER)
+
+    def introspect():
+        program._attributes = []
+        program._introspect_attributes()
+
+    return introspect
+
+
+def bench_program_create(ctx: Context) -> Callable[[], object]:
+    return lambda: Program(
+        ctx, vertex_shader=SPRITE_VERTEX_SHADER, fragment_shader=SPRITE_FRAGMENT_SHADER
+    ).release()
+
+
+def bench_program_cached(ctx: Context) -> Callable[[], object]:
+    ctx.program(vertex_shader=SPRITE_VERTEX_SHADER, fragment_shader=SPRITE_FRAGMENT_SHADER)
+
+    def get():
+        ctx.program(vertex_shader=SPRITE_VERTEX_SHADER, fragment_shader=SPRITE_FRAGMENT_SHADER).release()
+
+    return get
+
+
+def bench_context_startup(ctx: Context) -> Callable[[], object]:
+    canvas = js.document.createElement("canvas")
+    canvas.width, canvas.height = 800, 600
+
+    def startup():
+        Context(canvas)
+
+    startup.gl = canvas.getContext("webgl2")
+    return startup
+
+
+def bench_window_frame(ctx: Context) -> Callable[[], object]:
+    window = arcade.Window("bench_gl", 800, 600)
+    window.on_draw = lambda: window.clear()
+    timestamp = [0.0]
+
+    def frame():
+        timestamp[0] += 1000 / 60
+        window.run(timestamp[0])
+        js.animation_frames.clear()
+
+    frame.gl = window.context.native_gl()
+    return frame
+
+
+MICRO_BENCHMARKS = {
+    "buffer_description": bench_buffer_description,
+    "vertex_array_build": bench_vertex_array_build,
+    "buffer_write_1k": bench_buffer_write(1024),
+    "buffer_write_1m": bench_buffer_write(1024 * 1024),
+    "program_introspect": bench_program_introspect,
+    "program_create": bench_program_create,
+    "program_cached": bench_program_cached,
+    "context_startup": bench_context_startup,
+    "window_frame": bench_window_frame,
+}
+
+
+# Scenes. Each takes a context and returns a function drawing one frame.
+
+
+def scene_sprites(count: int) -> Callable[[Context], Callable[[], None]]:
+    """A sprite batch whose vertices are rewritten and drawn with one call every frame."""
+
+    def scene(ctx: Context) -> Callable[[], None]:
+        program = ctx.program(vertex_shader=SPRITE_VERTEX_SHADER, fragment_shader=SPRITE_FRAGMENT_SHADER)
+        data = sprite_vertices(count)
+        buffer = Buffer(ctx, data, usage="dynamic")
+        vao = VertexArray(
+            ctx,
+            program,
+            [BufferDescription(buffer, "2f 2f 4f1", ["in_pos", "in_uv", "in_color"], normalized=["in_color"])],
+        )
+        texture = Texture(ctx, (64, 64), components=4, data=bytes(64 * 64 * 4))
+        gl = ctx.gl
+        scroll = gl.getUniformLocation(program.glo, "u_scroll")
+        sampler = gl.getUniformLocation(program.glo, "u_texture")
+        vertices = count * 6
+        frame = [0]
+
+        def draw():
+            frame[0] += 1
+            ctx.clear((0.0, 0.0, 0.0, 1.0))
+            buffer.write(data)
+            program.use()
+            ctx.state.bind_texture(constants.TEXTURE_2D, texture.glo, unit=0)
+            gl.uniform1i(sampler, 0)
+            gl.uniform2f(scroll, frame[0] * 0.001, 0.0)
+            ctx.state.bind_vertex_array(vao.glo)
+            gl.drawArrays(constants.TRIANGLES, 0, vertices)
+
+        return draw
+
+    return scene
+
+
+def scene_meshes(count: int) -> Callable[[Context], Callable[[], None]]:
+    """Many small meshes, each with its own buffers and vertex array, drawn one by one."""
+
+    def scene(ctx: Context) -> Callable[[], None]:
+        program = ctx.program(vertex_shader=MESH_VERTEX_SHADER, fragment_shader=MESH_FRAGMENT_SHADER)
+        positions, indices = cube_mesh()
+        vaos = []
+        for _ in range(count):
+            vertex_buffer = Buffer(ctx, positions)
+            index_buffer = Buffer(ctx, indices, buffer_type=constants.ELEMENT_ARRAY_BUFFER)
+            vao = VertexArray(ctx, program, [BufferDescription(vertex_buffer, "3f", ["in_pos"])], index_buffer)
+            vaos.append((vao, vertex_buffer, index_buffer))
+        gl = ctx.gl
+        offset = gl.getUniformLocation(program.glo, "u_offset")
+        columns = max(int(count ** 0.5), 1)
+
+        def draw():
+            ctx.clear((0.0, 0.0, 0.0, 1.0))
+            program.use()
+            for i, (vao, _, _) in enumerate(vaos):
+                ctx.state.bind_vertex_array(vao.glo)
+                gl.uniform2f(offset, (i % columns) / columns, (i // columns) / columns)
+                gl.drawElements(constants.TRIANGLES, len(indices), constants.UNSIGNED_SHORT, vao.index_offset)
+
+        return draw
+
+    return scene
+
+
+def scene_streaming(count: int, orphan: bool) -> Callable[[Context], Callable[[], None]]:
+    """Particles uploaded to a StreamBuffer every frame and drawn as points."""
+
+    def scene(ctx: Context) -> Callable[[], None]:
+        program = ctx.program(vertex_shader=POINT_VERTEX_SHADER, fragment_shader=POINT_FRAGMENT_SHADER)
+        region_size = count * PARTICLE_STRIDE
+        buffer = StreamBuffer(ctx, region_size, frames=3, orphan=orphan)
+        vao = VertexArray(
+            ctx,
+            program,
+            [BufferDescription(buffer, "2f 4f1", ["in_pos", "in_color"], normalized=["in_color"])],
+        )
+        data = bytearray(region_size)
+        for i in range(0, region_size, PARTICLE_STRIDE):
+            data[i + 8:i + 12] = b"\xff\xff\xff\xff"
+
+        def draw():
+            ctx.clear((0.0, 0.0, 0.0, 1.0))
+            region_offset = buffer.write(data)
+            program.use()
+            ctx.state.bind_vertex_array(vao.glo)
+            ctx.gl.drawArrays(constants.POINTS, region_offset // PARTICLE_STRIDE, count)
+
+        return draw
+
+    return scene
+
+
+SCENES = {
+    "sprites_1k": scene_sprites(1_000),
+    "sprites_10k": scene_sprites(10_000),
+    "sprites_100k": scene_sprites(100_000),
+    "meshes_1k": scene_meshes(1_000),
+    "streaming_10k": scene_streaming(10_000, orphan=False),
+    "streaming_10k_orphan": scene_streaming(10_000, orphan=True),
+}
+
+
+def run_micro(name: str, args) -> dict:
+    # Operations are timed on their own, with no frame to replay recorded
+    # commands at, so micro benchmarks always make their calls immediately
+    ctx = headless.create_context(800, 600)
+    fn = MICRO_BENCHMARKS[name](ctx)
+    # Count the calls of a repeated operation, after state it sets once is cached
+    fn()
+    calls = count_calls(getattr(fn, "gl", ctx.native_gl()), fn)
+    timings = time_calls(fn, args.repeat, args.min_time)
+    return {
+        "median_us": statistics.median(timings) * 1e6,
+        "min_us": min(timings) * 1e6,
+        "gl_calls": sum(calls.values()),
+        "calls": calls,
+    }
+
+
+def run_scene(name: str, args) -> dict:
+    ctx = headless.create_context(800, 600, record_commands=args.record_commands)
+    draw = SCENES[name](ctx)
+    gl = ctx.native_gl()
+
+    def frame():
+        draw()
+        ctx.end_frame()
+        gl.present()
+
+    # Warm up, so the ring of a StreamBuffer has wrapped around and state
+    # set once has been cached
+    for _ in range(3):
+        frame()
+    calls = count_calls(gl, frame)
+
+    timings = []
+    for _ in range(args.frames):
+        start = time.perf_counter()
+        frame()
+        timings.append(time.perf_counter() - start)
+    return {
+        "median_ms": statistics.median(timings) * 1000,
+        "min_ms": min(timings) * 1000,
+        "p95_ms": sorted(timings)[min(len(timings) - 1, int(len(timings) * 0.95))] * 1000,
+        "gl_calls": sum(calls.values()),
+        "draw_calls": sum(count for method, count in calls.items() if method.startswith("draw")),
+        "calls": calls,
+    }
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> List[str]:
+    """Regressions of ``results`` against ``baseline``, as readable lines."""
+    regressions = []
+    for group, time_key in (("micro", "median_us"), ("scenes", "median_ms")):
+        for name, result in results.get(group, {}).items():
+            old = baseline.get(group, {}).get(name)
+            if old is None:
+                continue
+            if result[time_key] > old[time_key] * (1 + threshold):
+                change = result[time_key] / old[time_key] - 1
+                regressions.append(
+                    f"{group}/{name}: {time_key} {old[time_key]:.2f} -> {result[time_key]:.2f} (+{change:.0%})"
+                )
+            if result["gl_calls"] > old["gl_calls"]:
+                regressions.append(f"{group}/{name}: gl_calls {old['gl_calls']} -> {result['gl_calls']}")
+    return regressions
+
+
+def print_table(results: dict, baseline: Optional[dict]):
+    def change(group: str, name: str, key: str, value: float) -> str:
+        old = (baseline or {}).get(group, {}).get(name)
+        if old is None or not old[key]:
+            return ""
+        return f"{value / old[key] - 1:>+8.1%}"
+
+    if results["micro"]:
+        print(f"\n{'micro':<24} {'median us':>12} {'min us':>12} {'gl calls':>9} {'change':>8}")
+        for name, result in results["micro"].items():
+            print(
+                f"{name:<24} {result['median_us']:>12.2f} {result['min_us']:>12.2f} "
+                f"{result['gl_calls']:>9} {change('micro', name, 'median_us', result['median_us'])}"
+            )
+    if results["scenes"]:
+        print(
+            f"\n{'scene':<24} {'median ms':>10} {'p95 ms':>10} {'gl calls':>9} {'draws':>7} {'change':>8}"
+        )
+        for name, result in results["scenes"].items():
+            print(
+                f"{name:<24} {result['median_ms']:>10.3f} {result['p95_ms']:>10.3f} "
+                f"{result['gl_calls']:>9} {result['draw_calls']:>7} "
+                f"{change('scenes', name, 'median_ms', result['median_ms'])}"
+            )
+
+
+def make_parser(parser):
+    parser.description = "Measure the time and WebGL calls of arcade.gl hot paths on the headless backend"
+    parser.add_argument(
+        "-k", "--filter", default=None, help="Only run benchmarks whose name contains this text"
+    )
+    parser.add_argument("--micro-only", action="store_true", help="Skip the scenes")
+    parser.add_argument("--scenes-only", action="store_true", help="Skip the micro benchmarks")
+    parser.add_argument("--repeat", type=int, default=5, help="Timing repeats per micro benchmark")
+    parser.add_argument(
+        "--min-time", type=float, default=0.05, help="Minimum seconds per micro benchmark repeat"
+    )
+    parser.add_argument("--frames", type=int, default=30, help="Frames timed per scene")
+    parser.add_argument(
+        "--record-commands",
+        action="store_true",
+        help="Record GL calls in scenes and replay them at the end of each frame, see Context(record_commands=True)",
+    )
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    parser.add_argument("--output", type=Path, default=None, help="Also write the JSON results here")
+    parser.add_argument("--baseline", type=Path, default=None, help="Compare against results stored here")
+    parser.add_argument("--save-baseline", type=Path, default=None, help="Store the results here as a baseline")
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.10,
+        help="Fraction a timing may be slower than the baseline before it is flagged",
+    )
+    return parser
+
+
+def main(args) -> int:
+    def selected(names):
+        return [name for name in names if args.filter is None or args.filter in name]
+
+    baseline = json.loads(args.baseline.read_text()) if args.baseline is not None else None
+
+    results = {"micro": {}, "scenes": {}}
+    if not args.scenes_only:
+        for name in selected(MICRO_BENCHMARKS):
+            results["micro"][name] = run_micro(name, args)
+    if not args.micro_only:
+        for name in selected(SCENES):
+            results["scenes"][name] = run_scene(name, args)
+
+    report = {
+        "python": sys.version.split()[0],
+        "record_commands": args.record_commands,
+        "threshold": args.threshold,
+        **results,
+    }
+    regressions = compare(results, baseline, args.threshold) if baseline is not None else []
+    if baseline is not None:
+        report["regressions"] = regressions
+
+    if args.output is not None:
+        args.output.write_text(json.dumps(report, indent=2))
+    if args.save_baseline is not None:
+        args.save_baseline.write_text(json.dumps(report, indent=2))
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_table(results, baseline)
+        if baseline is not None:
+            print(f"\n{len(regressions)} regression(s) beyond {args.threshold:.0%}")
+            for line in regressions:
+                print(f"  {line}")
+
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    parser = make_parser(argparse.ArgumentParser())
+    args = parser.parse_args()
+    sys.exit(main(args))
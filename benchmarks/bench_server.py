@@ -0,0 +1,215 @@
+#! /usr/bin/env python
+"""
+Load test for server.py.
+
+Starts the server on a free local port and points concurrent HTTP clients at the
+bundle and static endpoints of an example, first against a cold cache and then
+against a warm one. Reports throughput and latency percentiles per endpoint,
+either as a table or as JSON for comparing runs.
+
+    python benchmarks/bench_server.py --clients 16 --requests 50 --json
+    python benchmarks/bench_server.py -- --mode asyncio --stored-zips
+"""
+
+import argparse
+import http.client
+import json
+import socket
+import subprocess
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+ROOT = Path(__file__).resolve().parent.parent
+
+BUNDLE_ENDPOINTS = ["{example}/arcade.zip", "{example}/package.zip", "{example}/manifest.json"]
+STATIC_ENDPOINTS = ["{example}/", "{example}/extra.js"]
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("localhost", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(port: int, server_args: List[str]) -> subprocess.Popen:
+    process = subprocess.Popen(
+        [sys.executable, str(ROOT / "server.py"), "--port", str(port), *server_args],
+        cwd=ROOT,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    deadline = time.monotonic() + 10
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"server.py exited with code {process.returncode}")
+        try:
+            socket.create_connection(("localhost", port), timeout=0.1).close()
+            return process
+        except OSError:
+            time.sleep(0.05)
+    process.terminate()
+    raise RuntimeError("server.py did not start listening within 10 seconds")
+
+
+def percentile(values: List[float], fraction: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not values:
+        return float("nan")
+    index = min(len(values) - 1, max(0, round(fraction * len(values) + 0.5) - 1))
+    return values[index]
+
+
+class Sample:
+    __slots__ = ("path", "status", "latency", "size")
+
+    def __init__(self, path: str, status: Optional[int], latency: float, size: int):
+        self.path = path
+        self.status = status
+        self.latency = latency
+        self.size = size
+
+
+def run_clients(
+    port: int, paths: List[str], clients: int, requests: int, headers: Dict[str, str]
+) -> Tuple[List[Sample], float]:
+    """
+    Start ``clients`` threads at once, each making ``requests`` requests over its own
+    keep-alive connection, cycling through ``paths``. Returns the samples and the
+    wall time the whole batch took.
+    """
+    samples: List[Sample] = []
+    lock = threading.Lock()
+    barrier = threading.Barrier(clients + 1)
+
+    def client(offset: int):
+        connection = http.client.HTTPConnection("localhost", port, timeout=60)
+        results = []
+        barrier.wait()
+        for i in range(requests):
+            path = paths[(offset + i) % len(paths)]
+            start = time.perf_counter()
+            try:
+                connection.request("GET", path, headers=headers)
+                response = connection.getresponse()
+                size = len(response.read())
+                status = response.status
+            except (OSError, http.client.HTTPException):
+                connection.close()
+                connection = http.client.HTTPConnection("localhost", port, timeout=60)
+                size, status = 0, None
+            results.append(Sample(path, status, time.perf_counter() - start, size))
+        connection.close()
+        with lock:
+            samples.extend(results)
+
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(clients)]
+    for thread in threads:
+        thread.start()
+    barrier.wait()
+    start = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    return samples, time.perf_counter() - start
+
+
+def summarize(samples: List[Sample], elapsed: float) -> Dict[str, dict]:
+    def stats(group: List[Sample]) -> dict:
+        latencies = sorted(sample.latency * 1000 for sample in group)
+        return {
+            "requests": len(group),
+            "errors": sum(1 for sample in group if sample.status is None or sample.status >= 400),
+            "throughput": len(group) / elapsed if elapsed else 0.0,
+            "bytes": sum(sample.size for sample in group),
+            "p50_ms": percentile(latencies, 0.50),
+            "p95_ms": percentile(latencies, 0.95),
+            "p99_ms": percentile(latencies, 0.99),
+        }
+
+    by_path: Dict[str, List[Sample]] = {}
+    for sample in samples:
+        by_path.setdefault(sample.path, []).append(sample)
+
+    summary = {path: stats(group) for path, group in sorted(by_path.items())}
+    summary["total"] = stats(samples)
+    return summary
+
+
+def print_table(results: Dict[str, Dict[str, dict]]):
+    header = f"{'endpoint':<32} {'reqs':>6} {'errs':>5} {'req/s':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}"
+    for phase, summary in results.items():
+        print(f"\n{phase}")
+        print(header)
+        for path, stats in summary.items():
+            print(
+                f"{path:<32} {stats['requests']:>6} {stats['errors']:>5} {stats['throughput']:>9.1f} "
+                f"{stats['p50_ms']:>9.2f} {stats['p95_ms']:>9.2f} {stats['p99_ms']:>9.2f}"
+            )
+
+
+def make_parser(parser):
+    parser.description = "Measure server.py throughput and latency under concurrent load"
+    parser.add_argument("--example", default="cube", help="Example directory to request assets from")
+    parser.add_argument("--clients", type=int, default=8, help="Number of concurrent clients")
+    parser.add_argument(
+        "--requests", type=int, default=50, help="Requests per client in the warm phase"
+    )
+    parser.add_argument(
+        "--accept-encoding",
+        default=None,
+        help="Accept-Encoding header to send, e.g. 'gzip, br'. Defaults to none",
+    )
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    parser.add_argument("--output", type=Path, default=None, help="Also write the JSON results here")
+    parser.add_argument(
+        "server_args",
+        nargs=argparse.REMAINDER,
+        help="Arguments passed on to server.py, after a '--'",
+    )
+    return parser
+
+
+def main(args):
+    server_args = args.server_args[1:] if args.server_args[:1] == ["--"] else args.server_args
+    headers = {"Accept-Encoding": args.accept_encoding} if args.accept_encoding else {}
+    bundles = [path.format(example=f"/{args.example}") for path in BUNDLE_ENDPOINTS]
+    static = [path.format(example=f"/{args.example}") for path in STATIC_ENDPOINTS]
+
+    port = free_port()
+    server = start_server(port, server_args)
+    try:
+        results = {}
+        # Every client asks for every bundle of a freshly started server at once
+        samples, elapsed = run_clients(port, bundles, args.clients, len(bundles), headers)
+        results["cold bundles"] = summarize(samples, elapsed)
+
+        samples, elapsed = run_clients(port, bundles, args.clients, args.requests, headers)
+        results["warm bundles"] = summarize(samples, elapsed)
+
+        samples, elapsed = run_clients(port, static, args.clients, args.requests, headers)
+        results["static"] = summarize(samples, elapsed)
+    finally:
+        server.terminate()
+        server.wait()
+
+    report = {
+        "clients": args.clients,
+        "requests": args.requests,
+        "accept_encoding": args.accept_encoding,
+        "server_args": server_args,
+        "results": results,
+    }
+    if args.output is not None:
+        args.output.write_text(json.dumps(report, indent=2))
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_table(results)
+
+
+if __name__ == "__main__":
+    parser = make_parser(argparse.ArgumentParser())
+    args = parser.parse_args()
+    main(args)
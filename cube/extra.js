@@ -1,7 +1,3 @@
-function useProgram(gl, program_info) {
-    gl.useProgram(program_info.get("program"));
-}
-
 function doProjection(gl, programInfo) {
     const fieldOfView = (45 * Math.PI) / 180; // in radians
     const aspect = gl.canvas.clientWidth / gl.canvas.clientHeight;
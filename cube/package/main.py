@@ -115,7 +115,7 @@ class Game(arcade.Window):
         normalize = False
         stride = 0
         offset = 0
-        self.gl.bindBuffer(self.gl.ARRAY_BUFFER, self.buffers["position"]._glo)
+        self.context.state.bind_buffer(arcade.gl.ARRAY_BUFFER, self.buffers["position"].glo)
         self.gl.vertexAttribPointer(
             self.program_info["attribLocations"]["vertexPosition"],
             num_components,
@@ -131,7 +131,7 @@ class Game(arcade.Window):
         normalize = False
         stride = 0
         offset = 0
-        self.gl.bindBuffer(self.gl.ARRAY_BUFFER, self.buffers["color"]._glo)
+        self.context.state.bind_buffer(arcade.gl.ARRAY_BUFFER, self.buffers["color"].glo)
         self.gl.vertexAttribPointer(
             self.program_info["attribLocations"]["vertexColor"],
             num_components,
@@ -142,12 +142,14 @@ class Game(arcade.Window):
         )
         self.gl.enableVertexAttribArray(self.program_info["attribLocations"]["vertexColor"])
 
-        self.gl.bindBuffer(self.gl.ELEMENT_ARRAY_BUFFER, self.buffers["index"]._glo)
+        self.context.state.bind_buffer(arcade.gl.ELEMENT_ARRAY_BUFFER, self.buffers["index"].glo)
+
+        self.cube_program.use()
 
         # This section will not work from Python for some reason, it's in extra.js
-        js.useProgram(self.gl, self.program_info)
-        js.doProjection(self.gl, self.program_info)
-        js.doModelView(self.gl, self.program_info, self.cube_rotation)
+        gl = self.context.native_gl()
+        js.doProjection(gl, self.program_info)
+        js.doModelView(gl, self.program_info, self.cube_rotation)
 
         vertex_count = 36
         type = self.gl.UNSIGNED_SHORT
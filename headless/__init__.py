@@ -0,0 +1,120 @@
+"""
+Run ``arcade.gl`` under plain CPython, without a browser.
+
+:py:func:`install` puts stand-ins for Pyodide's ``js`` and ``pyodide.ffi``
+modules in place, so ``arcade`` imports as it would in Pyodide. Canvases then
+hand out :py:class:`headless.webgl.WebGL2` contexts, which validate and count
+every call but draw nothing. That is enough to test arcade's GL layer and to
+measure how many WebGL calls it makes::
+
+    import headless
+    headless.install()
+
+    import arcade.gl
+
+    ctx = headless.create_context(800, 600)
+    buffer = arcade.gl.Buffer(ctx, b"0123")
+    headless.run_frames(2)
+    print(ctx.native_gl().call_counts)
+"""
+
+import sys
+import types
+from typing import List
+
+from headless import ffi, js
+
+__all__ = ["install", "create_context", "run_frames"]
+
+
+def install(*, strict: bool = True, record: bool = False, force: bool = False):
+    """
+    Register the stand-in ``js``, ``pyodide`` and ``pyodide.ffi`` modules.
+
+    Must be called before ``arcade`` is imported.
+
+    :param bool strict: Raise :py:class:`headless.webgl.WebGLError` on invalid calls instead of setting the GL error
+    :param bool record: Keep a log of every call in ``WebGL2.calls``
+    :param bool force: Replace modules already imported, such as the real ones inside Pyodide
+    """
+    if "js" in sys.modules and sys.modules["js"] is not js and not force:
+        raise RuntimeError("A js module is already loaded, pass force=True to replace it")
+
+    pyodide = types.ModuleType("pyodide")
+    pyodide.ffi = ffi
+    sys.modules["js"] = js
+    sys.modules["pyodide"] = pyodide
+    sys.modules["pyodide.ffi"] = ffi
+    js.Canvas.context_options = {"strict": strict, "record": record}
+
+    # Python versions of the JavaScript functions arcade builds with js.Function
+    from arcade.gl.commands import REPLAY_SOURCE
+    from arcade.gl.context import GET_PARAMS_SOURCE
+
+    js.Function.register(REPLAY_SOURCE, _replay)
+    js.Function.register(GET_PARAMS_SOURCE, _get_params)
+
+
+def create_context(width: int = 800, height: int = 600, **kwargs):
+    """
+    Create an :py:class:`arcade.gl.Context` on a new canvas. Keyword arguments
+    are passed on to the context.
+    """
+    from arcade.gl import Context
+
+    canvas = js.document.createElement("canvas")
+    canvas.width = width
+    canvas.height = height
+    js.document.body.appendChild(canvas)
+    return Context(canvas, **kwargs)
+
+
+def run_frames(count: int = 1, interval: float = 1000 / 60):
+    """
+    Advance ``count`` frames. Each frame ends the current frame on every WebGL
+    context, making fences and queries of the previous frame complete, and then
+    runs the callbacks given to ``requestAnimationFrame``.
+
+    :param int count: Number of frames
+    :param float interval: Milliseconds added to the timestamp passed to callbacks per frame
+    """
+    from headless.webgl import contexts
+
+    timestamp = js.performance.now()
+    for _ in range(count):
+        for gl in list(contexts):
+            gl.present()
+        timestamp += interval
+        callbacks, js.animation_frames[:] = list(js.animation_frames), []
+        for _, callback in callbacks:
+            callback(timestamp)
+
+
+def _replay(gl, ops, count: int, objects: List[object]):
+    """Python version of ``arcade.gl.commands.REPLAY_SOURCE``."""
+    from arcade.gl.commands import ARG_BOOL, ARG_NULL, ARG_NUMBER, RECORDED
+
+    i = 0
+    while i < count:
+        name = RECORDED[int(ops[i])]
+        argc = int(ops[i + 1])
+        i += 2
+        args = []
+        for _ in range(argc):
+            kind, value = ops[i], ops[i + 1]
+            i += 2
+            if kind == ARG_NUMBER:
+                # Every number arrives as a double, as it would in JavaScript
+                args.append(int(value) if value.is_integer() else value)
+            elif kind == ARG_NULL:
+                args.append(None)
+            elif kind == ARG_BOOL:
+                args.append(value != 0)
+            else:
+                args.append(objects[int(value)])
+        getattr(gl, name)(*args)
+
+
+def _get_params(gl, enums) -> list:
+    """Python version of ``arcade.gl.context.GET_PARAMS_SOURCE``."""
+    return [gl.getParameter(enum) for enum in enums]
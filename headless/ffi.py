@@ -0,0 +1,47 @@
+"""Stand-in for ``pyodide.ffi``, enough for arcade to pass Python objects to JavaScript."""
+
+from typing import Any
+
+from headless import js
+
+
+class PyBufferView:
+    """What ``PyProxy.getBuffer`` returns: a typed array over the Python buffer in ``data``."""
+
+    def __init__(self, view: memoryview, kind: str):
+        self._view = view
+        self.data = js.TYPED_ARRAYS[kind].view(view)
+
+    def release(self):
+        self.data = None
+        self._view = None
+
+
+class PyProxy:
+    """A proxy of a Python object, as made by :py:func:`create_proxy`."""
+
+    def __init__(self, obj: Any):
+        self._obj = obj
+
+    def __call__(self, *args, **kwargs):
+        return self._obj(*args, **kwargs)
+
+    def getBuffer(self, kind: str = "u8") -> PyBufferView:
+        view = memoryview(self._obj)
+        if not view.c_contiguous:
+            raise ValueError("getBuffer needs a contiguous buffer")
+        return PyBufferView(view, kind)
+
+    def destroy(self):
+        self._obj = None
+
+
+def create_proxy(obj: Any) -> PyProxy:
+    return PyProxy(obj)
+
+
+def to_js(obj: Any) -> Any:
+    # The stand-in JavaScript side takes Python objects as they are
+    if isinstance(obj, tuple):
+        return list(obj)
+    return obj
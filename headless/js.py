@@ -0,0 +1,257 @@
+"""
+Stand-in for Pyodide's ``js`` module.
+
+Covers the parts of the browser arcade uses: typed arrays, a document with
+canvas elements, ``requestAnimationFrame`` and ``Function``. Typed arrays are
+views of Python memory, so data uploaded through them is real and can be
+read back.
+"""
+
+import struct
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+_TYPED_ARRAY_FORMATS = {
+    "Int8Array": "b",
+    "Uint8Array": "B",
+    "Int16Array": "h",
+    "Uint16Array": "H",
+    "Int32Array": "i",
+    "Uint32Array": "I",
+    "Float32Array": "f",
+    "Float64Array": "d",
+}
+
+
+class ArrayBuffer:
+    """A block of bytes, like a JavaScript ``ArrayBuffer``."""
+
+    def __init__(self, data: bytearray):
+        self._data = data
+
+    @classmethod
+    def new(cls, size: int) -> "ArrayBuffer":
+        return cls(bytearray(size))
+
+    @property
+    def byteLength(self) -> int:
+        return len(self._data)
+
+    def assign(self, source):
+        """Copy ``source`` into this buffer, like ``JsProxy.assign``."""
+        memoryview(self._data)[:] = memoryview(source).cast("B")
+
+    def assign_to(self, target):
+        memoryview(target).cast("B")[:] = self._data
+
+
+class TypedArray:
+    """A typed view of bytes, like a JavaScript ``Uint8Array`` or ``Float32Array``."""
+
+    def __init__(self, kind: str, view: memoryview):
+        self.kind = kind
+        # Always a one dimensional view with the array's item format
+        self.view = view
+
+    @property
+    def BYTES_PER_ELEMENT(self) -> int:
+        return self.view.itemsize
+
+    @property
+    def byteLength(self) -> int:
+        return self.view.nbytes
+
+    @property
+    def length(self) -> int:
+        return len(self.view)
+
+    def __len__(self) -> int:
+        return len(self.view)
+
+    def __getitem__(self, index):
+        return self.view[index]
+
+    def __setitem__(self, index, value):
+        self.view[index] = value
+
+    def bytes(self, offset: int = 0, length: int = 0) -> memoryview:
+        """The raw bytes of elements ``offset`` to ``offset + length``, all when ``length`` is 0."""
+        raw = self.view.cast("B")
+        start = offset * self.view.itemsize
+        end = raw.nbytes if not length else start + length * self.view.itemsize
+        return raw[start:end]
+
+    def assign(self, source):
+        self.view.cast("B")[:] = memoryview(source).cast("B")
+
+    def assign_to(self, target):
+        memoryview(target).cast("B")[:] = self.view.cast("B")
+
+    def to_py(self) -> memoryview:
+        return self.view
+
+    def __repr__(self) -> str:
+        return f"<{self.kind} length={len(self.view)}>"
+
+
+class TypedArrayType:
+    """The constructor of a typed array kind, as in ``js.Uint8Array.new(...)``."""
+
+    def __init__(self, kind: str):
+        self.kind = kind
+        self.format = _TYPED_ARRAY_FORMATS[kind]
+
+    def new(self, source, byte_offset: int = 0, length: Optional[int] = None) -> TypedArray:
+        if isinstance(source, int):
+            return TypedArray(self.kind, memoryview(bytearray(source * self.itemsize)).cast(self.format))
+        if isinstance(source, ArrayBuffer):
+            raw = memoryview(source._data)[byte_offset:]
+            if length is not None:
+                raw = raw[:length * self.itemsize]
+            return TypedArray(self.kind, raw.cast(self.format))
+        if isinstance(source, TypedArray):
+            source = source.view
+        # Anything else is copied, like constructing from an array in JavaScript
+        data = bytearray(memoryview(source).cast("B"))
+        return TypedArray(self.kind, memoryview(data).cast(self.format))
+
+    @property
+    def itemsize(self) -> int:
+        return struct.calcsize(self.format)
+
+    def view(self, view: memoryview) -> TypedArray:
+        """A typed array over existing memory, without copying."""
+        return TypedArray(self.kind, view.cast("B").cast(self.format))
+
+
+Int8Array = TypedArrayType("Int8Array")
+Uint8Array = TypedArrayType("Uint8Array")
+Int16Array = TypedArrayType("Int16Array")
+Uint16Array = TypedArrayType("Uint16Array")
+Int32Array = TypedArrayType("Int32Array")
+Uint32Array = TypedArrayType("Uint32Array")
+Float32Array = TypedArrayType("Float32Array")
+Float64Array = TypedArrayType("Float64Array")
+
+TYPED_ARRAYS = {
+    "i8": Int8Array,
+    "u8": Uint8Array,
+    "i16": Int16Array,
+    "u16": Uint16Array,
+    "i32": Int32Array,
+    "u32": Uint32Array,
+    "f32": Float32Array,
+    "f64": Float64Array,
+}
+
+
+class _FunctionType:
+    """
+    ``js.Function``. JavaScript source can't run here, so ``new`` looks up a
+    Python function registered for the exact same source.
+    """
+
+    def __init__(self):
+        self.registry: Dict[str, Callable] = {}
+
+    def register(self, source: str, function: Callable):
+        self.registry[source.strip()] = function
+
+    def new(self, *args: str) -> Callable:
+        source = args[-1].strip()
+        try:
+            return self.registry[source]
+        except KeyError:
+            raise NotImplementedError(
+                "No Python equivalent registered for JavaScript function:\n" + source
+            )
+
+
+Function = _FunctionType()
+
+
+class Element:
+    def __init__(self, tag: str):
+        self.tagName = tag.upper()
+        self.id = ""
+        self.children: List["Element"] = []
+
+    def appendChild(self, child: "Element") -> "Element":
+        self.children.append(child)
+        return child
+
+
+class Canvas(Element):
+    """A ``<canvas>`` whose ``webgl2`` context is a :py:class:`headless.webgl.WebGL2`."""
+
+    #: Options for WebGL contexts created by canvases, set by ``headless.install``
+    context_options: dict = {}
+
+    def __init__(self):
+        super().__init__("canvas")
+        self.width = 300
+        self.height = 150
+        self._context = None
+
+    @property
+    def clientWidth(self) -> int:
+        return self.width
+
+    @property
+    def clientHeight(self) -> int:
+        return self.height
+
+    def getContext(self, kind: str, *args):
+        if kind != "webgl2":
+            return None
+        if self._context is None:
+            from headless.webgl import WebGL2
+
+            self._context = WebGL2(self, **Canvas.context_options)
+        return self._context
+
+
+class Document:
+    def __init__(self):
+        self.title = ""
+        self.body = Element("body")
+
+    def createElement(self, tag: str) -> Element:
+        if tag.lower() == "canvas":
+            return Canvas()
+        return Element(tag)
+
+    def getElementById(self, element_id: str) -> Optional[Element]:
+        pending = list(self.body.children)
+        while pending:
+            element = pending.pop()
+            if element.id == element_id:
+                return element
+            pending.extend(element.children)
+        return None
+
+
+document = Document()
+
+
+class _Performance:
+    def now(self) -> float:
+        return time.perf_counter() * 1000
+
+
+performance = _Performance()
+
+# Callbacks waiting for the next animation frame, run by headless.run_frames
+animation_frames: List[Tuple[int, Callable]] = []
+_next_frame_id = 0
+
+
+def requestAnimationFrame(callback: Callable) -> int:
+    global _next_frame_id
+    _next_frame_id += 1
+    animation_frames.append((_next_frame_id, callback))
+    return _next_frame_id
+
+
+def cancelAnimationFrame(frame_id: int):
+    animation_frames[:] = [entry for entry in animation_frames if entry[0] != frame_id]
@@ -0,0 +1,1547 @@
+"""
+A WebGL2 rendering context implemented in Python.
+
+Nothing is drawn. The context keeps track of the objects and state a real one
+would, stores buffer contents so they can be read back, parses shaders far
+enough to report their attributes and uniforms, and checks the arguments of
+every call against the rules of the WebGL2 specification. Calls are counted
+per method in ``call_counts``, and with ``record=True`` every call and its
+arguments are kept in ``calls`` as well.
+
+With ``strict=True`` (the default) an invalid call raises :py:class:`WebGLError`
+right away. Otherwise the error is stored for ``getError``, as in a browser.
+"""
+
+import functools
+import re
+import time
+import weakref
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+
+from arcade.gl import constants as C
+from headless.js import Float32Array, Int32Array, TypedArray
+
+#: Every live context, so a frame boundary can be applied to all of them
+contexts: "weakref.WeakSet[WebGL2]" = weakref.WeakSet()
+
+TIMER_QUERY_EXTENSION = "EXT_disjoint_timer_query_webgl2"
+SUPPORTED_EXTENSIONS = (
+    "EXT_color_buffer_float",
+    TIMER_QUERY_EXTENSION,
+    "EXT_texture_filter_anisotropic",
+    "OES_texture_float_linear",
+)
+
+BUFFER_TARGETS = frozenset((
+    C.ARRAY_BUFFER,
+    C.ELEMENT_ARRAY_BUFFER,
+    C.COPY_READ_BUFFER,
+    C.COPY_WRITE_BUFFER,
+    C.PIXEL_PACK_BUFFER,
+    C.PIXEL_UNPACK_BUFFER,
+    C.TRANSFORM_FEEDBACK_BUFFER,
+    C.UNIFORM_BUFFER,
+))
+COPY_TARGETS = frozenset((C.COPY_READ_BUFFER, C.COPY_WRITE_BUFFER))
+BUFFER_USAGES = frozenset((
+    C.STATIC_DRAW,
+    C.DYNAMIC_DRAW,
+    C.STREAM_DRAW,
+    C.STATIC_READ,
+    C.DYNAMIC_READ,
+    C.STREAM_READ,
+    C.STATIC_COPY,
+    C.DYNAMIC_COPY,
+    C.STREAM_COPY,
+))
+CAPABILITIES = frozenset((
+    C.BLEND,
+    C.CULL_FACE,
+    C.DEPTH_TEST,
+    C.DITHER,
+    C.POLYGON_OFFSET_FILL,
+    C.RASTERIZER_DISCARD,
+    C.SAMPLE_ALPHA_TO_COVERAGE,
+    C.SAMPLE_COVERAGE,
+    C.SCISSOR_TEST,
+    C.STENCIL_TEST,
+))
+DRAW_MODES = frozenset((
+    C.POINTS,
+    C.LINES,
+    C.LINE_LOOP,
+    C.LINE_STRIP,
+    C.TRIANGLES,
+    C.TRIANGLE_STRIP,
+    C.TRIANGLE_FAN,
+))
+TEXTURE_TARGETS = frozenset((C.TEXTURE_2D, C.TEXTURE_CUBE_MAP, C.TEXTURE_3D, C.TEXTURE_2D_ARRAY))
+FRAMEBUFFER_TARGETS = frozenset((C.FRAMEBUFFER, C.DRAW_FRAMEBUFFER, C.READ_FRAMEBUFFER))
+QUERY_TARGETS = frozenset((
+    C.ANY_SAMPLES_PASSED,
+    C.ANY_SAMPLES_PASSED_CONSERVATIVE,
+    C.TRANSFORM_FEEDBACK_PRIMITIVES_WRITTEN,
+    C.TIME_ELAPSED_EXT,
+))
+INDEX_TYPES = {C.UNSIGNED_BYTE: 1, C.UNSIGNED_SHORT: 2, C.UNSIGNED_INT: 4}
+ATTRIB_TYPES = {
+    C.BYTE: 1,
+    C.UNSIGNED_BYTE: 1,
+    C.SHORT: 2,
+    C.UNSIGNED_SHORT: 2,
+    C.INT: 4,
+    C.UNSIGNED_INT: 4,
+    C.HALF_FLOAT: 2,
+    C.FLOAT: 4,
+    C.INT_2_10_10_10_REV: 4,
+    C.UNSIGNED_INT_2_10_10_10_REV: 4,
+}
+PIXEL_TYPES = {
+    C.UNSIGNED_BYTE: 1,
+    C.BYTE: 1,
+    C.UNSIGNED_SHORT: 2,
+    C.SHORT: 2,
+    C.UNSIGNED_INT: 4,
+    C.INT: 4,
+    C.HALF_FLOAT: 2,
+    C.FLOAT: 4,
+}
+# Pixel type -> the typed array pixel data of that type must come in
+PIXEL_ARRAYS = {
+    C.UNSIGNED_BYTE: "Uint8Array",
+    C.BYTE: "Int8Array",
+    C.UNSIGNED_SHORT: "Uint16Array",
+    C.SHORT: "Int16Array",
+    C.UNSIGNED_INT: "Uint32Array",
+    C.INT: "Int32Array",
+    C.HALF_FLOAT: "Uint16Array",
+    C.FLOAT: "Float32Array",
+}
+PIXEL_COMPONENTS = {
+    C.RED: 1,
+    C.RED_INTEGER: 1,
+    C.RG: 2,
+    C.RG_INTEGER: 2,
+    C.RGB: 3,
+    C.RGB_INTEGER: 3,
+    C.RGBA: 4,
+    C.RGBA_INTEGER: 4,
+    C.DEPTH_COMPONENT: 1,
+    C.DEPTH_STENCIL: 1,
+}
+DEPTH_FORMATS = frozenset((
+    C.DEPTH_COMPONENT16,
+    C.DEPTH_COMPONENT24,
+    C.DEPTH_COMPONENT32F,
+    C.DEPTH24_STENCIL8,
+))
+GLSL_TYPES = {
+    "float": C.FLOAT,
+    "vec2": C.FLOAT_VEC2,
+    "vec3": C.FLOAT_VEC3,
+    "vec4": C.FLOAT_VEC4,
+    "int": C.INT,
+    "ivec2": C.INT_VEC2,
+    "ivec3": C.INT_VEC3,
+    "ivec4": C.INT_VEC4,
+    "uint": C.UNSIGNED_INT,
+    "uvec2": C.UNSIGNED_INT_VEC2,
+    "uvec3": C.UNSIGNED_INT_VEC3,
+    "uvec4": C.UNSIGNED_INT_VEC4,
+    "bool": C.BOOL,
+    "bvec2": C.BOOL_VEC2,
+    "bvec3": C.BOOL_VEC3,
+    "bvec4": C.BOOL_VEC4,
+    "mat2": C.FLOAT_MAT2,
+    "mat3": C.FLOAT_MAT3,
+    "mat4": C.FLOAT_MAT4,
+    "sampler2D": C.SAMPLER_2D,
+    "sampler3D": C.SAMPLER_3D,
+    "samplerCube": C.SAMPLER_CUBE,
+    "sampler2DArray": C.SAMPLER_2D_ARRAY,
+    "sampler2DShadow": C.SAMPLER_2D_SHADOW,
+    "isampler2D": C.INT_SAMPLER_2D,
+    "usampler2D": C.UNSIGNED_INT_SAMPLER_2D,
+}
+# Locations taken by each attribute type
+ATTRIB_SLOTS = {C.FLOAT_MAT2: 2, C.FLOAT_MAT3: 3, C.FLOAT_MAT4: 4}
+
+_PRECISION = r"(?:(?:highp|mediump|lowp)\s+)?"
+_ATTRIBUTE = re.compile(
+    r"^\s*(?:layout\s*\(\s*location\s*=\s*(\d+)\s*\)\s*)?(?:attribute|in)\s+"
+    + _PRECISION
+    + r"(\w+)\s+(\w+)\s*(?:\[\s*(\d+)\s*\])?\s*;",
+    re.MULTILINE,
+)
+_UNIFORM = re.compile(
+    r"^\s*(?:layout\s*\([^)]*\)\s*)?uniform\s+" + _PRECISION + r"(\w+)\s+(\w+)\s*(?:\[\s*(\d+)\s*\])?\s*;",
+    re.MULTILINE,
+)
+_COMMENTS = re.compile(r"//[^\n]*|/\*.*?\*/", re.DOTALL)
+
+# Limits reported by getParameter, those of a modest desktop GPU
+PARAMETERS = {
+    C.VENDOR: "arcade",
+    C.RENDERER: "headless",
+    C.VERSION: "WebGL 2.0 (headless)",
+    C.SHADING_LANGUAGE_VERSION: "WebGL GLSL ES 3.00 (headless)",
+    C.SAMPLE_BUFFERS: 0,
+    C.SUBPIXEL_BITS: 4,
+    C.UNIFORM_BUFFER_OFFSET_ALIGNMENT: 256,
+    C.MAX_ARRAY_TEXTURE_LAYERS: 2048,
+    C.MAX_3D_TEXTURE_SIZE: 2048,
+    C.MAX_COLOR_ATTACHMENTS: 8,
+    C.MAX_COMBINED_FRAGMENT_UNIFORM_COMPONENTS: 200704,
+    C.MAX_COMBINED_TEXTURE_IMAGE_UNITS: 32,
+    C.MAX_COMBINED_UNIFORM_BLOCKS: 24,
+    C.MAX_COMBINED_VERTEX_UNIFORM_COMPONENTS: 212992,
+    C.MAX_CUBE_MAP_TEXTURE_SIZE: 16384,
+    C.MAX_DRAW_BUFFERS: 8,
+    C.MAX_ELEMENTS_INDICES: 2 ** 31 - 1,
+    C.MAX_ELEMENTS_VERTICES: 2 ** 31 - 1,
+    C.MAX_FRAGMENT_INPUT_COMPONENTS: 120,
+    C.MAX_FRAGMENT_UNIFORM_COMPONENTS: 4096,
+    C.MAX_FRAGMENT_UNIFORM_VECTORS: 1024,
+    C.MAX_FRAGMENT_UNIFORM_BLOCKS: 12,
+    C.MAX_SAMPLES: 4,
+    C.MAX_RENDERBUFFER_SIZE: 16384,
+    C.MAX_UNIFORM_BUFFER_BINDINGS: 24,
+    C.MAX_TEXTURE_SIZE: 16384,
+    C.MAX_UNIFORM_BLOCK_SIZE: 65536,
+    C.MAX_VARYING_VECTORS: 30,
+    C.MAX_VERTEX_ATTRIBS: 16,
+    C.MAX_VERTEX_TEXTURE_IMAGE_UNITS: 16,
+    C.MAX_VERTEX_UNIFORM_COMPONENTS: 4096,
+    C.MAX_VERTEX_UNIFORM_VECTORS: 1024,
+    C.MAX_VERTEX_OUTPUT_COMPONENTS: 120,
+    C.MAX_VERTEX_UNIFORM_BLOCKS: 12,
+    C.MAX_TEXTURE_IMAGE_UNITS: 16,
+    C.MAX_TEXTURE_MAX_ANISOTROPY_EXT: 16.0,
+    C.MAX_TRANSFORM_FEEDBACK_SEPARATE_ATTRIBS: 4,
+}
+
+
+class WebGLError(Exception):
+    """An invalid WebGL call, raised by strict contexts."""
+
+    def __init__(self, code: int, method: str, message: str):
+        super().__init__(f"{ERROR_NAMES.get(code, code)} in {method}: {message}")
+        self.code = code
+        self.method = method
+
+
+ERROR_NAMES = {
+    C.INVALID_ENUM: "INVALID_ENUM",
+    C.INVALID_VALUE: "INVALID_VALUE",
+    C.INVALID_OPERATION: "INVALID_OPERATION",
+    C.INVALID_FRAMEBUFFER_OPERATION: "INVALID_FRAMEBUFFER_OPERATION",
+    C.OUT_OF_MEMORY: "OUT_OF_MEMORY",
+}
+
+
+class _Invalid(Exception):
+    """Raised inside a call to abandon it, turned into a GL error by ``api``."""
+
+    def __init__(self, code: int, message: str):
+        self.code = code
+        self.message = message
+
+
+# GL objects
+
+
+class GLObject:
+    kind = "object"
+    _ids = 0
+
+    def __init__(self):
+        GLObject._ids += 1
+        self.id = GLObject._ids
+        self.deleted = False
+
+    def __repr__(self) -> str:
+        state = " deleted" if self.deleted else ""
+        return f"<WebGL{self.kind} {self.id}{state}>"
+
+
+class WebGLBuffer(GLObject):
+    kind = "Buffer"
+
+    def __init__(self):
+        super().__init__()
+        self.data = bytearray()
+        self.usage = None
+        # None until first bound, then 'element' or 'other'
+        self.type: Optional[str] = None
+
+
+class WebGLShader(GLObject):
+    kind = "Shader"
+
+    def __init__(self, shader_type: int):
+        super().__init__()
+        self.type = shader_type
+        self.source = ""
+        self.compiled = False
+        self.info_log = ""
+        self.attributes: List[Tuple[Optional[int], int, str, int]] = []
+        self.uniforms: List[Tuple[int, str, int]] = []
+
+
+class WebGLProgram(GLObject):
+    kind = "Program"
+
+    def __init__(self):
+        super().__init__()
+        self.shaders: Dict[int, WebGLShader] = {}
+        self.linked = False
+        self.info_log = ""
+        self.attributes: List[ActiveInfo] = []
+        self.attribute_locations: Dict[str, int] = {}
+        self.uniforms: List[ActiveInfo] = []
+        self.uniform_locations: Dict[str, "WebGLUniformLocation"] = {}
+        self.uniform_values: Dict[str, tuple] = {}
+
+
+class WebGLUniformLocation:
+    def __init__(self, program: WebGLProgram, name: str, info: "ActiveInfo"):
+        self.program = program
+        self.name = name
+        self.info = info
+
+    def __repr__(self) -> str:
+        return f"<WebGLUniformLocation {self.name}>"
+
+
+class ActiveInfo:
+    def __init__(self, name: str, type: int, size: int):
+        self.name = name
+        self.type = type
+        self.size = size
+
+    def __repr__(self) -> str:
+        return f"<WebGLActiveInfo {self.name} type={self.type} size={self.size}>"
+
+
+class VertexAttrib:
+    __slots__ = ("enabled", "buffer", "size", "type", "normalized", "stride", "offset", "divisor")
+
+    def __init__(self):
+        self.enabled = False
+        self.buffer: Optional[WebGLBuffer] = None
+        self.size = 4
+        self.type = C.FLOAT
+        self.normalized = False
+        self.stride = 0
+        self.offset = 0
+        self.divisor = 0
+
+
+class WebGLVertexArrayObject(GLObject):
+    kind = "VertexArrayObject"
+
+    def __init__(self):
+        super().__init__()
+        self.element_buffer: Optional[WebGLBuffer] = None
+        self.attribs: Dict[int, VertexAttrib] = {}
+
+
+class WebGLTexture(GLObject):
+    kind = "Texture"
+
+    def __init__(self):
+        super().__init__()
+        self.target: Optional[int] = None
+        # level -> (width, height, internal format)
+        self.levels: Dict[int, Tuple[int, int, int]] = {}
+        self.parameters: Dict[int, object] = {}
+
+
+class WebGLFramebuffer(GLObject):
+    kind = "Framebuffer"
+
+    def __init__(self):
+        super().__init__()
+        self.attachments: Dict[int, WebGLTexture] = {}
+        self.draw_buffers: List[int] = [C.COLOR_ATTACHMENT0]
+
+
+class WebGLSync(GLObject):
+    kind = "Sync"
+
+    def __init__(self, frame: int):
+        super().__init__()
+        self.frame = frame
+
+
+class WebGLQuery(GLObject):
+    kind = "Query"
+
+    def __init__(self):
+        super().__init__()
+        self.target: Optional[int] = None
+        self.active = False
+        self.ended_frame = -1
+        self.started = 0
+        self.draws = 0
+        self.result = 0
+
+
+class TimerQueryExtension:
+    QUERY_COUNTER_BITS_EXT = C.QUERY_COUNTER_BITS_EXT
+    TIME_ELAPSED_EXT = C.TIME_ELAPSED_EXT
+    TIMESTAMP_EXT = C.TIMESTAMP_EXT
+    GPU_DISJOINT_EXT = C.GPU_DISJOINT_EXT
+
+    def __init__(self, gl: "WebGL2"):
+        self._gl = gl
+
+    def queryCounterEXT(self, query: WebGLQuery, target: int):
+        query.target = target
+        query.result = time.perf_counter_ns()
+        query.ended_frame = self._gl.frame
+
+
+class Extension:
+    """Extensions that only enable functionality have no methods."""
+
+    def __init__(self, name: str):
+        self.name = name
+
+
+def api(method):
+    """Count and optionally record a WebGL call, and turn validation failures into GL errors."""
+    name = method.__name__
+
+    @functools.wraps(method)
+    def call(self, *args):
+        self.call_counts[name] += 1
+        if self.calls is not None:
+            self.calls.append((name, args))
+        try:
+            return method(self, *args)
+        except _Invalid as invalid:
+            if self.strict:
+                raise WebGLError(invalid.code, name, invalid.message) from None
+            if len(self._errors) < 32:
+                self._errors.append(invalid.code)
+            return None
+
+    return call
+
+
+def _check(condition: bool, code: int, message: str):
+    if not condition:
+        raise _Invalid(code, message)
+
+
+def _check_enum(value: int, allowed, what: str):
+    if value not in allowed:
+        raise _Invalid(C.INVALID_ENUM, f"invalid {what} {value}")
+
+
+def _check_object(obj, kind, what: str, allow_none: bool = True):
+    if obj is None:
+        if not allow_none:
+            raise _Invalid(C.INVALID_VALUE, f"{what} is null")
+        return
+    if not isinstance(obj, kind):
+        raise _Invalid(C.INVALID_OPERATION, f"{what} is not a {kind.kind}: {obj!r}")
+    if obj.deleted:
+        raise _Invalid(C.INVALID_OPERATION, f"{what} was deleted: {obj!r}")
+
+
+def _source_bytes(data, offset: int = 0, length: int = 0) -> memoryview:
+    if isinstance(data, TypedArray):
+        return data.bytes(offset, length)
+    view = memoryview(data).cast("B")
+    return view[offset:offset + length] if length else view[offset:]
+
+
+def _check_pixels(pixels, type: int):
+    _check(
+        isinstance(pixels, TypedArray) and pixels.kind == PIXEL_ARRAYS[type],
+        C.INVALID_OPERATION,
+        f"pixel data of type {type} must be a {PIXEL_ARRAYS[type]}, not {pixels!r}",
+    )
+
+
+class WebGL2:
+    """A ``WebGL2RenderingContext`` that records calls instead of drawing."""
+
+    def __init__(self, canvas=None, *, strict: bool = True, record: bool = False, extensions=SUPPORTED_EXTENSIONS):
+        self.canvas = canvas
+        self.strict = strict
+        #: Every call as ``(method, args)``, only kept with ``record=True``
+        self.calls: Optional[List[Tuple[str, tuple]]] = [] if record else None
+        #: Number of calls per method
+        self.call_counts: Counter = Counter()
+        #: Frames presented so far, results of fences and queries become
+        #: available once the frame they were issued in is over
+        self.frame = 0
+        self._errors: List[int] = []
+        self._supported_extensions = tuple(extensions)
+        self._extensions: Dict[str, object] = {}
+
+        self._default_vao = WebGLVertexArrayObject()
+        self._vao = self._default_vao
+        self._buffers: Dict[int, Optional[WebGLBuffer]] = {}
+        self._program: Optional[WebGLProgram] = None
+        self._framebuffers: Dict[int, Optional[WebGLFramebuffer]] = {}
+        self._active_texture = 0
+        self._textures: Dict[Tuple[int, int], Optional[WebGLTexture]] = {}
+        self._queries: Dict[int, WebGLQuery] = {}
+        self._enabled = {C.DITHER}
+        self.pixel_store: Dict[int, object] = {C.UNPACK_ALIGNMENT: 4, C.PACK_ALIGNMENT: 4}
+        width, height = self.drawingBufferWidth, self.drawingBufferHeight
+        self.state: Dict[str, tuple] = {
+            "viewport": (0, 0, width, height),
+            "scissor": (0, 0, width, height),
+            "clearColor": (0.0, 0.0, 0.0, 0.0),
+            "clearDepth": (1.0,),
+            "depthFunc": (C.LESS,),
+            "depthMask": (True,),
+            "colorMask": (True, True, True, True),
+            "blendFunc": (C.ONE, C.ZERO, C.ONE, C.ZERO),
+            "blendEquation": (C.FUNC_ADD, C.FUNC_ADD),
+            "cullFace": (C.BACK,),
+            "frontFace": (C.CCW,),
+        }
+        #: Pending GPU_DISJOINT_EXT value, set it to simulate a disjoint timer
+        self.disjoint = False
+        contexts.add(self)
+
+    def __getattr__(self, name: str):
+        # Constants, such as gl.FLOAT, as on a real context
+        if name.isupper():
+            try:
+                return getattr(C, name)
+            except AttributeError:
+                pass
+        raise AttributeError(f"WebGL2 has no attribute '{name}'")
+
+    @property
+    def drawingBufferWidth(self) -> int:
+        return self.canvas.width if self.canvas is not None else 300
+
+    @property
+    def drawingBufferHeight(self) -> int:
+        return self.canvas.height if self.canvas is not None else 150
+
+    def present(self):
+        """End the current frame, as returning to the browser's event loop would."""
+        self.frame += 1
+
+    def clear_calls(self):
+        self.call_counts.clear()
+        if self.calls is not None:
+            self.calls.clear()
+
+    # Errors, parameters and extensions
+
+    @api
+    def getError(self) -> int:
+        return self._errors.pop(0) if self._errors else C.NO_ERROR
+
+    @api
+    def isContextLost(self) -> bool:
+        return False
+
+    @api
+    def getSupportedExtensions(self) -> List[str]:
+        return list(self._supported_extensions)
+
+    @api
+    def getExtension(self, name: str):
+        if name not in self._supported_extensions:
+            return None
+        if name not in self._extensions:
+            if name == TIMER_QUERY_EXTENSION:
+                self._extensions[name] = TimerQueryExtension(self)
+            else:
+                self._extensions[name] = Extension(name)
+        return self._extensions[name]
+
+    @api
+    def getParameter(self, pname: int):
+        if pname in PARAMETERS:
+            return PARAMETERS[pname]
+        if pname == C.MAX_VIEWPORT_DIMS:
+            return _int_array((16384, 16384))
+        if pname == C.ALIASED_POINT_SIZE_RANGE:
+            return _float_pair(1.0, 1024.0)
+        if pname == C.GPU_DISJOINT_EXT:
+            _check(TIMER_QUERY_EXTENSION in self._extensions, C.INVALID_ENUM, "timer query extension not enabled")
+            disjoint, self.disjoint = self.disjoint, False
+            return disjoint
+        if pname == C.VIEWPORT:
+            return _int_array(self.state["viewport"])
+        if pname == C.ARRAY_BUFFER_BINDING:
+            return self._buffers.get(C.ARRAY_BUFFER)
+        if pname == C.ELEMENT_ARRAY_BUFFER_BINDING:
+            return self._vao.element_buffer
+        if pname == C.CURRENT_PROGRAM:
+            return self._program
+        if pname == C.VERTEX_ARRAY_BINDING:
+            return None if self._vao is self._default_vao else self._vao
+        if pname == C.FRAMEBUFFER_BINDING:
+            return self._framebuffers.get(C.DRAW_FRAMEBUFFER)
+        if pname == C.ACTIVE_TEXTURE:
+            return C.TEXTURE0 + self._active_texture
+        if pname in self.pixel_store:
+            return self.pixel_store[pname]
+        raise _Invalid(C.INVALID_ENUM, f"unknown parameter {pname}")
+
+    @api
+    def flush(self):
+        pass
+
+    @api
+    def finish(self):
+        pass
+
+    # Buffers
+
+    @api
+    def createBuffer(self) -> WebGLBuffer:
+        return WebGLBuffer()
+
+    @api
+    def deleteBuffer(self, buffer: Optional[WebGLBuffer]):
+        if buffer is None or buffer.deleted:
+            return
+        _check_object(buffer, WebGLBuffer, "buffer")
+        buffer.deleted = True
+        buffer.data = bytearray()
+        for target, bound in list(self._buffers.items()):
+            if bound is buffer:
+                self._buffers[target] = None
+        if self._vao.element_buffer is buffer:
+            self._vao.element_buffer = None
+        for attrib in self._vao.attribs.values():
+            if attrib.buffer is buffer:
+                attrib.buffer = None
+
+    @api
+    def isBuffer(self, buffer) -> bool:
+        return isinstance(buffer, WebGLBuffer) and not buffer.deleted and buffer.type is not None
+
+    @api
+    def bindBuffer(self, target: int, buffer: Optional[WebGLBuffer]):
+        _check_enum(target, BUFFER_TARGETS, "buffer target")
+        _check_object(buffer, WebGLBuffer, "buffer")
+        if buffer is not None and target not in COPY_TARGETS:
+            buffer_type = "element" if target == C.ELEMENT_ARRAY_BUFFER else "other"
+            _check(
+                buffer.type in (None, buffer_type),
+                C.INVALID_OPERATION,
+                f"{buffer!r} holds {buffer.type} data and can't be bound to {target}",
+            )
+            buffer.type = buffer_type
+        elif buffer is not None and buffer.type is None:
+            buffer.type = "other"
+
+        if target == C.ELEMENT_ARRAY_BUFFER:
+            self._vao.element_buffer = buffer
+        else:
+            self._buffers[target] = buffer
+
+    def _bound_buffer(self, target: int) -> WebGLBuffer:
+        _check_enum(target, BUFFER_TARGETS, "buffer target")
+        if target == C.ELEMENT_ARRAY_BUFFER:
+            buffer = self._vao.element_buffer
+        else:
+            buffer = self._buffers.get(target)
+        _check(buffer is not None, C.INVALID_OPERATION, f"no buffer bound to {target}")
+        return buffer
+
+    @api
+    def bufferData(self, target: int, size_or_data, usage: int, src_offset: int = 0, length: int = 0):
+        buffer = self._bound_buffer(target)
+        _check_enum(usage, BUFFER_USAGES, "usage")
+        if isinstance(size_or_data, int):
+            _check(size_or_data >= 0, C.INVALID_VALUE, "negative size")
+            buffer.data = bytearray(size_or_data)
+        else:
+            _check(size_or_data is not None, C.INVALID_VALUE, "data is null")
+            buffer.data = bytearray(_source_bytes(size_or_data, src_offset, length))
+        buffer.usage = usage
+
+    @api
+    def bufferSubData(self, target: int, dst_offset: int, data, src_offset: int = 0, length: int = 0):
+        buffer = self._bound_buffer(target)
+        _check(data is not None, C.INVALID_VALUE, "data is null")
+        source = _source_bytes(data, src_offset, length)
+        _check(
+            0 <= dst_offset and dst_offset + source.nbytes <= len(buffer.data),
+            C.INVALID_VALUE,
+            f"writing {source.nbytes} bytes at {dst_offset} overflows buffer of {len(buffer.data)}",
+        )
+        buffer.data[dst_offset:dst_offset + source.nbytes] = source
+
+    @api
+    def copyBufferSubData(self, read_target: int, write_target: int, read_offset: int, write_offset: int, size: int):
+        source = self._bound_buffer(read_target)
+        dest = self._bound_buffer(write_target)
+        _check(
+            source.type == dest.type,
+            C.INVALID_OPERATION,
+            f"can't copy between {source.type} and {dest.type} buffers",
+        )
+        _check(min(read_offset, write_offset, size) >= 0, C.INVALID_VALUE, "negative offset or size")
+        _check(read_offset + size <= len(source.data), C.INVALID_VALUE, "read range outside buffer")
+        _check(write_offset + size <= len(dest.data), C.INVALID_VALUE, "write range outside buffer")
+        if source is dest:
+            _check(
+                read_offset + size <= write_offset or write_offset + size <= read_offset,
+                C.INVALID_VALUE,
+                "overlapping copy within one buffer",
+            )
+        dest.data[write_offset:write_offset + size] = source.data[read_offset:read_offset + size]
+
+    @api
+    def getBufferSubData(self, target: int, src_offset: int, dst, dst_offset: int = 0, length: int = 0):
+        buffer = self._bound_buffer(target)
+        target_view = dst.bytes(dst_offset, length)
+        _check(
+            0 <= src_offset and src_offset + target_view.nbytes <= len(buffer.data),
+            C.INVALID_VALUE,
+            "read range outside buffer",
+        )
+        target_view[:] = buffer.data[src_offset:src_offset + target_view.nbytes]
+
+    # Vertex arrays
+
+    @api
+    def createVertexArray(self) -> WebGLVertexArrayObject:
+        return WebGLVertexArrayObject()
+
+    @api
+    def deleteVertexArray(self, vao: Optional[WebGLVertexArrayObject]):
+        if vao is None or vao.deleted:
+            return
+        _check_object(vao, WebGLVertexArrayObject, "vertex array")
+        vao.deleted = True
+        if self._vao is vao:
+            self._vao = self._default_vao
+
+    @api
+    def bindVertexArray(self, vao: Optional[WebGLVertexArrayObject]):
+        _check_object(vao, WebGLVertexArrayObject, "vertex array")
+        self._vao = vao if vao is not None else self._default_vao
+
+    def _attrib(self, index: int) -> VertexAttrib:
+        _check(
+            0 <= index < PARAMETERS[C.MAX_VERTEX_ATTRIBS],
+            C.INVALID_VALUE,
+            f"attribute index {index} out of range",
+        )
+        attrib = self._vao.attribs.get(index)
+        if attrib is None:
+            attrib = self._vao.attribs[index] = VertexAttrib()
+        return attrib
+
+    @api
+    def enableVertexAttribArray(self, index: int):
+        self._attrib(index).enabled = True
+
+    @api
+    def disableVertexAttribArray(self, index: int):
+        self._attrib(index).enabled = False
+
+    @api
+    def vertexAttribPointer(self, index: int, size: int, type: int, normalized: bool, stride: int, offset: int):
+        attrib = self._attrib(index)
+        _check(1 <= size <= 4, C.INVALID_VALUE, f"size {size} must be 1 to 4")
+        _check_enum(type, ATTRIB_TYPES, "attribute type")
+        _check(0 <= stride <= 255, C.INVALID_VALUE, f"stride {stride} must be 0 to 255")
+        _check(offset >= 0, C.INVALID_VALUE, "negative offset")
+        type_size = ATTRIB_TYPES[type]
+        _check(
+            stride % type_size == 0 and offset % type_size == 0,
+            C.INVALID_OPERATION,
+            f"stride {stride} and offset {offset} must be multiples of the type size {type_size}",
+        )
+        buffer = self._buffers.get(C.ARRAY_BUFFER)
+        _check(buffer is not None or offset == 0, C.INVALID_OPERATION, "no ARRAY_BUFFER bound")
+        attrib.buffer = buffer
+        attrib.size = size
+        attrib.type = type
+        attrib.normalized = bool(normalized)
+        attrib.stride = stride
+        attrib.offset = offset
+
+    @api
+    def vertexAttribDivisor(self, index: int, divisor: int):
+        _check(divisor >= 0, C.INVALID_VALUE, "negative divisor")
+        self._attrib(index).divisor = divisor
+
+    # Shaders and programs
+
+    @api
+    def createShader(self, shader_type: int) -> WebGLShader:
+        _check_enum(shader_type, (C.VERTEX_SHADER, C.FRAGMENT_SHADER), "shader type")
+        return WebGLShader(shader_type)
+
+    @api
+    def deleteShader(self, shader: Optional[WebGLShader]):
+        if shader is None or shader.deleted:
+            return
+        _check_object(shader, WebGLShader, "shader")
+        shader.deleted = True
+
+    @api
+    def shaderSource(self, shader: WebGLShader, source: str):
+        _check_object(shader, WebGLShader, "shader", allow_none=False)
+        shader.source = source
+
+    @api
+    def compileShader(self, shader: WebGLShader):
+        _check_object(shader, WebGLShader, "shader", allow_none=False)
+        source = _COMMENTS.sub("", shader.source)
+        shader.compiled = False
+        shader.attributes = []
+        shader.uniforms = []
+
+        if not re.search(r"\bvoid\s+main\s*\(", source):
+            shader.info_log = "ERROR: 0:0: Missing main()"
+            return
+        if source.count("{") != source.count("}") or source.count("(") != source.count(")"):
+            shader.info_log = "ERROR: 0:0: Unbalanced brackets"
+            return
+
+        for match in _UNIFORM.finditer(source):
+            type_name, name, array = match.group(1), match.group(2), match.group(3)
+            if type_name not in GLSL_TYPES:
+                shader.info_log = f"ERROR: 0:0: '{type_name}' : unknown uniform type"
+                return
+            shader.uniforms.append((GLSL_TYPES[type_name], name, int(array or 1)))
+
+        if shader.type == C.VERTEX_SHADER:
+            for match in _ATTRIBUTE.finditer(source):
+                location, type_name, name, array = match.groups()
+                if type_name not in GLSL_TYPES:
+                    shader.info_log = f"ERROR: 0:0: '{type_name}' : unknown attribute type"
+                    return
+                shader.attributes.append(
+                    (None if location is None else int(location), GLSL_TYPES[type_name], name, int(array or 1))
+                )
+
+        shader.compiled = True
+        shader.info_log = ""
+
+    @api
+    def getShaderParameter(self, shader: WebGLShader, pname: int):
+        _check_object(shader, WebGLShader, "shader", allow_none=False)
+        if pname == C.COMPILE_STATUS:
+            return shader.compiled
+        if pname == C.SHADER_TYPE:
+            return shader.type
+        if pname == C.DELETE_STATUS:
+            return shader.deleted
+        raise _Invalid(C.INVALID_ENUM, f"unknown shader parameter {pname}")
+
+    @api
+    def getShaderInfoLog(self, shader: WebGLShader) -> str:
+        _check_object(shader, WebGLShader, "shader", allow_none=False)
+        return shader.info_log
+
+    @api
+    def getShaderSource(self, shader: WebGLShader) -> str:
+        _check_object(shader, WebGLShader, "shader", allow_none=False)
+        return shader.source
+
+    @api
+    def createProgram(self) -> WebGLProgram:
+        return WebGLProgram()
+
+    @api
+    def deleteProgram(self, program: Optional[WebGLProgram]):
+        if program is None or program.deleted:
+            return
+        _check_object(program, WebGLProgram, "program")
+        program.deleted = True
+        if self._program is program:
+            self._program = None
+
+    @api
+    def attachShader(self, program: WebGLProgram, shader: WebGLShader):
+        _check_object(program, WebGLProgram, "program", allow_none=False)
+        _check_object(shader, WebGLShader, "shader", allow_none=False)
+        _check(
+            shader.type not in program.shaders,
+            C.INVALID_OPERATION,
+            "a shader of this type is already attached",
+        )
+        program.shaders[shader.type] = shader
+
+    @api
+    def detachShader(self, program: WebGLProgram, shader: WebGLShader):
+        _check_object(program, WebGLProgram, "program", allow_none=False)
+        _check(program.shaders.get(shader.type) is shader, C.INVALID_OPERATION, "shader is not attached")
+        del program.shaders[shader.type]
+
+    @api
+    def linkProgram(self, program: WebGLProgram):
+        _check_object(program, WebGLProgram, "program", allow_none=False)
+        program.linked = False
+        vertex = program.shaders.get(C.VERTEX_SHADER)
+        fragment = program.shaders.get(C.FRAGMENT_SHADER)
+        if vertex is None or fragment is None:
+            program.info_log = "Program needs a vertex and a fragment shader"
+            return
+        if not (vertex.compiled and fragment.compiled):
+            program.info_log = "Attached shaders must be compiled"
+            return
+
+        attributes = []
+        locations: Dict[str, int] = {}
+        taken = set()
+        for location, type, name, size in vertex.attributes:
+            if location is not None:
+                slots = range(location, location + ATTRIB_SLOTS.get(type, 1) * size)
+                if taken.intersection(slots):
+                    program.info_log = f"Attribute '{name}' overlaps another attribute's location"
+                    return
+                taken.update(slots)
+                locations[name] = location
+        next_location = 0
+        for location, type, name, size in vertex.attributes:
+            attributes.append(ActiveInfo(name, type, size))
+            if name in locations:
+                continue
+            slots = ATTRIB_SLOTS.get(type, 1) * size
+            while taken.intersection(range(next_location, next_location + slots)):
+                next_location += 1
+            locations[name] = next_location
+            taken.update(range(next_location, next_location + slots))
+        if len(taken) > PARAMETERS[C.MAX_VERTEX_ATTRIBS]:
+            program.info_log = "Too many vertex attributes"
+            return
+
+        uniforms: Dict[str, ActiveInfo] = {}
+        for shader in (vertex, fragment):
+            for type, name, size in shader.uniforms:
+                existing = uniforms.get(name)
+                if existing is not None and (existing.type, existing.size) != (type, size):
+                    program.info_log = f"Uniform '{name}' differs between shaders"
+                    return
+                uniforms[name] = ActiveInfo(name + ("[0]" if size > 1 else ""), type, size)
+
+        program.attributes = attributes
+        program.attribute_locations = locations
+        program.uniforms = list(uniforms.values())
+        program.uniform_locations = {
+            name: WebGLUniformLocation(program, name, info) for name, info in uniforms.items()
+        }
+        program.uniform_values = {}
+        program.linked = True
+        program.info_log = ""
+
+    @api
+    def getProgramParameter(self, program: WebGLProgram, pname: int):
+        _check_object(program, WebGLProgram, "program", allow_none=False)
+        if pname == C.LINK_STATUS:
+            return program.linked
+        if pname == C.DELETE_STATUS:
+            return program.deleted
+        if pname == C.ATTACHED_SHADERS:
+            return len(program.shaders)
+        if pname == C.ACTIVE_ATTRIBUTES:
+            return len(program.attributes)
+        if pname == C.ACTIVE_UNIFORMS:
+            return len(program.uniforms)
+        raise _Invalid(C.INVALID_ENUM, f"unknown program parameter {pname}")
+
+    @api
+    def getProgramInfoLog(self, program: WebGLProgram) -> str:
+        _check_object(program, WebGLProgram, "program", allow_none=False)
+        return program.info_log
+
+    @api
+    def getActiveAttrib(self, program: WebGLProgram, index: int) -> ActiveInfo:
+        _check_object(program, WebGLProgram, "program", allow_none=False)
+        _check(0 <= index < len(program.attributes), C.INVALID_VALUE, f"attribute index {index} out of range")
+        return program.attributes[index]
+
+    @api
+    def getActiveUniform(self, program: WebGLProgram, index: int) -> ActiveInfo:
+        _check_object(program, WebGLProgram, "program", allow_none=False)
+        _check(0 <= index < len(program.uniforms), C.INVALID_VALUE, f"uniform index {index} out of range")
+        return program.uniforms[index]
+
+    @api
+    def getAttribLocation(self, program: WebGLProgram, name: str) -> int:
+        _check_object(program, WebGLProgram, "program", allow_none=False)
+        _check(program.linked, C.INVALID_OPERATION, "program is not linked")
+        return program.attribute_locations.get(name, -1)
+
+    @api
+    def getUniformLocation(self, program: WebGLProgram, name: str) -> Optional[WebGLUniformLocation]:
+        _check_object(program, WebGLProgram, "program", allow_none=False)
+        _check(program.linked, C.INVALID_OPERATION, "program is not linked")
+        return program.uniform_locations.get(name.split("[")[0])
+
+    @api
+    def useProgram(self, program: Optional[WebGLProgram]):
+        _check_object(program, WebGLProgram, "program")
+        _check(program is None or program.linked, C.INVALID_OPERATION, "program is not linked")
+        self._program = program
+
+    def _set_uniform(self, location: Optional[WebGLUniformLocation], values: tuple):
+        if location is None:
+            return
+        _check(self._program is not None, C.INVALID_OPERATION, "no program in use")
+        _check(location.program is self._program, C.INVALID_OPERATION, "location is from another program")
+        self._program.uniform_values[location.name] = values
+
+    def _set_uniform_data(self, location, data, src_offset: int = 0, length: int = 0):
+        if isinstance(data, TypedArray):
+            data = data.view[src_offset:src_offset + length if length else None]
+        self._set_uniform(location, tuple(data))
+
+    @api
+    def uniform1f(self, location, x):
+        self._set_uniform(location, (x,))
+
+    @api
+    def uniform2f(self, location, x, y):
+        self._set_uniform(location, (x, y))
+
+    @api
+    def uniform3f(self, location, x, y, z):
+        self._set_uniform(location, (x, y, z))
+
+    @api
+    def uniform4f(self, location, x, y, z, w):
+        self._set_uniform(location, (x, y, z, w))
+
+    @api
+    def uniform1i(self, location, x):
+        self._set_uniform(location, (x,))
+
+    @api
+    def uniform2i(self, location, x, y):
+        self._set_uniform(location, (x, y))
+
+    @api
+    def uniform3i(self, location, x, y, z):
+        self._set_uniform(location, (x, y, z))
+
+    @api
+    def uniform4i(self, location, x, y, z, w):
+        self._set_uniform(location, (x, y, z, w))
+
+    @api
+    def uniform1ui(self, location, x):
+        self._set_uniform(location, (x,))
+
+    @api
+    def uniform2ui(self, location, x, y):
+        self._set_uniform(location, (x, y))
+
+    @api
+    def uniform3ui(self, location, x, y, z):
+        self._set_uniform(location, (x, y, z))
+
+    @api
+    def uniform4ui(self, location, x, y, z, w):
+        self._set_uniform(location, (x, y, z, w))
+
+    @api
+    def uniform1fv(self, location, data, src_offset: int = 0, length: int = 0):
+        self._set_uniform_data(location, data, src_offset, length)
+
+    @api
+    def uniform2fv(self, location, data, src_offset: int = 0, length: int = 0):
+        self._set_uniform_data(location, data, src_offset, length)
+
+    @api
+    def uniform3fv(self, location, data, src_offset: int = 0, length: int = 0):
+        self._set_uniform_data(location, data, src_offset, length)
+
+    @api
+    def uniform4fv(self, location, data, src_offset: int = 0, length: int = 0):
+        self._set_uniform_data(location, data, src_offset, length)
+
+    @api
+    def uniform1iv(self, location, data, src_offset: int = 0, length: int = 0):
+        self._set_uniform_data(location, data, src_offset, length)
+
+    @api
+    def uniformMatrix2fv(self, location, transpose: bool, data, src_offset: int = 0, length: int = 0):
+        _check(not transpose, C.INVALID_VALUE, "transpose must be false")
+        self._set_uniform_data(location, data, src_offset, length)
+
+    @api
+    def uniformMatrix3fv(self, location, transpose: bool, data, src_offset: int = 0, length: int = 0):
+        _check(not transpose, C.INVALID_VALUE, "transpose must be false")
+        self._set_uniform_data(location, data, src_offset, length)
+
+    @api
+    def uniformMatrix4fv(self, location, transpose: bool, data, src_offset: int = 0, length: int = 0):
+        _check(not transpose, C.INVALID_VALUE, "transpose must be false")
+        self._set_uniform_data(location, data, src_offset, length)
+
+    @api
+    def getUniform(self, program: WebGLProgram, location: WebGLUniformLocation):
+        _check_object(program, WebGLProgram, "program", allow_none=False)
+        values = program.uniform_values.get(location.name)
+        if values is None:
+            return None
+        return values[0] if len(values) == 1 else values
+
+    # Textures
+
+    @api
+    def createTexture(self) -> WebGLTexture:
+        return WebGLTexture()
+
+    @api
+    def deleteTexture(self, texture: Optional[WebGLTexture]):
+        if texture is None or texture.deleted:
+            return
+        _check_object(texture, WebGLTexture, "texture")
+        texture.deleted = True
+        for key, bound in list(self._textures.items()):
+            if bound is texture:
+                self._textures[key] = None
+
+    @api
+    def activeTexture(self, texture: int):
+        unit = texture - C.TEXTURE0
+        _check(
+            0 <= unit < PARAMETERS[C.MAX_COMBINED_TEXTURE_IMAGE_UNITS],
+            C.INVALID_ENUM,
+            f"texture unit {unit} out of range",
+        )
+        self._active_texture = unit
+
+    @api
+    def bindTexture(self, target: int, texture: Optional[WebGLTexture]):
+        _check_enum(target, TEXTURE_TARGETS, "texture target")
+        _check_object(texture, WebGLTexture, "texture")
+        if texture is not None:
+            _check(
+                texture.target in (None, target),
+                C.INVALID_OPERATION,
+                f"{texture!r} was first bound to {texture.target}, not {target}",
+            )
+            texture.target = target
+        self._textures[self._active_texture, target] = texture
+
+    def _bound_texture(self, target: int) -> WebGLTexture:
+        _check_enum(target, TEXTURE_TARGETS, "texture target")
+        texture = self._textures.get((self._active_texture, target))
+        _check(texture is not None, C.INVALID_OPERATION, f"no texture bound to {target}")
+        return texture
+
+    @api
+    def pixelStorei(self, pname: int, value):
+        if pname in (C.UNPACK_ALIGNMENT, C.PACK_ALIGNMENT):
+            _check(value in (1, 2, 4, 8), C.INVALID_VALUE, f"alignment {value} must be 1, 2, 4 or 8")
+        self.pixel_store[pname] = value
+
+    def _image_size(self, width: int, height: int, format: int, type: int) -> int:
+        pixel = PIXEL_COMPONENTS[format] * PIXEL_TYPES[type]
+        alignment = self.pixel_store.get(C.UNPACK_ALIGNMENT, 4)
+        row = (width * pixel + alignment - 1) // alignment * alignment
+        return row * (height - 1) + width * pixel if height else 0
+
+    @api
+    def texImage2D(self, target, level, internal_format, width, height, border, format, type, pixels=None, src_offset=0):
+        texture = self._bound_texture(target)
+        _check(level >= 0 and border == 0, C.INVALID_VALUE, "invalid level or border")
+        _check(width >= 0 and height >= 0, C.INVALID_VALUE, "negative size")
+        max_size = PARAMETERS[C.MAX_TEXTURE_SIZE]
+        _check(width <= max_size and height <= max_size, C.INVALID_VALUE, "texture too large")
+        _check_enum(format, PIXEL_COMPONENTS, "format")
+        _check_enum(type, PIXEL_TYPES, "type")
+        if pixels is not None:
+            _check_pixels(pixels, type)
+            needed = self._image_size(width, height, format, type)
+            _check(
+                _source_bytes(pixels, src_offset).nbytes >= needed,
+                C.INVALID_OPERATION,
+                f"{width}x{height} image needs {needed} bytes of data",
+            )
+        texture.levels[level] = (width, height, internal_format)
+
+    @api
+    def texSubImage2D(self, target, level, x, y, width, height, format, type, pixels, src_offset=0):
+        texture = self._bound_texture(target)
+        _check(level in texture.levels, C.INVALID_OPERATION, f"level {level} has no image")
+        level_width, level_height, _ = texture.levels[level]
+        _check(
+            x >= 0 and y >= 0 and x + width <= level_width and y + height <= level_height,
+            C.INVALID_VALUE,
+            "region outside the texture",
+        )
+        _check_pixels(pixels, type)
+        needed = self._image_size(width, height, format, type)
+        _check(
+            _source_bytes(pixels, src_offset).nbytes >= needed,
+            C.INVALID_OPERATION,
+            f"{width}x{height} region needs {needed} bytes of data",
+        )
+
+    @api
+    def texParameteri(self, target: int, pname: int, value):
+        self._bound_texture(target).parameters[pname] = value
+
+    @api
+    def texParameterf(self, target: int, pname: int, value):
+        self._bound_texture(target).parameters[pname] = value
+
+    @api
+    def generateMipmap(self, target: int):
+        texture = self._bound_texture(target)
+        _check(0 in texture.levels, C.INVALID_OPERATION, "level 0 has no image")
+        width, height, internal_format = texture.levels[0]
+        level = 0
+        while width > 1 or height > 1:
+            level += 1
+            width, height = max(width // 2, 1), max(height // 2, 1)
+            texture.levels[level] = (width, height, internal_format)
+
+    # Framebuffers
+
+    @api
+    def createFramebuffer(self) -> WebGLFramebuffer:
+        return WebGLFramebuffer()
+
+    @api
+    def deleteFramebuffer(self, framebuffer: Optional[WebGLFramebuffer]):
+        if framebuffer is None or framebuffer.deleted:
+            return
+        _check_object(framebuffer, WebGLFramebuffer, "framebuffer")
+        framebuffer.deleted = True
+        for target, bound in list(self._framebuffers.items()):
+            if bound is framebuffer:
+                self._framebuffers[target] = None
+
+    @api
+    def bindFramebuffer(self, target: int, framebuffer: Optional[WebGLFramebuffer]):
+        _check_enum(target, FRAMEBUFFER_TARGETS, "framebuffer target")
+        _check_object(framebuffer, WebGLFramebuffer, "framebuffer")
+        if target == C.FRAMEBUFFER:
+            self._framebuffers[C.DRAW_FRAMEBUFFER] = framebuffer
+            self._framebuffers[C.READ_FRAMEBUFFER] = framebuffer
+        else:
+            self._framebuffers[target] = framebuffer
+
+    def _bound_framebuffer(self, target: int) -> Optional[WebGLFramebuffer]:
+        _check_enum(target, FRAMEBUFFER_TARGETS, "framebuffer target")
+        return self._framebuffers.get(C.READ_FRAMEBUFFER if target == C.READ_FRAMEBUFFER else C.DRAW_FRAMEBUFFER)
+
+    @api
+    def framebufferTexture2D(self, target: int, attachment: int, textarget: int, texture, level: int):
+        framebuffer = self._bound_framebuffer(target)
+        _check(framebuffer is not None, C.INVALID_OPERATION, "the default framebuffer can't take attachments")
+        _check_object(texture, WebGLTexture, "texture")
+        _check(level == 0, C.INVALID_VALUE, "level must be 0")
+        valid = (
+            C.COLOR_ATTACHMENT0 <= attachment < C.COLOR_ATTACHMENT0 + PARAMETERS[C.MAX_COLOR_ATTACHMENTS]
+            or attachment in (C.DEPTH_ATTACHMENT, C.STENCIL_ATTACHMENT, C.DEPTH_STENCIL_ATTACHMENT)
+        )
+        _check(valid, C.INVALID_ENUM, f"invalid attachment {attachment}")
+        if texture is None:
+            framebuffer.attachments.pop(attachment, None)
+        else:
+            _check(texture.target in (None, textarget), C.INVALID_OPERATION, "texture target mismatch")
+            framebuffer.attachments[attachment] = texture
+
+    @api
+    def checkFramebufferStatus(self, target: int) -> int:
+        framebuffer = self._bound_framebuffer(target)
+        if framebuffer is None:
+            return C.FRAMEBUFFER_COMPLETE
+        if not framebuffer.attachments:
+            return C.FRAMEBUFFER_INCOMPLETE_MISSING_ATTACHMENT
+
+        sizes = set()
+        for attachment, texture in framebuffer.attachments.items():
+            if texture.deleted or 0 not in texture.levels:
+                return C.FRAMEBUFFER_INCOMPLETE_ATTACHMENT
+            width, height, internal_format = texture.levels[0]
+            is_depth = internal_format in DEPTH_FORMATS
+            if is_depth != (attachment in (C.DEPTH_ATTACHMENT, C.DEPTH_STENCIL_ATTACHMENT)):
+                return C.FRAMEBUFFER_INCOMPLETE_ATTACHMENT
+            sizes.add((width, height))
+        if len(sizes) > 1:
+            return C.FRAMEBUFFER_INCOMPLETE_DIMENSIONS
+        return C.FRAMEBUFFER_COMPLETE
+
+    @api
+    def drawBuffers(self, buffers):
+        buffers = list(buffers)
+        framebuffer = self._framebuffers.get(C.DRAW_FRAMEBUFFER)
+        if framebuffer is None:
+            _check(
+                len(buffers) == 1 and buffers[0] in (C.BACK, C.NONE),
+                C.INVALID_OPERATION,
+                "the default framebuffer only takes [BACK] or [NONE]",
+            )
+        else:
+            for i, buffer in enumerate(buffers):
+                _check(
+                    buffer in (C.NONE, C.COLOR_ATTACHMENT0 + i),
+                    C.INVALID_OPERATION,
+                    f"draw buffer {i} must be NONE or COLOR_ATTACHMENT{i}",
+                )
+            framebuffer.draw_buffers = buffers
+
+    # Fixed function state
+
+    @api
+    def enable(self, cap: int):
+        _check_enum(cap, CAPABILITIES, "capability")
+        self._enabled.add(cap)
+
+    @api
+    def disable(self, cap: int):
+        _check_enum(cap, CAPABILITIES, "capability")
+        self._enabled.discard(cap)
+
+    @api
+    def isEnabled(self, cap: int) -> bool:
+        _check_enum(cap, CAPABILITIES, "capability")
+        return cap in self._enabled
+
+    @api
+    def blendFunc(self, src: int, dst: int):
+        self.state["blendFunc"] = (src, dst, src, dst)
+
+    @api
+    def blendFuncSeparate(self, src_rgb: int, dst_rgb: int, src_alpha: int, dst_alpha: int):
+        self.state["blendFunc"] = (src_rgb, dst_rgb, src_alpha, dst_alpha)
+
+    @api
+    def blendEquation(self, mode: int):
+        _check_enum(mode, (C.FUNC_ADD, C.FUNC_SUBTRACT, C.FUNC_REVERSE_SUBTRACT, C.MIN, C.MAX), "blend equation")
+        self.state["blendEquation"] = (mode, mode)
+
+    @api
+    def blendEquationSeparate(self, mode_rgb: int, mode_alpha: int):
+        self.state["blendEquation"] = (mode_rgb, mode_alpha)
+
+    @api
+    def depthFunc(self, func: int):
+        _check(C.NEVER <= func <= C.ALWAYS, C.INVALID_ENUM, f"invalid depth function {func}")
+        self.state["depthFunc"] = (func,)
+
+    @api
+    def depthMask(self, flag: bool):
+        self.state["depthMask"] = (bool(flag),)
+
+    @api
+    def colorMask(self, red: bool, green: bool, blue: bool, alpha: bool):
+        self.state["colorMask"] = (bool(red), bool(green), bool(blue), bool(alpha))
+
+    @api
+    def cullFace(self, mode: int):
+        _check_enum(mode, (C.FRONT, C.BACK, C.FRONT_AND_BACK), "cull face")
+        self.state["cullFace"] = (mode,)
+
+    @api
+    def frontFace(self, mode: int):
+        _check_enum(mode, (C.CW, C.CCW), "front face")
+        self.state["frontFace"] = (mode,)
+
+    @api
+    def clearColor(self, red: float, green: float, blue: float, alpha: float):
+        self.state["clearColor"] = (red, green, blue, alpha)
+
+    @api
+    def clearDepth(self, depth: float):
+        self.state["clearDepth"] = (depth,)
+
+    @api
+    def clear(self, mask: int):
+        valid = C.COLOR_BUFFER_BIT | C.DEPTH_BUFFER_BIT | C.STENCIL_BUFFER_BIT
+        _check(mask & ~valid == 0, C.INVALID_VALUE, f"invalid clear mask {mask}")
+
+    @api
+    def viewport(self, x: int, y: int, width: int, height: int):
+        _check(width >= 0 and height >= 0, C.INVALID_VALUE, "negative viewport size")
+        self.state["viewport"] = (x, y, width, height)
+
+    @api
+    def scissor(self, x: int, y: int, width: int, height: int):
+        _check(width >= 0 and height >= 0, C.INVALID_VALUE, "negative scissor size")
+        self.state["scissor"] = (x, y, width, height)
+
+    # Drawing
+
+    def _check_draw(self, mode: int, vertices: int, instances: int = 1):
+        _check_enum(mode, DRAW_MODES, "draw mode")
+        _check(vertices >= 0 and instances >= 0, C.INVALID_VALUE, "negative count")
+        program = self._program
+        _check(program is not None, C.INVALID_OPERATION, "no program in use")
+        _check(program.linked and not program.deleted, C.INVALID_OPERATION, "program is not usable")
+
+        for name, location in program.attribute_locations.items():
+            attrib = self._vao.attribs.get(location)
+            if attrib is None or not attrib.enabled:
+                continue
+            _check(attrib.buffer is not None, C.INVALID_OPERATION, f"attribute '{name}' has no buffer")
+            elements = instances if attrib.divisor else vertices
+            if attrib.divisor:
+                elements = (instances + attrib.divisor - 1) // attrib.divisor
+            if elements == 0:
+                continue
+            size = attrib.size * ATTRIB_TYPES[attrib.type]
+            stride = attrib.stride or size
+            needed = attrib.offset + stride * (elements - 1) + size
+            _check(
+                needed <= len(attrib.buffer.data),
+                C.INVALID_OPERATION,
+                f"attribute '{name}' reads {needed} bytes from a buffer of {len(attrib.buffer.data)}",
+            )
+
+        for query in self._queries.values():
+            query.draws += 1
+
+    def _check_elements(self, count: int, type: int, offset: int):
+        _check_enum(type, INDEX_TYPES, "index type")
+        size = INDEX_TYPES[type]
+        _check(offset >= 0 and offset % size == 0, C.INVALID_OPERATION, f"offset {offset} not aligned to {size}")
+        buffer = self._vao.element_buffer
+        _check(buffer is not None, C.INVALID_OPERATION, "no ELEMENT_ARRAY_BUFFER bound")
+        _check(
+            offset + count * size <= len(buffer.data),
+            C.INVALID_OPERATION,
+            f"{count} indices at {offset} overflow the index buffer of {len(buffer.data)} bytes",
+        )
+
+    def _max_index(self, count: int, type: int, offset: int) -> int:
+        if count == 0:
+            return 0
+        data = memoryview(self._vao.element_buffer.data)[offset:offset + count * INDEX_TYPES[type]]
+        return max(data.cast({1: "B", 2: "H", 4: "I"}[INDEX_TYPES[type]]))
+
+    @api
+    def drawArrays(self, mode: int, first: int, count: int):
+        _check(first >= 0, C.INVALID_VALUE, "negative first")
+        self._check_draw(mode, first + count if count else 0)
+
+    @api
+    def drawArraysInstanced(self, mode: int, first: int, count: int, instances: int):
+        _check(first >= 0, C.INVALID_VALUE, "negative first")
+        self._check_draw(mode, first + count if count else 0, instances)
+
+    @api
+    def drawElements(self, mode: int, count: int, type: int, offset: int):
+        _check(count >= 0, C.INVALID_VALUE, "negative count")
+        self._check_elements(count, type, offset)
+        self._check_draw(mode, self._max_index(count, type, offset) + 1 if count else 0)
+
+    @api
+    def drawElementsInstanced(self, mode: int, count: int, type: int, offset: int, instances: int):
+        _check(count >= 0, C.INVALID_VALUE, "negative count")
+        self._check_elements(count, type, offset)
+        self._check_draw(mode, self._max_index(count, type, offset) + 1 if count else 0, instances)
+
+    # Syncs and queries
+
+    @api
+    def fenceSync(self, condition: int, flags: int) -> WebGLSync:
+        _check(condition == C.SYNC_GPU_COMMANDS_COMPLETE, C.INVALID_ENUM, "invalid sync condition")
+        _check(flags == 0, C.INVALID_VALUE, "flags must be 0")
+        return WebGLSync(self.frame)
+
+    @api
+    def clientWaitSync(self, sync: WebGLSync, flags: int, timeout: int) -> int:
+        _check_object(sync, WebGLSync, "sync", allow_none=False)
+        if self.frame > sync.frame:
+            return C.ALREADY_SIGNALED
+        # Waiting with a timeout lets the GPU finish
+        if timeout > 0:
+            sync.frame = self.frame - 1
+            return C.CONDITION_SATISFIED
+        return C.TIMEOUT_EXPIRED
+
+    @api
+    def getSyncParameter(self, sync: WebGLSync, pname: int):
+        _check_object(sync, WebGLSync, "sync", allow_none=False)
+        if pname == C.SYNC_STATUS:
+            return C.SIGNALED if self.frame > sync.frame else C.UNSIGNALED
+        if pname == C.OBJECT_TYPE:
+            return C.SYNC_FENCE
+        raise _Invalid(C.INVALID_ENUM, f"unknown sync parameter {pname}")
+
+    @api
+    def deleteSync(self, sync: Optional[WebGLSync]):
+        if sync is not None:
+            sync.deleted = True
+
+    @api
+    def createQuery(self) -> WebGLQuery:
+        return WebGLQuery()
+
+    @api
+    def deleteQuery(self, query: Optional[WebGLQuery]):
+        if query is None or query.deleted:
+            return
+        _check_object(query, WebGLQuery, "query")
+        query.deleted = True
+
+    @api
+    def beginQuery(self, target: int, query: WebGLQuery):
+        _check_enum(target, QUERY_TARGETS, "query target")
+        if target == C.TIME_ELAPSED_EXT:
+            _check(TIMER_QUERY_EXTENSION in self._extensions, C.INVALID_ENUM, "timer query extension not enabled")
+        _check_object(query, WebGLQuery, "query", allow_none=False)
+        _check(target not in self._queries, C.INVALID_OPERATION, f"a query for {target} is already active")
+        _check(not query.active, C.INVALID_OPERATION, "query is already active")
+        _check(query.target in (None, target), C.INVALID_OPERATION, "query was used with another target")
+        query.target = target
+        query.active = True
+        query.draws = 0
+        query.started = time.perf_counter_ns()
+        self._queries[target] = query
+
+    @api
+    def endQuery(self, target: int):
+        _check_enum(target, QUERY_TARGETS, "query target")
+        query = self._queries.pop(target, None)
+        _check(query is not None, C.INVALID_OPERATION, f"no query for {target} is active")
+        query.active = False
+        query.ended_frame = self.frame
+        if target == C.TIME_ELAPSED_EXT:
+            query.result = time.perf_counter_ns() - query.started
+        elif target == C.TRANSFORM_FEEDBACK_PRIMITIVES_WRITTEN:
+            query.result = 0
+        else:
+            query.result = 1 if query.draws else 0
+
+    @api
+    def getQuery(self, target: int, pname: int):
+        _check_enum(target, QUERY_TARGETS, "query target")
+        return self._queries.get(target)
+
+    @api
+    def getQueryParameter(self, query: WebGLQuery, pname: int):
+        _check_object(query, WebGLQuery, "query", allow_none=False)
+        _check(not query.active, C.INVALID_OPERATION, "query is still active")
+        available = query.ended_frame >= 0 and self.frame > query.ended_frame
+        if pname == C.QUERY_RESULT_AVAILABLE:
+            return available
+        if pname == C.QUERY_RESULT:
+            return query.result if available else 0
+        raise _Invalid(C.INVALID_ENUM, f"unknown query parameter {pname}")
+
+
+def _int_array(values) -> TypedArray:
+    array = Int32Array.new(len(values))
+    for i, value in enumerate(values):
+        array[i] = value
+    return array
+
+
+def _float_pair(first: float, second: float) -> TypedArray:
+    array = Float32Array.new(2)
+    array[0] = first
+    array[1] = second
+    return array
@@ -1,52 +1,1385 @@
 #! /usr/bin/env python
 
 import argparse
+import ast
+import asyncio
+import base64
+import ctypes
+import ctypes.util
+import datetime
+import email.utils
+import gzip
+import hashlib
 import http.server
-import shutil
+import io
+import json
+import os
+import re
+import select
+import selectors
+import socket
 import socketserver
+import subprocess
+import sys
+import struct
+import threading
+import time
+import zipfile
+from concurrent.futures import Future, ThreadPoolExecutor
 from contextlib import contextmanager
 from pathlib import Path
+from typing import BinaryIO, Callable, Dict, Iterable, List, NamedTuple, Optional, Set, Tuple
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Directories and files which never make it into a generated package archive
+IGNORED_NAMES = {"__pycache__", ".DS_Store"}
+IGNORED_SUFFIXES = {".pyc", ".pyo"}
+
+# Content-Encodings we can produce, in order of preference
+ENCODERS: Dict[str, Callable[[bytes], bytes]] = {}
+if brotli is not None:
+    ENCODERS["br"] = brotli.compress
+ENCODERS["gzip"] = lambda data: gzip.compress(data, compresslevel=9, mtime=0)
+
+# Responses smaller than this aren't worth a Content-Encoding
+COMPRESSION_MIN_SIZE = 512
+# Bundle URLs: <name>[.<content hash>][.pyc].zip
+ARCHIVE_NAME = re.compile(r"(?P<name>.+?)(?:\.(?P<digest>[0-9a-f]{16}))?(?P<pyc>\.pyc)?\.zip")
+IMMUTABLE = "public, max-age=31536000, immutable"
+
+COMPRESSIBLE_TYPES = {
+    "application/javascript",
+    "application/json",
+    "application/wasm",
+    "application/xml",
+    "image/svg+xml",
+}
+
+
+def iter_source_files(source: Path):
+    """Yield every file below ``source`` that belongs in its archive, in a stable order."""
+    for root, dirs, files in os.walk(source):
+        dirs[:] = sorted(d for d in dirs if d not in IGNORED_NAMES)
+        for name in sorted(files):
+            if name in IGNORED_NAMES or os.path.splitext(name)[1] in IGNORED_SUFFIXES:
+                continue
+            yield Path(root, name)
+
+
+def is_ignored(path: Path) -> bool:
+    return path.suffix in IGNORED_SUFFIXES or any(part in IGNORED_NAMES for part in path.parts)
+
+
+def fingerprint_directory(source: Path):
+    """
+    Fingerprint a directory from the names, sizes and modification times of its files.
+
+    Returns a ``(fingerprint, last_modified)`` tuple where ``last_modified`` is the
+    newest modification time found, in seconds since the epoch.
+    """
+    digest = hashlib.sha1()
+    last_modified = 0.0
+    for path in iter_source_files(source):
+        stat = path.stat()
+        digest.update(
+            f"{path.relative_to(source).as_posix()}\0{stat.st_size}\0{stat.st_mtime_ns}\0".encode()
+        )
+        last_modified = max(last_modified, stat.st_mtime)
+    return digest.hexdigest()[:16], last_modified
+
+
+# Run by the target interpreter: reads {name: base64 source} as JSON on stdin and
+# writes {name: base64 pyc} back. The pycs are unchecked hash-based (PEP 552) so
+# they stay valid whatever timestamps the files get when unpacked.
+COMPILE_SCRIPT = """
+import base64, importlib.util, json, marshal, sys
+compiled = {}
+for name, source in json.load(sys.stdin).items():
+    source = base64.b64decode(source)
+    code = compile(source, name, "exec", dont_inherit=True)
+    header = importlib.util.MAGIC_NUMBER + (1).to_bytes(4, "little") + importlib.util.source_hash(source)
+    compiled[name] = base64.b64encode(header + marshal.dumps(code)).decode()
+json.dump(compiled, sys.stdout)
+"""
+
+
+class BytecodeCompiler:
+    """
+    Compiles module sources to pyc data for a target interpreter, which defaults to
+    the one running the server. Results are cached by file name and source hash, so
+    a module is only compiled again once its contents change. The name is part of
+    the key because the code objects record it for tracebacks.
+    """
+
+    def __init__(self, python: str = sys.executable):
+        self.python = python
+        self.magic = subprocess.run(
+            [python, "-c", "import importlib.util; print(importlib.util.MAGIC_NUMBER.hex())"],
+            check=True,
+            capture_output=True,
+            text=True,
+        ).stdout.strip()
+        self._compiled: Dict[Tuple[str, str], bytes] = {}
+        self._lock = threading.Lock()
+
+    def compile(self, sources: Dict[str, bytes]) -> Dict[str, bytes]:
+        """Compile ``{filename: source}``, returning ``{filename: pyc data}``."""
+        keys = {name: (name, hashlib.sha256(source).hexdigest()) for name, source in sources.items()}
+        with self._lock:
+            missing = {
+                name: base64.b64encode(source).decode()
+                for name, source in sources.items()
+                if keys[name] not in self._compiled
+            }
+
+        if missing:
+            result = subprocess.run(
+                [self.python, "-c", COMPILE_SCRIPT],
+                input=json.dumps(missing),
+                capture_output=True,
+                text=True,
+            )
+            if result.returncode != 0:
+                raise RuntimeError(f"Failed to compile bytecode:\n{result.stderr}")
+            compiled = json.loads(result.stdout)
+            with self._lock:
+                for name, data in compiled.items():
+                    self._compiled[keys[name]] = base64.b64decode(data)
+
+        with self._lock:
+            return {name: self._compiled[keys[name]] for name in sources}
+
+
+def read_source_files(source: Path) -> Dict[str, bytes]:
+    """Read the files of ``source``, keyed by their name in the archive."""
+    return {
+        Path(source.name, path.relative_to(source)).as_posix(): path.read_bytes()
+        for path in iter_source_files(source)
+    }
+
+
+def find_packages(directory: Path) -> List[Path]:
+    """The Python packages directly inside ``directory``, such as an example's ``package``."""
+    return sorted(path.parent for path in directory.glob("*/__init__.py"))
+
+
+# Directory -> (fingerprint, top-level names its modules import)
+_imported_roots: Dict[Path, Tuple[str, Set[str]]] = {}
+
+
+def imported_roots(package: Path) -> Set[str]:
+    """The top-level names of the modules imported anywhere in ``package``."""
+    fingerprint, _ = fingerprint_directory(package)
+    cached = _imported_roots.get(package)
+    if cached is not None and cached[0] == fingerprint:
+        return cached[1]
+
+    roots = set()
+    for path, source in read_source_files(package).items():
+        if path.endswith(".py"):
+            tree = ast.parse(source, path)
+            roots.update(name.partition(".")[0] for name in find_imports(tree, *module_name(path)))
+    _imported_roots[package] = fingerprint, roots
+    return roots
+
+
+def find_libraries(directory: Path, packages: List[Path]) -> List[Path]:
+    """
+    The packages directly inside ``directory`` that ``packages`` import, directly
+    or through another of those libraries.
+    """
+    libraries = {path.name: path for path in find_packages(directory)}
+    found: Set[str] = set()
+    pending = list(packages)
+    while pending:
+        for root in imported_roots(pending.pop()) & libraries.keys() - found:
+            found.add(root)
+            pending.append(libraries[root])
+    return sorted(libraries[name] for name in found)
+
+
+def module_name(path: str) -> Tuple[str, bool]:
+    """Turn an archive path into a ``(module name, is package)`` tuple."""
+    parts = path[: -len(".py")].split("/")
+    if parts[-1] == "__init__":
+        return ".".join(parts[:-1]), True
+    return ".".join(parts), False
+
+
+def find_imports(tree: ast.Module, name: str, is_package: bool) -> Set[str]:
+    """
+    Collect the absolute names of every module ``tree`` may import. Names imported
+    from a module are included too, as they could be submodules.
+    """
+    package = name if is_package else name.rpartition(".")[0]
+    imports = set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            imports.update(alias.name for alias in node.names)
+        elif isinstance(node, ast.ImportFrom):
+            if node.level:
+                base = package.rsplit(".", node.level - 1)[0] if node.level > 1 else package
+                base = f"{base}.{node.module}" if node.module else base
+            else:
+                base = node.module
+            imports.add(base)
+            imports.update(f"{base}.{alias.name}" for alias in node.names if alias.name != "*")
+    return imports
+
+
+def is_constant_table(tree: ast.Module) -> bool:
+    """Whether a module consists of nothing but ``NAME = <literal>`` assignments."""
+    return len(tree.body) > 0 and all(
+        isinstance(node, ast.Assign)
+        and len(node.targets) == 1
+        and isinstance(node.targets[0], ast.Name)
+        and isinstance(node.value, (ast.Constant, ast.UnaryOp))
+        for node in tree.body
+    )
+
+
+def used_names(trees: List[ast.Module]) -> Set[str]:
+    """Every identifier referenced by name, attribute or import in ``trees``."""
+    names = set()
+    for tree in trees:
+        for node in ast.walk(tree):
+            if isinstance(node, ast.Name):
+                names.add(node.id)
+            elif isinstance(node, ast.Attribute):
+                names.add(node.attr)
+            elif isinstance(node, ast.alias):
+                names.add(node.asname or node.name)
+    return names
+
+
+def strip_constant_table(source: bytes, tree: ast.Module, keep: Set[str]) -> bytes:
+    """Keep only the assignments to names in ``keep``, dropping everything else."""
+    lines = source.decode().splitlines(keepends=True)
+    kept = []
+    for node in tree.body:
+        if node.targets[0].id in keep:
+            kept.extend(lines[node.lineno - 1 : node.end_lineno])
+    return "".join(kept).encode()
+
+
+class ShakeResult(NamedTuple):
+    files: Dict[str, bytes]
+    # Archive path to (bundled size, original size) for every Python module
+    modules: Dict[str, Tuple[int, int]]
+
+    def report(self, title: str) -> str:
+        bundled = {path: sizes for path, sizes in self.modules.items() if path in self.files}
+        bundled_size = sum(size for size, _ in bundled.values())
+        total_size = sum(original for _, original in self.modules.values())
+        lines = [
+            f"{title}: {len(bundled)} of {len(self.modules)} modules, "
+            f"{bundled_size / 1024:.1f} of {total_size / 1024:.1f} KiB"
+        ]
+        for path, (size, original) in sorted(bundled.items(), key=lambda item: -item[1][0]):
+            stripped = f" (stripped from {original / 1024:.1f} KiB)" if size != original else ""
+            lines.append(f"  {size / 1024:7.1f} KiB  {path}{stripped}")
+        return "\n".join(lines)
+
+
+def shake(library: Path, packages: List[Path], strip_constants: bool = False) -> ShakeResult:
+    """
+    Reduce ``library`` to the modules reachable from the imports of ``packages``.
+    Files other than modules are always kept, since there is no telling who uses them.
+
+    With ``strip_constants``, modules which are plain constant tables (like
+    ``arcade.gl.constants``) are cut down to the names referenced anywhere in the
+    bundled code. Names only looked up dynamically would be lost, hence opt-in.
+    """
+    files = read_source_files(library)
+    trees = {}
+    modules = {}
+    for path, source in files.items():
+        if path.endswith(".py"):
+            name, is_package = module_name(path)
+            trees[path] = ast.parse(source, path)
+            modules[name] = (path, is_package)
+
+    entry_trees = []
+    pending = []
+    for package in packages:
+        for path, source in read_source_files(package).items():
+            if path.endswith(".py"):
+                tree = ast.parse(source, path)
+                entry_trees.append(tree)
+                pending.extend(find_imports(tree, *module_name(path)))
+
+    reachable: Set[str] = set()
+    while pending:
+        name = pending.pop()
+        # Importing a submodule runs the __init__ of every package above it
+        parts = name.split(".")
+        for i in range(1, len(parts) + 1):
+            parent = ".".join(parts[:i])
+            if parent in modules and parent not in reachable:
+                reachable.add(parent)
+                path, is_package = modules[parent]
+                pending.extend(find_imports(trees[path], parent, is_package))
+
+    kept_paths = {modules[name][0] for name in reachable}
+    result = {
+        path: source
+        for path, source in files.items()
+        if not path.endswith(".py") or path in kept_paths
+    }
+
+    if strip_constants:
+        tables = {path for path in kept_paths if is_constant_table(trees[path])}
+        names = used_names(entry_trees + [trees[path] for path in kept_paths - tables])
+        for path in tables:
+            result[path] = strip_constant_table(files[path], trees[path], names)
+
+    sizes = {
+        path: (len(result.get(path, source)), len(source))
+        for path, source in files.items()
+        if path.endswith(".py")
+    }
+    return ShakeResult(result, sizes)
+
+
+def build_archive(
+    files: Dict[str, bytes],
+    compression: int = zipfile.ZIP_DEFLATED,
+    compiler: Optional[BytecodeCompiler] = None,
+) -> bytes:
+    """
+    Zip ``files`` in memory, as returned by ``read_source_files`` or ``shake``.
+
+    When a ``compiler`` is given, modules are stored as sourceless ``.pyc`` files
+    next to where their ``.py`` would have been.
+    """
+    compiled = {}
+    if compiler is not None:
+        compiled = compiler.compile(
+            {name: source for name, source in files.items() if name.endswith(".py")}
+        )
+
+    # Fixed timestamps keep the archive, and so its digest, a function of its contents
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", compression) as archive:
+        for name, source in files.items():
+            if name in compiled:
+                name, source = name + "c", compiled[name]
+            info = zipfile.ZipInfo(name, date_time=(1980, 1, 1, 0, 0, 0))
+            info.compress_type = compression
+            info.external_attr = 0o644 << 16
+            archive.writestr(info, source)
+    return buffer.getvalue()
+
+
+class Archive(NamedTuple):
+    data: bytes
+    fingerprint: str
+    last_modified: float
+    # Hash of ``data``, used for the content-addressed bundle URLs
+    digest: str
+
+
+class ArchiveCache:
+    """
+    Keeps generated package archives in memory for as long as their source directory
+    is unchanged, so a page reload only costs a directory walk instead of a full
+    re-compression.
+
+    Archives are built on a small dedicated executor. Requests arriving while an
+    archive is being built wait on that build instead of starting their own.
+
+    With ``stored=True`` archives are written without zip compression and left to
+    transport compression instead, which Pyodide unpacks faster. Bytecode archives
+    are available when a ``compiler`` is configured. With ``tree_shake=True``,
+    archives requested for an example only contain what its packages import.
+
+    When ``watching`` is set, something else (see ``watch``) is responsible for
+    calling ``refresh`` on changes, so requests are answered from the cache
+    without fingerprinting the sources first.
+    """
+
+    def __init__(
+        self,
+        build_workers: int = 2,
+        stored: bool = False,
+        compiler: Optional[BytecodeCompiler] = None,
+        tree_shake: bool = False,
+        strip_constants: bool = False,
+        watching: bool = False,
+    ):
+        self.stored = stored
+        self.watching = watching
+        self.compiler = compiler
+        self.tree_shake = tree_shake
+        self.strip_constants = strip_constants
+        self._archives: Dict[Tuple[Path, Optional[Path], bool], Archive] = {}
+        self._pending: Dict[Tuple[Path, Optional[Path], bool, str], "Future[Archive]"] = {}
+        # Fingerprint of the newest build started for each archive, so a change
+        # doesn't start the same build twice
+        self._latest: Dict[Tuple[Path, Optional[Path], bool], str] = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(build_workers, thread_name_prefix="archive")
+
+    def get(self, source: Path, bytecode: bool = False, example: Optional[Path] = None) -> Archive:
+        """
+        Get the archive of ``source``, building it if needed. ``example`` names the
+        example directory the archive is for, which matters when tree shaking.
+        """
+        if bytecode and self.compiler is None:
+            raise ValueError("Bytecode archives need a compiler")
+        if not self.tree_shake:
+            example = None
+
+        if self.watching:
+            with self._lock:
+                archive = self._archives.get((source, example, bytecode))
+            if archive is not None:
+                return archive
+
+        fingerprint, last_modified = self.fingerprint(source, example, bytecode)
+        with self._lock:
+            archive = self._archives.get((source, example, bytecode))
+            if archive is not None and archive.fingerprint == fingerprint:
+                return archive
+            future = self._submit((source, example, bytecode, fingerprint), last_modified)
+
+        return future.result()
+
+    def refresh(self, changed: Iterable[Path]) -> None:
+        """
+        Rebuild every cached archive depending on one of the ``changed`` paths in the
+        background. The previous archive keeps being served until its replacement is
+        ready.
+        """
+        changed = list(changed)
+        with self._lock:
+            # Archives still on their first build count too, their sources may
+            # have changed after the build read them
+            known = set(self._archives) | set(self._latest)
+            keys = [key for key in known if any(self._depends_on(key, path) for path in changed)]
+
+        for key in keys:
+            fingerprint, last_modified = self.fingerprint(*key)
+            with self._lock:
+                if self._latest.get(key) == fingerprint:
+                    continue
+                future = self._submit(key + (fingerprint,), last_modified)
+            future.add_done_callback(self._report_failure)
+
+    @staticmethod
+    def _report_failure(future: "Future[Archive]"):
+        if future.exception() is not None:
+            print(f"Failed to rebuild archive: {future.exception()}", file=sys.stderr)
+
+    def _depends_on(self, key: Tuple[Path, Optional[Path], bool], path: Path) -> bool:
+        source, example, _ = key
+        roots = [source] + (find_packages(example) if example is not None else [])
+        return any(path == root or root in path.parents for root in roots)
+
+    def _submit(self, key: Tuple[Path, Optional[Path], bool, str], last_modified: float) -> "Future[Archive]":
+        """Start building ``key`` unless that build is already running. Needs the lock held."""
+        future = self._pending.get(key)
+        if future is None:
+            future = self._executor.submit(self._build, key, last_modified)
+            self._pending[key] = future
+            self._latest[key[:3]] = key[3]
+        return future
+
+    def fingerprint(self, source: Path, example: Optional[Path], bytecode: bool):
+        fingerprint, last_modified = fingerprint_directory(source)
+        if example is not None:
+            digest = hashlib.sha1(f"{fingerprint}\0{self.strip_constants}".encode())
+            for package in find_packages(example):
+                package_fingerprint, package_modified = fingerprint_directory(package)
+                digest.update(f"\0{package.name}\0{package_fingerprint}".encode())
+                last_modified = max(last_modified, package_modified)
+            fingerprint = digest.hexdigest()[:16]
+        if bytecode:
+            fingerprint = f"{fingerprint}-{self.compiler.magic}"
+        return fingerprint, last_modified
+
+    def _build(self, key: Tuple[Path, Optional[Path], bool, str], last_modified: float) -> Archive:
+        source, example, bytecode, fingerprint = key
+        start = time.perf_counter()
+        try:
+            if example is not None:
+                shaken = shake(source, find_packages(example), self.strip_constants)
+                print(shaken.report(f"Bundled {source.name} for {example.name}"), file=sys.stderr)
+                files = shaken.files
+            else:
+                files = read_source_files(source)
+
+            compression = zipfile.ZIP_STORED if self.stored else zipfile.ZIP_DEFLATED
+            data = build_archive(files, compression, self.compiler if bytecode else None)
+            archive = Archive(data, fingerprint, last_modified, hashlib.sha256(data).hexdigest()[:16])
+            # Builds of one archive can overlap, and the sources may have changed
+            # while this one ran. Only an archive of the sources as they are now
+            # is kept, so an older build finishing last can't replace a newer one.
+            current, _ = self.fingerprint(source, example, bytecode)
+            with self._lock:
+                if current == fingerprint:
+                    self._archives[key[:3]] = archive
+                else:
+                    self._forget_build(key)
+
+            description = source.name
+            if example is not None:
+                description += f" for {example.name}"
+            if bytecode:
+                description += " (bytecode)"
+            elapsed = (time.perf_counter() - start) * 1000
+            print(f"Built {description} in {elapsed:.0f} ms, {len(data) / 1024:.1f} KiB", file=sys.stderr)
+            return archive
+        except BaseException:
+            with self._lock:
+                self._forget_build(key)
+            raise
+        finally:
+            with self._lock:
+                del self._pending[key]
+
+    def _forget_build(self, key: Tuple[Path, Optional[Path], bool, str]):
+        """Undo the record of a build that didn't produce the archive. Needs the lock held."""
+        if self._latest.get(key[:3]) != key[3]:
+            return
+        previous = self._archives.get(key[:3])
+        if previous is None:
+            del self._latest[key[:3]]
+        else:
+            self._latest[key[:3]] = previous.fingerprint
+
+
+class InotifyWatcher:
+    """Reports changed files below a set of directories using Linux's inotify."""
+
+    IN_MODIFY = 0x2
+    IN_ATTRIB = 0x4
+    IN_CLOSE_WRITE = 0x8
+    IN_MOVED_FROM = 0x40
+    IN_MOVED_TO = 0x80
+    IN_CREATE = 0x100
+    IN_DELETE = 0x200
+    IN_ISDIR = 0x40000000
+    MASK = IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+    EVENT = struct.Struct("iIII")
+
+    def __init__(self, roots: List[Path]):
+        self._libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        self._fd = self._libc.inotify_init1(os.O_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self._watches: Dict[int, Path] = {}
+        for root in roots:
+            self._add_tree(root)
+
+    def _add_tree(self, root: Path):
+        for directory, dirs, _ in os.walk(root):
+            dirs[:] = [d for d in dirs if d not in IGNORED_NAMES]
+            wd = self._libc.inotify_add_watch(self._fd, os.fsencode(directory), self.MASK)
+            if wd >= 0:
+                self._watches[wd] = Path(directory)
+
+    def read(self, timeout: float) -> Set[Path]:
+        changed = set()
+        if not select.select([self._fd], [], [], timeout)[0]:
+            return changed
+
+        data = os.read(self._fd, 64 * 1024)
+        offset = 0
+        while offset < len(data):
+            wd, mask, _, length = self.EVENT.unpack_from(data, offset)
+            offset += self.EVENT.size
+            name = data[offset : offset + length].rstrip(b"\0")
+            offset += length
+            if wd not in self._watches:
+                continue
+            path = self._watches[wd] / os.fsdecode(name)
+            if mask & self.IN_ISDIR and mask & (self.IN_CREATE | self.IN_MOVED_TO):
+                self._add_tree(path)
+            if not is_ignored(path):
+                changed.add(path)
+        return changed
+
+
+class PollingWatcher:
+    """Reports changed files below a set of directories by comparing stat snapshots."""
+
+    def __init__(self, roots: List[Path], interval: float = 1.0):
+        self._roots = roots
+        self._interval = interval
+        self._snapshot = self._scan()
+
+    def _scan(self) -> Dict[Path, Tuple[int, int]]:
+        snapshot = {}
+        for root in self._roots:
+            for path in iter_source_files(root):
+                try:
+                    stat = path.stat()
+                except FileNotFoundError:
+                    continue
+                snapshot[path] = (stat.st_mtime_ns, stat.st_size)
+        return snapshot
+
+    def read(self, timeout: float) -> Set[Path]:
+        time.sleep(min(timeout, self._interval))
+        snapshot = self._scan()
+        changed = {
+            path
+            for path in snapshot.keys() | self._snapshot.keys()
+            if snapshot.get(path) != self._snapshot.get(path)
+        }
+        self._snapshot = snapshot
+        return changed
+
+
+# Time to wait after a change for the rest of a save (or a checkout) to land
+WATCH_DEBOUNCE = 0.1
+
+
+def watch(roots: List[Path], on_change: Callable[[Set[Path]], None], stop: threading.Event):
+    """Call ``on_change`` with batches of changed paths below ``roots`` until ``stop`` is set."""
+    try:
+        watcher = InotifyWatcher(roots)
+    except (OSError, AttributeError, TypeError):
+        watcher = PollingWatcher(roots)
+    print(f"Watching for changes using {type(watcher).__name__}", file=sys.stderr)
+
+    while not stop.is_set():
+        changed = watcher.read(0.5)
+        if changed:
+            time.sleep(WATCH_DEBOUNCE)
+            changed |= watcher.read(0)
+            on_change(changed)
+
+
+class CompressionCache:
+    """
+    Holds one compressed variant per resource and encoding, tagged with the fingerprint
+    of the content it was made from, so every asset is compressed once per change
+    rather than once per request.
+    """
+
+    def __init__(self):
+        self._variants: Dict[Tuple[str, str], Tuple[str, bytes]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: str, fingerprint: str, encoding: str, load: Callable[[], bytes]) -> bytes:
+        with self._lock:
+            variant = self._variants.get((key, encoding))
+        if variant is not None and variant[0] == fingerprint:
+            return variant[1]
+
+        data = ENCODERS[encoding](load())
+        with self._lock:
+            self._variants[(key, encoding)] = (fingerprint, data)
+        return data
+
+
+class FileRange:
+    """A slice of an open file, sent with ``socket.sendfile`` rather than read into Python."""
+
+    def __init__(self, file: BinaryIO, offset: int, count: int):
+        self.file = file
+        self.offset = offset
+        self.count = count
+
+    def close(self):
+        self.file.close()
+
+
+def is_compressible(content_type: str) -> bool:
+    return content_type.startswith("text/") or content_type in COMPRESSIBLE_TYPES
 
 
 class HTTPHandler(http.server.SimpleHTTPRequestHandler):
+    # Keep connections open between the handful of asset fetches a page makes.
+    # Idle connections wait on the server's selector, not on a worker, and are
+    # closed after idle_timeout. timeout only limits reading a request once it started.
+    protocol_version = "HTTP/1.1"
+    timeout = 5
+    idle_timeout = 15
+    # Headers and body go out in separate writes, which Nagle's algorithm would
+    # otherwise hold back until the client's delayed ACK on a kept-alive connection.
+    disable_nagle_algorithm = True
+
+    archives = ArchiveCache()
+    compressed = CompressionCache()
+    _vary_encoding = False
+    _extra_headers: Dict[str, str] = {}
+
     def end_headers(self):
         self.send_header("Access-Control-Allow-Origin", "*")
+        if self._extra_headers:
+            self.send_header("Access-Control-Expose-Headers", ", ".join(self._extra_headers))
+            for keyword, value in self._extra_headers.items():
+                self.send_header(keyword, value)
+        if self._vary_encoding:
+            self.send_header("Vary", "Accept-Encoding")
         super().end_headers()
 
     def send_head(self):
-        if self.path.endswith(".zip"):
-            path = Path(self.path)
-            if str(path).startswith("/"):
-                path = Path("." + str(path)).resolve()
+        self._vary_encoding = False
+        self._extra_headers = {}
+        path = Path(self.translate_path(self.path))
+
+        match = ARCHIVE_NAME.fullmatch(path.name)
+        if match:
+            source, example = self.find_bundle_source(path.with_name(match["name"]))
+            if source is not None:
+                return self.send_archive(path, source, example, bool(match["pyc"]), match["digest"])
 
-            shutil.make_archive(path.with_suffix(""), "zip", root_dir=path.parent)
+        if path.name == "manifest.json" and not path.exists() and find_packages(path.parent):
+            return self.send_manifest(path.parent)
+
+        url_path = self.path.split("?", 1)[0].split("#", 1)[0]
+        if path.is_dir() and url_path.endswith("/") and (path / "index.html").is_file():
+            path = path / "index.html"
+        elif url_path.endswith("/"):
+            # Directory listings and redirects, or a 404 for a file with a trailing slash
+            return super().send_head()
+        if path.is_file():
+            return self.send_file(path)
 
         return super().send_head()
 
+    def send_file(self, path: Path):
+        try:
+            f = open(path, "rb")
+        except OSError:
+            self.send_error(http.server.HTTPStatus.NOT_FOUND, "File not found")
+            return None
+
+        try:
+            stat = os.fstat(f.fileno())
+            content_type = self.guess_type(str(path))
+            return self.send_content(
+                str(path),
+                path.read_bytes,
+                content_type,
+                f"{stat.st_size:x}-{stat.st_mtime_ns:x}",
+                stat.st_mtime,
+                compressible=is_compressible(content_type) and stat.st_size >= COMPRESSION_MIN_SIZE,
+                file=f,
+                size=stat.st_size,
+            )
+        except:
+            f.close()
+            raise
+
+    def find_bundle_source(self, source: Path) -> Tuple[Optional[Path], Optional[Path]]:
+        """
+        Work out what a bundle name refers to, as a ``(source, example)`` tuple. Besides
+        plain directories, examples can ask for a library from the root, e.g.
+        /cube/arcade.zip, in which case ``example`` is the example's directory.
+        """
+        if source.is_dir():
+            return source, None
+        if find_packages(source.parent):
+            library = Path(self.directory, source.name)
+            if library.is_dir():
+                return library, source.parent
+        return None, None
+
+    def send_archive(
+        self,
+        path: Path,
+        source: Path,
+        example: Optional[Path],
+        bytecode: bool,
+        digest: Optional[str],
+    ):
+        if bytecode and self.archives.compiler is None:
+            self.send_error(http.server.HTTPStatus.NOT_FOUND, "Bytecode bundles are disabled")
+            return None
+        try:
+            archive = self.archives.get(source, bytecode, example)
+        except RuntimeError as ex:
+            self.log_error("%s", ex)
+            self.send_error(http.server.HTTPStatus.INTERNAL_SERVER_ERROR, str(ex).splitlines()[0])
+            return None
+
+        # A hashed URL names one exact build, which is what makes it safe to cache forever
+        if digest is not None and digest != archive.digest:
+            self.send_error(http.server.HTTPStatus.NOT_FOUND, "Bundle is out of date, see manifest.json")
+            return None
+
+        if bytecode:
+            self._extra_headers["X-Python-Magic"] = self.archives.compiler.magic
+        return self.send_content(
+            str(path),
+            lambda: archive.data,
+            "application/zip",
+            archive.fingerprint,
+            archive.last_modified,
+            compressible=self.archives.stored,
+            cache_control=IMMUTABLE if digest is not None else "no-cache",
+        )
+
+    def send_manifest(self, example: Path):
+        """
+        Send the manifest of an example, mapping each bundle it loads (its own packages
+        and the libraries at the root it imports) to content-hashed URLs.
+        """
+        packages = find_packages(example)
+        names = {package.name for package in packages}
+        names.update(library.name for library in find_libraries(Path(self.directory), packages))
+
+        compiler = self.archives.compiler
+        bundles = {}
+        last_modified = 0.0
+        for name in sorted(names):
+            source, bundle_example = self.find_bundle_source(example / name)
+            archive = self.archives.get(source, False, bundle_example)
+            bundles[name] = {"source": f"{name}.{archive.digest}.zip"}
+            last_modified = max(last_modified, archive.last_modified)
+            if compiler is not None:
+                try:
+                    archive = self.archives.get(source, True, bundle_example)
+                except RuntimeError as ex:
+                    self.log_error("%s", ex)
+                else:
+                    bundles[name]["bytecode"] = f"{name}.{archive.digest}.pyc.zip"
+
+        data = json.dumps(
+            {"magic": compiler.magic if compiler is not None else None, "bundles": bundles},
+            indent=2,
+        ).encode()
+        return self.send_content(
+            str(example / "manifest.json"),
+            lambda: data,
+            "application/json",
+            hashlib.sha1(data).hexdigest()[:16],
+            last_modified,
+        )
+
+    def send_content(
+        self,
+        key: str,
+        load: Callable[[], bytes],
+        content_type: str,
+        fingerprint: str,
+        last_modified: float,
+        *,
+        compressible: bool = True,
+        cache_control: str = "no-cache",
+        file: Optional[BinaryIO] = None,
+        size: int = 0,
+    ):
+        """
+        Send a response for ``load()``, compressing it with the client's preferred
+        encoding when ``compressible`` is set, and honouring conditional and Range
+        requests.
+
+        When an open ``file`` of ``size`` bytes is passed, uncompressed bodies are
+        sent from it with ``socket.sendfile`` instead of ``load()``. The file is
+        closed once the response is done with it.
+        """
+        body = None
+        try:
+            # Ranges refer to the identity encoding, so don't compress partial requests
+            encoding = None
+            if compressible:
+                self._vary_encoding = True
+                if "Range" not in self.headers:
+                    encoding = self.negotiate_encoding()
+
+            etag = f'"{fingerprint}-{encoding}"' if encoding else f'"{fingerprint}"'
+            if self.is_not_modified(etag, last_modified):
+                self.send_response(http.server.HTTPStatus.NOT_MODIFIED)
+                self.send_header("ETag", etag)
+                self.end_headers()
+                return None
+
+            data = None
+            if encoding:
+                data = self.compressed.get(key, fingerprint, encoding, load)
+            elif file is None:
+                data = load()
+            if data is not None:
+                size = len(data)
+
+            try:
+                byte_range = None if encoding else self.requested_range(size, etag, last_modified)
+            except ValueError:
+                self.send_response(http.server.HTTPStatus.REQUESTED_RANGE_NOT_SATISFIABLE)
+                self.send_header("Content-Range", f"bytes */{size}")
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return None
+
+            start, end = byte_range or (0, size - 1)
+            if byte_range:
+                self.send_response(http.server.HTTPStatus.PARTIAL_CONTENT)
+                self.send_header("Content-Range", f"bytes {start}-{end}/{size}")
+            else:
+                self.send_response(http.server.HTTPStatus.OK)
+            self.send_header("Content-type", content_type)
+            if encoding:
+                self.send_header("Content-Encoding", encoding)
+            else:
+                self.send_header("Accept-Ranges", "bytes")
+            self.send_header("Content-Length", str(end - start + 1))
+            self.send_header("ETag", etag)
+            self.send_header("Last-Modified", self.date_time_string(last_modified))
+            self.send_header("Cache-Control", cache_control)
+            self.end_headers()
+
+            if data is None:
+                body = FileRange(file, start, end - start + 1)
+            else:
+                body = io.BytesIO(data[start : end + 1] if byte_range else data)
+            return body
+        finally:
+            if file is not None and not isinstance(body, FileRange):
+                file.close()
+
+    def requested_range(self, size: int, etag: str, last_modified: float) -> Optional[Tuple[int, int]]:
+        """
+        The inclusive byte range asked for by the Range header, or None to send the
+        whole entity. Raises ValueError for a range that can't be satisfied.
+        """
+        header = self.headers.get("Range", "").strip()
+        if not header.startswith("bytes="):
+            return None
+
+        if_range = self.headers.get("If-Range")
+        if if_range:
+            if if_range.startswith(('"', "W/")):
+                if if_range.strip() != etag:
+                    return None
+            else:
+                since = self.parse_http_date(if_range)
+                modified = datetime.datetime.fromtimestamp(last_modified, datetime.timezone.utc)
+                if since is None or modified.replace(microsecond=0) != since:
+                    return None
+
+        # Multiple ranges would need a multipart/byteranges body, the whole thing will do
+        spec = header[len("bytes=") :].strip()
+        first, dash, last = spec.partition("-")
+        if "," in spec or not dash:
+            return None
+        if not (first.isdigit() or first == "") or not (last.isdigit() or last == ""):
+            return None
+
+        if first:
+            start = int(first)
+            end = min(int(last), size - 1) if last else size - 1
+            if start >= size or start > end:
+                raise ValueError(f"Range {spec} can't be satisfied for {size} bytes")
+        elif last:
+            suffix = int(last)
+            if suffix == 0 or size == 0:
+                raise ValueError(f"Range {spec} can't be satisfied for {size} bytes")
+            start, end = max(0, size - suffix), size - 1
+        else:
+            return None
+        return start, end
+
+    def copyfile(self, source, outputfile):
+        if isinstance(source, FileRange):
+            if source.count:
+                self.wfile.flush()
+                self.connection.sendfile(source.file, source.offset, source.count)
+        else:
+            super().copyfile(source, outputfile)
+
+    def negotiate_encoding(self) -> Optional[str]:
+        """Pick the preferred encoding the client accepts, or None for identity."""
+        accepted = {}
+        for item in self.headers.get("Accept-Encoding", "").split(","):
+            name, _, params = item.partition(";")
+            quality = 1.0
+            params = params.strip()
+            if params.startswith("q="):
+                try:
+                    quality = float(params[2:])
+                except ValueError:
+                    quality = 0.0
+            accepted[name.strip().lower()] = quality
+
+        for encoding in ENCODERS:
+            if accepted.get(encoding, accepted.get("*", 0.0)) > 0:
+                return encoding
+        return None
+
+    def is_not_modified(self, etag: str, last_modified: float) -> bool:
+        if "If-None-Match" in self.headers:
+            tags = [tag.strip() for tag in self.headers["If-None-Match"].split(",")]
+            return etag in tags or "*" in tags
+
+        since = self.parse_http_date(self.headers.get("If-Modified-Since"))
+        if since is None:
+            return False
+        modified = datetime.datetime.fromtimestamp(last_modified, datetime.timezone.utc)
+        return modified.replace(microsecond=0) <= since
+
+    @staticmethod
+    def parse_http_date(value: Optional[str]) -> Optional[datetime.datetime]:
+        if not value:
+            return None
+        try:
+            date = email.utils.parsedate_to_datetime(value)
+        except (TypeError, IndexError, OverflowError, ValueError):
+            return None
+        if date.tzinfo is None:
+            date = date.replace(tzinfo=datetime.timezone.utc)
+        return date
+
+
+class Connection:
+    """
+    A client connection and the handler parsing its requests. Each :py:meth:`serve`
+    handles the requests that have arrived, so a worker thread is only taken while
+    there is a request to answer.
+    """
+
+    # Seconds a worker waits for the next request before handing the connection back
+    linger = 0.005
+
+    def __init__(self, server, request: socket.socket, client_address):
+        self.request = request
+        self.client_address = client_address
+        # Run the handler's __init__ for the setup it does, but not its request
+        # loop: requests are handled one at a time by serve()
+        handler_class = server.RequestHandlerClass
+        self.handler = handler_class.__new__(handler_class)
+        self.handler.handle = self.handler.finish = lambda: None
+        self.handler.__init__(request, client_address, server)
+        del self.handler.handle, self.handler.finish
+        self.idle_since = time.monotonic()
+
+    def fileno(self) -> int:
+        return self.request.fileno()
+
+    def serve(self) -> bool:
+        """Handle the requests read so far. Returns whether the connection stays open."""
+        handler = self.handler
+        while True:
+            handler.close_connection = True
+            handler.handle_one_request()
+            if handler.close_connection:
+                return False
+            # Clients usually send their next request right after reading a
+            # response, so wait a moment before going back to the selector
+            if not self._buffered() and not select.select([self.request], [], [], self.linger)[0]:
+                break
+        self.idle_since = time.monotonic()
+        return True
+
+    def _buffered(self) -> bool:
+        # A pipelined request may already sit in the handler's read buffer, where
+        # the selector can't see it
+        self.request.setblocking(False)
+        try:
+            return bool(self.handler.rfile.peek(1))
+        except OSError:
+            return False
+        finally:
+            self.request.settimeout(self.handler.timeout)
+
+    def close(self):
+        try:
+            self.handler.finish()
+        except OSError:
+            pass
+        try:
+            self.request.shutdown(socket.SHUT_WR)
+        except OSError:
+            pass
+        self.request.close()
+
+
+def serve_connection(server, connection: Connection, on_idle: Callable[[Connection], None]):
+    """Handle a connection's requests on a worker, then hand it back with ``on_idle`` if kept alive."""
+    try:
+        keep = connection.serve()
+    except Exception:
+        server.handle_error(connection.request, connection.client_address)
+        keep = False
+    if keep:
+        on_idle(connection)
+    else:
+        connection.close()
+
+
+class IdleConnections:
+    """
+    Waits on kept-alive connections with a selector in a thread of its own, and
+    submits one to the worker pool only when a request arrives on it. Connections
+    idle for longer than the handler's ``idle_timeout`` are closed.
+    """
+
+    def __init__(self, server, pool: ThreadPoolExecutor):
+        self._server = server
+        self._pool = pool
+        self._timeout = server.RequestHandlerClass.idle_timeout
+        self._selector = selectors.DefaultSelector()
+        self._wakeup, self._waker = socket.socketpair()
+        self._wakeup.setblocking(False)
+        self._selector.register(self._wakeup, selectors.EVENT_READ)
+        # Connections to watch, added from worker threads
+        self._incoming: List[Connection] = []
+        self._lock = threading.Lock()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="http-idle", daemon=True)
+        self._thread.start()
+
+    def add(self, connection: Connection):
+        with self._lock:
+            self._incoming.append(connection)
+        try:
+            self._waker.send(b"\0")
+        except OSError:
+            pass
+
+    def _run(self):
+        watched: Set[Connection] = set()
+        while not self._closed:
+            events = self._selector.select(1.0)
+            for key, _ in events:
+                if key.fileobj is self._wakeup:
+                    try:
+                        self._wakeup.recv(4096)
+                    except BlockingIOError:
+                        pass
+                    continue
+                connection = key.fileobj
+                self._selector.unregister(connection)
+                watched.discard(connection)
+                self._pool.submit(serve_connection, self._server, connection, self.add)
+
+            with self._lock:
+                incoming, self._incoming = self._incoming, []
+            for connection in incoming:
+                self._selector.register(connection, selectors.EVENT_READ)
+                watched.add(connection)
+
+            expired = time.monotonic() - self._timeout
+            for connection in [c for c in watched if c.idle_since < expired]:
+                self._selector.unregister(connection)
+                watched.discard(connection)
+                connection.close()
+
+        for connection in watched:
+            connection.close()
+
+    def close(self):
+        self._closed = True
+        self._waker.send(b"\0")
+        self._thread.join()
+        self._selector.close()
+        self._wakeup.close()
+        self._waker.close()
+
+
+class ThreadPoolHTTPServer(http.server.HTTPServer):
+    """
+    Serves requests on a bounded pool of worker threads. Kept-alive connections
+    wait between requests in :py:class:`IdleConnections`, not on a worker.
+    """
+
+    allow_reuse_address = True
+    # A page opens several connections at once, more than the default backlog of 5
+    request_queue_size = 128
+
+    def __init__(self, server_address, RequestHandlerClass, workers: int):
+        super().__init__(server_address, RequestHandlerClass)
+        self._pool = ThreadPoolExecutor(workers, thread_name_prefix="http")
+        self._idle = IdleConnections(self, self._pool)
+
+    def process_request(self, request, client_address):
+        try:
+            connection = Connection(self, request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+            self.shutdown_request(request)
+            return
+        self._idle.add(connection)
+
+    def server_close(self):
+        super().server_close()
+        self._idle.close()
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+
+class AsyncioHTTPServer:
+    """
+    Accepts connections on an asyncio event loop and hands requests to a bounded
+    pool of worker threads, so neither slow clients nor archive builds can hold up
+    the loop. Kept-alive connections wait on the loop between requests.
+    """
+
+    def __init__(self, server_address, RequestHandlerClass, workers: int):
+        self.RequestHandlerClass = RequestHandlerClass
+        self.socket = socket.create_server(server_address)
+        self.socket.setblocking(False)
+        self.server_address = self.socket.getsockname()
+        self.server_name = socket.getfqdn(self.server_address[0])
+        self.server_port = self.server_address[1]
+        self._pool = ThreadPoolExecutor(workers, thread_name_prefix="http")
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._accept_task: Optional[asyncio.Task] = None
+        # Idle connection -> the timer that closes it
+        self._idle: Dict[Connection, asyncio.TimerHandle] = {}
+
+    def serve_forever(self):
+        asyncio.run(self._serve())
+
+    async def _serve(self):
+        self._loop = asyncio.get_running_loop()
+        self._accept_task = asyncio.current_task()
+        try:
+            while True:
+                request, client_address = await self._loop.sock_accept(self.socket)
+                request.setblocking(True)
+                try:
+                    connection = Connection(self, request, client_address)
+                except Exception:
+                    self.handle_error(request, client_address)
+                    request.close()
+                    continue
+                self._watch(connection)
+        except asyncio.CancelledError:
+            pass
+        finally:
+            for connection, timer in self._idle.items():
+                timer.cancel()
+                self._loop.remove_reader(connection.fileno())
+                connection.close()
+            self._idle.clear()
+
+    def _watch(self, connection: Connection):
+        timer = self._loop.call_later(self.RequestHandlerClass.idle_timeout, self._expire, connection)
+        self._idle[connection] = timer
+        self._loop.add_reader(connection.fileno(), self._ready, connection)
+
+    def _unwatch(self, connection: Connection):
+        self._idle.pop(connection).cancel()
+        self._loop.remove_reader(connection.fileno())
+
+    def _ready(self, connection: Connection):
+        self._unwatch(connection)
+        self._loop.run_in_executor(self._pool, serve_connection, self, connection, self._on_idle)
+
+    def _expire(self, connection: Connection):
+        self._unwatch(connection)
+        connection.close()
+
+    def _on_idle(self, connection: Connection):
+        # Called from a worker thread
+        try:
+            self._loop.call_soon_threadsafe(self._watch, connection)
+        except RuntimeError:
+            # The loop has stopped
+            connection.close()
+
+    def handle_error(self, request, client_address):
+        socketserver.BaseServer.handle_error(self, request, client_address)
+
+    def shutdown(self):
+        if self._loop is not None and not self._loop.is_closed():
+            self._loop.call_soon_threadsafe(self._accept_task.cancel)
+
+    def server_close(self):
+        self.socket.close()
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+
+SERVER_MODES = {
+    "thread": ThreadPoolHTTPServer,
+    "asyncio": AsyncioHTTPServer,
+}
+
 
 def make_parser(parser):
     parser.description = "Start a Server"
     parser.add_argument(
         "--port", action="store", type=int, default=8000, help="Choose the port to bind to"
     )
+    parser.add_argument(
+        "--mode",
+        choices=sorted(SERVER_MODES),
+        default="thread",
+        help="Concurrency backend used to serve requests",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=8,
+        help="Maximum number of requests handled concurrently",
+    )
+    parser.add_argument(
+        "--bytecode-python",
+        default=None,
+        metavar="PYTHON",
+        help=(
+            "Serve .pyc.zip bundles compiled by this interpreter. It has to match the Python "
+            "version of the Pyodide release the examples load, so bundles are off without it"
+        ),
+    )
+    parser.add_argument(
+        "--tree-shake",
+        action="store_true",
+        help="Only bundle the library modules an example imports into <example>/<library>.zip",
+    )
+    parser.add_argument(
+        "--strip-constants",
+        action="store_true",
+        help="With --tree-shake, also drop unreferenced names from constant tables",
+    )
+    parser.add_argument(
+        "--watch",
+        action="store_true",
+        help="Rebuild cached bundles in the background as soon as their sources change",
+    )
+    parser.add_argument(
+        "--stored-zips",
+        action="store_true",
+        help="Build package archives without zip compression and rely on Content-Encoding",
+    )
     return parser
 
 
 @contextmanager
-def server(port):
-    httpd = socketserver.TCPServer(("", port), HTTPHandler)
-    httpd.allow_reuse_address = True
+def server(port, mode="thread", workers=8):
+    httpd = SERVER_MODES[mode](("", port), HTTPHandler, workers)
     try:
         yield httpd
     finally:
         httpd.shutdown()
+        httpd.server_close()
 
 
 def main(args):
     port = args.port
-    with server(port) as httpd:
+    compiler = BytecodeCompiler(args.bytecode_python) if args.bytecode_python else None
+    HTTPHandler.archives = ArchiveCache(
+        stored=args.stored_zips,
+        compiler=compiler,
+        tree_shake=args.tree_shake,
+        strip_constants=args.strip_constants,
+        watching=args.watch,
+    )
+
+    stop = threading.Event()
+    if args.watch:
+        threading.Thread(
+            target=watch,
+            args=([Path.cwd()], HTTPHandler.archives.refresh, stop),
+            name="watch",
+            daemon=True,
+        ).start()
+
+    with server(port, args.mode, args.workers) as httpd:
         print(f"Serving from {Path(__file__).resolve().parent} at http://localhost:{port}")
-        httpd.serve_forever()
+        try:
+            httpd.serve_forever()
+        finally:
+            stop.set()
 
 
 if __name__ == "__main__":